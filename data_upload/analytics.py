@@ -0,0 +1,167 @@
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import connection
+from .models import DiseaseData
+
+logger = logging.getLogger(__name__)
+
+# Rolling window in periods of each frequency (one week of days, four weeks)
+WINDOWS = {'daily': 7, 'weekly': 4}
+RESAMPLE = {'daily': None, 'weekly': 'W'}
+# Mean serial interval in days, used to turn growth rates into Rt
+SERIAL_INTERVAL_DAYS = getattr(settings, 'ANALYTICS_SERIAL_INTERVAL_DAYS', 5.0)
+# Metric sets kept in memory (one per dataset, freq and cumulative flag,
+# for the current dataset version only); each holds every country's series
+METRICS_MEMO_SIZE = getattr(settings, 'ANALYTICS_MEMO_SIZE', 2)
+METRICS = ('cases', 'deaths', 'cases_avg', 'deaths_avg', 'growth_rate', 'doubling_time', 'rt', 'cfr')
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+def _daily_matrices(dataset):
+    """
+    (cases, deaths): date x country frames of daily values over the full
+    date range (missing days are 0). Read with one GROUP BY that the
+    unique (dataset_type, country, date) INCLUDE index answers without the heap.
+    """
+    with connection.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT country, date, COALESCE(SUM(cases), 0), COALESCE(SUM(deaths), 0)
+            FROM {DiseaseData._meta.db_table}
+            WHERE dataset_type = %s
+            GROUP BY country, date
+            """,
+            [dataset]
+        )
+        frame = pd.DataFrame.from_records(cur.fetchall(), columns=['country', 'date', 'cases', 'deaths'])
+    if frame.empty:
+        return None, None
+
+    frame['date'] = pd.to_datetime(frame['date'])
+    days = pd.date_range(frame['date'].min(), frame['date'].max(), freq='D')
+    wide = frame.pivot_table(index='date', columns='country', values=['cases', 'deaths'], aggfunc='sum', fill_value=0)
+    wide = wide.reindex(days, fill_value=0).astype('float64')
+    return wide['cases'], wide['deaths']
+
+
+def _metrics(cases, deaths, freq):
+    """
+    {metric: values} for daily/weekly cases and deaths, given either as
+    date x country frames or as a single series; every step is a pandas
+    rolling/vector op, so all countries are computed at once.
+    """
+    window = WINDOWS[freq]
+    cases_avg = cases.rolling(window, min_periods=window).mean()
+    deaths_avg = deaths.rolling(window, min_periods=window).mean()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = np.log(cases_avg / cases_avg.shift(window)) / window
+        growth = growth.replace([np.inf, -np.inf], np.nan)
+        doubling = (np.log(2) / growth).where(growth > 0)
+        period_days = 7 if freq == 'weekly' else 1
+        rt = np.exp(growth / period_days * SERIAL_INTERVAL_DAYS)
+        window_cases = cases.rolling(window, min_periods=window).sum()
+        cfr = (deaths.rolling(window, min_periods=window).sum() / window_cases * 100).where(window_cases > 0)
+    return {
+        'cases': cases, 'deaths': deaths, 'cases_avg': cases_avg, 'deaths_avg': deaths_avg,
+        'growth_rate': growth, 'doubling_time': doubling, 'rt': rt, 'cfr': cfr,
+    }
+
+
+def _compute_metrics(dataset, freq, cumulative):
+    started = pd.Timestamp.now()
+    cases, deaths = _daily_matrices(dataset)
+    if cases is None:
+        return None
+    if cumulative:
+        cases = cases.diff().fillna(cases).clip(lower=0)
+        deaths = deaths.diff().fillna(deaths).clip(lower=0)
+    if RESAMPLE[freq]:
+        cases = cases.resample(RESAMPLE[freq]).sum()
+        deaths = deaths.resample(RESAMPLE[freq]).sum()
+
+    metrics = _metrics(cases, deaths, freq)
+    total = _metrics(cases.sum(axis=1), deaths.sum(axis=1), freq)
+    elapsed = (pd.Timestamp.now() - started).total_seconds()
+    logger.info(f"Analytics for dataset='{dataset}' ({freq}): {cases.shape[1]} countries x {len(cases)} periods in {elapsed:.3f}s")
+    return metrics, total
+
+
+def dataset_metrics(dataset, version, freq='daily', cumulative=False):
+    """
+    Every metric of a dataset as (metrics, total): {metric: date x country
+    frame} and {metric: all-country series}, or None without rows.
+    Memoized in-process per (dataset, freq, cumulative) for the given
+    version only; see METRICS_MEMO_SIZE. Treat the results as read-only.
+
+    - cumulative: the dataset stores running totals; they are differenced
+      into new cases/deaths (negative corrections clipped to 0)
+    - cases_avg / deaths_avg: rolling mean over WINDOWS[freq] periods
+    - growth_rate: exponential growth per period, log(avg_t / avg_t-w) / w
+    - doubling_time: ln 2 / growth_rate, in periods, while growing
+    - rt: exp(growth per day x SERIAL_INTERVAL_DAYS), the
+      Wallinga-Lipsitch estimate for a fixed serial interval
+    - cfr: deaths / cases over the rolling window, in percent
+    """
+    memo_key = (dataset, freq, cumulative)
+    with _memo_lock:
+        entry = _memo.pop(memo_key, None)
+        if entry is not None and entry[0] == version:
+            _memo[memo_key] = entry  # back to the most recently used end
+            return entry[1]
+
+    result = _compute_metrics(dataset, freq, cumulative)
+    with _memo_lock:
+        # An older version of this key was dropped above; the least
+        # recently used other keys go when the memo is full
+        _memo[memo_key] = (version, result)
+        while len(_memo) > METRICS_MEMO_SIZE:
+            _memo.pop(next(iter(_memo)))
+    return result
+
+
+def _column(series):
+    """Rounded values with None for NaN, ready for JSON"""
+    values = series.round(4)
+    return values.astype(object).where(values.notna(), None).tolist()
+
+
+def analytics_payload(dataset, version, countries=None, top=10, freq='daily', cumulative=False, start=None, end=None):
+    """
+    JSON-ready series for the requested countries (matched case-insensitively;
+    the `top` countries by cases when none are given) plus the all-country
+    total, sliced to start/end after the rolling windows were computed.
+    """
+    computed = dataset_metrics(dataset, version, freq, cumulative)
+    if computed is None:
+        return {'dataset': dataset, 'freq': freq, 'dates': [], 'countries': [], 'series': {}, 'total': {}}
+
+    metrics, total = computed
+    cases = metrics['cases']
+    if countries:
+        wanted = {c.strip().lower() for c in countries}
+        selected = [c for c in cases.columns if str(c).strip().lower() in wanted]
+    else:
+        selected = cases.sum().sort_values(ascending=False).head(top).index.tolist()
+
+    rows = slice(start or None, end or None)
+    dates = cases.loc[rows].index
+
+    def series_of(column):
+        return {metric: _column(frame.loc[rows, column]) for metric, frame in metrics.items()}
+
+    return {
+        'dataset': dataset,
+        'freq': freq,
+        'window': WINDOWS[freq],
+        'cumulative': cumulative,
+        'serial_interval_days': SERIAL_INTERVAL_DAYS,
+        'dates': [d.strftime('%Y-%m-%d') for d in dates],
+        'countries': selected,
+        'series': {country: series_of(country) for country in selected},
+        'total': {metric: _column(series.loc[rows]) for metric, series in total.items()},
+    }
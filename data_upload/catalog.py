@@ -0,0 +1,90 @@
+import time
+import hashlib
+import logging
+import threading
+from django.conf import settings
+from django.db.models import Count, Max, Min, Sum
+from django.utils import timezone
+from .models import DatasetCatalog, DiseaseData, DiseaseRollup
+
+logger = logging.getLogger(__name__)
+
+# Seconds a process trusts its copy of the catalog. Uploads in this process
+# invalidate it at once; other processes pick the change up within the TTL.
+CATALOG_TTL = getattr(settings, 'DATASET_CATALOG_TTL', 5)
+
+_cache = {'entries': None, 'loaded': 0.0}
+_lock = threading.Lock()
+
+
+def refresh_catalog(dataset, changed=True):
+    """
+    Recompute one dataset's catalog entry after an upload, from the rollup
+    plus two index probes for the date range. The version only moves when
+    the upload changed rows (changed=True). Call inside the upload's
+    transaction; the entry is dropped when the dataset has no rows left.
+    """
+    rollup = DiseaseRollup.objects.filter(dataset_type=dataset).aggregate(
+        rows=Sum('rows'), countries=Count('country', distinct=True)
+    )
+    rows = rollup['rows'] or 0
+    if not rows:
+        DatasetCatalog.objects.filter(name=dataset).delete()
+        return None
+
+    dates = DiseaseData.objects.filter(dataset_type=dataset).aggregate(first=Min('date'), last=Max('date'))
+    entry, created = DatasetCatalog.objects.get_or_create(name=dataset, defaults={'version': ''})
+    entry.row_count = rows
+    entry.country_count = rollup['countries']
+    entry.first_date = dates['first']
+    entry.last_date = dates['last']
+    if changed or created or not entry.version:
+        entry.version = hashlib.md5(f"{dataset}:{rows}:{time.time_ns()}".encode('utf-8')).hexdigest()[:16]
+        entry.updated_at = timezone.now()
+    entry.save()
+    logger.info(f"Catalog refreshed for dataset='{dataset}': {rows} rows, version {entry.version}")
+    return entry
+
+
+def invalidate_catalog():
+    """Drop this process's cached catalog (run after an upload commits)"""
+    with _lock:
+        _cache['entries'] = None
+
+
+def catalog():
+    """{dataset name: entry dict} for every dataset, served from memory"""
+    now = time.monotonic()
+    with _lock:
+        if _cache['entries'] is not None and now - _cache['loaded'] < CATALOG_TTL:
+            return _cache['entries']
+
+    entries = {
+        row['name']: row
+        for row in DatasetCatalog.objects.values(
+            'name', 'row_count', 'first_date', 'last_date', 'country_count', 'version', 'updated_at'
+        )
+    }
+    with _lock:
+        _cache['entries'] = entries
+        _cache['loaded'] = now
+    return entries
+
+
+def catalog_version(dataset=None):
+    """Version of one dataset, or of all data when dataset is None"""
+    entries = catalog()
+    if dataset is not None:
+        entry = entries.get(dataset)
+        return entry['version'] if entry else '0' * 16
+    combined = ','.join(f"{name}:{entry['version']}" for name, entry in sorted(entries.items()))
+    return hashlib.md5(combined.encode('utf-8')).hexdigest()[:16]
+
+
+def last_modified(dataset=None):
+    """When the dataset (or any dataset) last changed, None if unknown"""
+    entries = catalog()
+    if dataset is not None:
+        entry = entries.get(dataset)
+        return entry['updated_at'] if entry else None
+    return max((entry['updated_at'] for entry in entries.values()), default=None)
@@ -0,0 +1,141 @@
+import os
+import json
+import uuid
+import shutil
+import logging
+from django.conf import settings
+from .jobs import TOKEN_RE, UPLOAD_DIR, purge_stale_uploads, register_upload
+from .sniff import SNIFF_BYTES, sniff_csv
+
+logger = logging.getLogger(__name__)
+
+# Size of every chunk but the last; the browser PUTs them one request each
+CHUNK_SIZE = getattr(settings, 'INGEST_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+MAX_FILE_SIZE = getattr(settings, 'INGEST_UPLOAD_MAX_SIZE', 20 * 1024 ** 3)
+# Request body is copied to disk this many bytes at a time
+COPY_BUFFER = 256 * 1024
+
+
+class UploadError(ValueError):
+    """Invalid chunked upload request (unknown id, bad chunk index or size...)"""
+
+
+def _paths(upload_id):
+    base = os.path.join(str(UPLOAD_DIR), upload_id)
+    return {
+        'session': f"{base}.upload.json",
+        'data': f"{base}.csv",
+        'chunks': f"{base}.chunks",
+    }
+
+
+def _load_session(upload_id):
+    if not TOKEN_RE.match(upload_id or ''):
+        raise UploadError('Unknown upload')
+    paths = _paths(upload_id)
+    try:
+        with open(paths['session'], encoding='utf-8') as fh:
+            return json.load(fh), paths
+    except (OSError, ValueError):
+        raise UploadError('Unknown upload')
+
+
+def _chunk_length(session, index):
+    if index == session['chunks'] - 1:
+        return session['file_size'] - index * session['chunk_size']
+    return session['chunk_size']
+
+
+def init_upload(file_name, file_size):
+    """
+    Start a chunked upload: the target file is pre-allocated (sparse) so
+    chunks can be written in any order. Returns the session dict.
+    """
+    if file_size <= 0:
+        raise UploadError('File is empty')
+    if file_size > MAX_FILE_SIZE:
+        raise UploadError(f'File is larger than {MAX_FILE_SIZE} bytes')
+
+    purge_stale_uploads()
+    upload_id = uuid.uuid4().hex
+    paths = _paths(upload_id)
+    os.makedirs(paths['chunks'], exist_ok=True)
+    with open(paths['data'], 'wb') as fh:
+        fh.truncate(file_size)
+
+    session = {
+        'upload_id': upload_id,
+        'file_name': file_name,
+        'file_size': file_size,
+        'chunk_size': CHUNK_SIZE,
+        'chunks': -(-file_size // CHUNK_SIZE),
+    }
+    with open(paths['session'], 'w', encoding='utf-8') as fh:
+        json.dump(session, fh)
+    logger.info(f"Chunked upload {upload_id} started: {file_name}, {file_size} bytes in {session['chunks']} chunks")
+    return session
+
+
+def write_chunk(upload_id, index, stream, length):
+    """
+    Copy one chunk from a request stream to its offset in the target file.
+    Constant memory: the body is never read as a whole. Chunks may arrive
+    in parallel and be re-sent; a chunk counts once it was fully written.
+    """
+    session, paths = _load_session(upload_id)
+    if not 0 <= index < session['chunks']:
+        raise UploadError(f'Chunk {index} out of range')
+    expected = _chunk_length(session, index)
+    if length != expected:
+        raise UploadError(f'Chunk {index} must be {expected} bytes, got {length}')
+
+    written = 0
+    with open(paths['data'], 'r+b') as fh:
+        fh.seek(index * session['chunk_size'])
+        while written < expected:
+            data = stream.read(min(COPY_BUFFER, expected - written))
+            if not data:
+                break
+            fh.write(data)
+            written += len(data)
+    if written != expected:
+        raise UploadError(f'Chunk {index} incomplete ({written}/{expected} bytes)')
+
+    # Marker file per chunk: parallel requests never rewrite shared state
+    open(os.path.join(paths['chunks'], str(index)), 'wb').close()
+    # Keeps an active upload from being purged as stale
+    os.utime(paths['session'])
+    return upload_status(upload_id)
+
+
+def upload_status(upload_id):
+    """Session info plus the chunk indexes received so far and those still missing"""
+    session, paths = _load_session(upload_id)
+    received = sorted(int(name) for name in os.listdir(paths['chunks']) if name.isdigit())
+    done = set(received)
+    return {
+        **session,
+        'received': len(received),
+        'missing': [i for i in range(session['chunks']) if i not in done],
+    }
+
+
+def finalize_upload(upload_id):
+    """
+    Check every chunk arrived, sniff the assembled file and register it as a
+    staged upload: the returned upload_token is accepted by /api/upload/.
+    """
+    status = upload_status(upload_id)
+    if status['missing']:
+        raise UploadError(f"{len(status['missing'])} chunks still missing")
+
+    paths = _paths(upload_id)
+    with open(paths['data'], 'rb') as fh:
+        sniffed = sniff_csv(fh.read(SNIFF_BYTES))
+    options = {'delimiter': sniffed['delimiter'], 'encoding': sniffed['encoding']}
+    register_upload(upload_id, paths['data'], status['file_name'], options)
+
+    os.remove(paths['session'])
+    shutil.rmtree(paths['chunks'], ignore_errors=True)
+    logger.info(f"Chunked upload {upload_id} complete: {status['file_size']} bytes")
+    return {**sniffed, 'upload_token': upload_id}
@@ -0,0 +1,259 @@
+import os
+import hashlib
+import logging
+import threading
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from .models import CountryGeometry
+
+logger = logging.getLogger(__name__)
+
+# Tolerance 0.01 degrees = ~1km, good enough for visualization
+STORED_TOLERANCE = 0.01
+
+
+def country_key(name):
+    """Normalized lookup key for a country name ('  Guinea ' -> 'guinea')"""
+    if name is None:
+        return ''
+    return str(name).strip().lower()
+
+
+# key -> CountryGeometry id for rows known to be committed. CountryGeometry
+# rows are never rewritten, so this only grows and is safe to share.
+_resolved_ids = {}
+
+
+def resolve_countries(names):
+    """
+    Map country names to CountryGeometry ids, creating missing rows.
+    Every name gets a row (geom stays NULL when world_countries has no match),
+    so each geometry is stored once per country instead of once per data row.
+
+    Set-based: one query for known keys, one INSERT ... SELECT that matches
+    all new keys against world_countries (lower(name) first, then name_en /
+    adm0_a3) and one query to read back the ids, however many countries.
+    Returns {key: country_geometry_id}.
+    """
+    display_names = {}
+    for name in names:
+        key = country_key(name)
+        if key and key not in display_names:
+            display_names[key] = str(name).strip()
+
+    resolved = {key: _resolved_ids[key] for key in display_names if key in _resolved_ids}
+    unknown = [key for key in display_names if key not in resolved]
+    if unknown:
+        existing = dict(CountryGeometry.objects.filter(key__in=unknown).values_list('key', 'id'))
+        _resolved_ids.update(existing)
+        resolved.update(existing)
+
+    missing = [key for key in display_names if key not in resolved]
+    logger.info(f"Resolving {len(display_names)} countries ({len(missing)} new geometries to fetch)...")
+    if not missing:
+        return resolved
+
+    names = [display_names[key] for key in missing]
+    try:
+        # Savepoint: a missing world_countries table must not abort the upload's transaction
+        with transaction.atomic(), connection.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO data_upload_countrygeometry (key, name, geom)
+                SELECT k.key, k.name,
+                       CASE WHEN GeometryType(w.geom) IN ('POLYGON', 'MULTIPOLYGON') AND NOT ST_IsEmpty(w.geom)
+                            THEN ST_SetSRID(ST_Multi(w.geom), 4326) END
+                FROM unnest(%s::text[], %s::text[]) AS k(key, name)
+                LEFT JOIN LATERAL (
+                    SELECT ST_SimplifyPreserveTopology(geom, %s) AS geom
+                    FROM world_countries
+                    WHERE lower(name) = k.key OR lower(name_en) = k.key OR lower(adm0_a3) = k.key
+                    ORDER BY lower(name) = k.key DESC
+                    LIMIT 1
+                ) w ON true
+                ON CONFLICT (key) DO NOTHING
+                """,
+                [missing, names, STORED_TOLERANCE]
+            )
+    except Exception as fetch_err:
+        logger.error(f"Geometry lookup failed for {len(missing)} countries: {fetch_err}")
+        # Still give every country a row so data rows can reference it
+        CountryGeometry.objects.bulk_create(
+            [CountryGeometry(key=key, name=display_names[key]) for key in missing],
+            ignore_conflicts=True
+        )
+
+    fill_country_measures(missing)
+
+    # Another upload may have created some of the same keys meanwhile
+    created = dict(CountryGeometry.objects.filter(key__in=missing).values_list('key', 'id'))
+    resolved.update(created)
+    # Rows created in this transaction are only shareable once it commits
+    transaction.on_commit(lambda: _resolved_ids.update(created))
+    return resolved
+
+
+def fill_country_measures(keys):
+    """
+    Store area (km², geodesic) and, when world_countries has pop_est, the
+    population of new CountryGeometry rows, so density and per-capita stats
+    never compute them per request.
+    """
+    CountryGeometry.objects.filter(key__in=keys, geom__isnull=False, area_km2__isnull=True).update(
+        area_km2=RawSQL('ST_Area(geom::geography) / 1e6', [])
+    )
+    try:
+        # Savepoint: world_countries may lack pop_est
+        with transaction.atomic(), connection.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE data_upload_countrygeometry g
+                SET population = w.pop_est::bigint
+                FROM world_countries w
+                WHERE g.key = ANY(%s) AND g.population IS NULL AND w.pop_est > 0
+                  AND (lower(w.name) = g.key OR lower(w.name_en) = g.key OR lower(w.adm0_a3) = g.key)
+                """,
+                [list(keys)]
+            )
+    except Exception as pop_err:
+        logger.debug(f"No population for {len(keys)} countries: {pop_err}")
+
+
+# Simplification levels in degrees, finest first. Requests are snapped to
+# one of these so every country is simplified at most len(levels) times.
+TOLERANCE_LEVELS = (0.01, 0.02, 0.05, 0.1)
+
+# (tolerance, key) -> GeoJSON geometry as UTF-8 bytes
+_geojson_cache = {}
+_geojson_lock = threading.Lock()
+
+
+def tolerance_for_zoom(zoom):
+    """Leaflet zoom level -> simplification tolerance (world view gets the coarsest)"""
+    if zoom <= 2:
+        return 0.1
+    if zoom <= 4:
+        return 0.05
+    if zoom <= 6:
+        return 0.02
+    return 0.01
+
+
+def snap_tolerance(tolerance):
+    """Round a requested tolerance down to the nearest cached level"""
+    candidates = [level for level in TOLERANCE_LEVELS if level <= tolerance]
+    return candidates[-1] if candidates else TOLERANCE_LEVELS[0]
+
+
+def _disk_path(tolerance, key):
+    cache_dir = getattr(settings, 'GEOMETRY_CACHE_DIR', None)
+    if not cache_dir:
+        return None
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return os.path.join(str(cache_dir), str(tolerance), f"{digest}.json")
+
+
+def _read_disk(tolerance, key):
+    path = _disk_path(tolerance, key)
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as fh:
+            return fh.read()
+    except OSError:
+        return None
+
+
+def _write_disk(tolerance, key, data):
+    path = _disk_path(tolerance, key)
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write geometry cache file {path}: {e}")
+
+
+def _simplified_geojson(keys, tolerance):
+    """
+    Simplify and serialize many countries in PostGIS: stored CountryGeometry
+    outlines first, world_countries for the rest. Returns {key: str}.
+    """
+    geometries = {}
+    with connection.cursor() as cur:
+        cur.execute(
+            """
+            SELECT key, ST_AsGeoJSON(ST_SimplifyPreserveTopology(geom, %s), 5)
+            FROM data_upload_countrygeometry
+            WHERE key = ANY(%s) AND geom IS NOT NULL AND NOT ST_IsEmpty(geom)
+            """,
+            [tolerance, keys]
+        )
+        geometries.update((key, geojson) for key, geojson in cur.fetchall() if geojson)
+
+    missing = [key for key in keys if key not in geometries]
+    if missing:
+        try:
+            with connection.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT k.key, ST_AsGeoJSON(ST_SimplifyPreserveTopology(w.geom, %s), 5)
+                    FROM unnest(%s::text[]) AS k(key)
+                    CROSS JOIN LATERAL (
+                        SELECT geom FROM world_countries
+                        WHERE lower(name) = k.key OR lower(name_en) = k.key OR lower(adm0_a3) = k.key
+                        LIMIT 1
+                    ) w
+                    """,
+                    [tolerance, missing]
+                )
+                geometries.update((key, geojson) for key, geojson in cur.fetchall() if geojson)
+        except Exception as fe:
+            logger.debug(f"Fallback geometry fetch failed for {len(missing)} countries: {fe}")
+    return geometries
+
+
+def country_geojson(keys, tolerance=0.02):
+    """
+    Pre-serialized GeoJSON geometries for many countries at a cached tolerance.
+    Lookups go memory -> disk (GEOMETRY_CACHE_DIR) -> one batched PostGIS query.
+    Returns {key: bytes}; unmappable keys are left out (and not cached, so a
+    country resolved by a later upload shows up without a restart).
+    """
+    tolerance = snap_tolerance(tolerance)
+    keys = sorted({key for key in keys if key})
+
+    geometries = {}
+    missing = []
+    for key in keys:
+        data = _geojson_cache.get((tolerance, key))
+        if data is None:
+            data = _read_disk(tolerance, key)
+            if data is not None:
+                _geojson_cache[(tolerance, key)] = data
+        if data is None:
+            missing.append(key)
+        else:
+            geometries[key] = data
+
+    if missing:
+        fetched = _simplified_geojson(missing, tolerance)
+        with _geojson_lock:
+            for key, geojson in fetched.items():
+                data = geojson.encode('utf-8')
+                _geojson_cache[(tolerance, key)] = data
+                _write_disk(tolerance, key, data)
+                geometries[key] = data
+        logger.info(f"Geometry cache miss: simplified {len(fetched)}/{len(missing)} countries at tolerance {tolerance}")
+    return geometries
+
+
+def warm_geojson_cache():
+    """Simplify every stored country at every tolerance level. Returns entries cached."""
+    keys = list(CountryGeometry.objects.filter(geom__isnull=False).values_list('key', flat=True))
+    return sum(len(country_geojson(keys, level)) for level in TOLERANCE_LEVELS)
@@ -0,0 +1,387 @@
+import io
+import time
+import logging
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import connection, transaction
+from .models import DiseaseData, DiseasePoint
+from .geometry import resolve_countries
+from .stats import refresh_rollup
+from .catalog import invalidate_catalog, refresh_catalog
+
+logger = logging.getLogger(__name__)
+
+# Rows parsed and inserted per step; peak memory scales with this, not the file size
+CHUNK_SIZE = getattr(settings, 'INGEST_CHUNK_SIZE', 50000)
+INSERT_BATCH_SIZE = 1000
+
+# How rows reach DiseaseData: 'copy' (COPY FROM STDIN into a temp table,
+# merged with one INSERT ... ON CONFLICT at the end) or 'orm' (bulk_create)
+LOADER = getattr(settings, 'INGEST_LOADER', 'copy')
+
+# append: add days not stored yet, keep existing values
+# upsert: add new days, update days whose cases/deaths changed
+# replace: drop the dataset's rows first, then load the file
+INGEST_MODES = ('append', 'upsert', 'replace')
+
+DEFAULT_DATE = pd.Timestamp('2020-01-01').date()
+
+
+class IngestError(ValueError):
+    """The upload cannot be ingested as given (bad columns, empty file...)"""
+
+
+def detect_columns(columns, country_col='', date_col='', cases_col='', deaths_col=''):
+    """
+    Column mapping for an upload. Columns the user mapped manually win,
+    the rest are auto-detected from the header names.
+    """
+    if not country_col:
+        country_col = next((c for c in columns if 'country' in c.lower()), None)
+    if not date_col:
+        date_col = next((c for c in columns if any(x in c.lower() for x in ['date', 'year', 'time', 'period'])), None)
+
+    # Detect cases and deaths columns separately
+    if not cases_col:
+        cases_col = next((c for c in columns if any(x in c.lower() for x in ['case', 'cases', 'confirmed', 'total', 'count'])), None)
+    if not deaths_col:
+        deaths_col = next((c for c in columns if any(x in c.lower() for x in ['death', 'deaths', 'died', 'mortality', 'fatal'])), None)
+
+    if not country_col or (not cases_col and not deaths_col):
+        raise IngestError('CSV must contain country and cases/deaths columns')
+    for col in (country_col, date_col, cases_col, deaths_col):
+        if col and col not in columns:
+            raise IngestError(f"Column '{col}' not found in CSV")
+
+    return {'country': country_col, 'date': date_col, 'cases': cases_col, 'deaths': deaths_col}
+
+
+def check_dataset_kind(dataset_name, mode, points=False):
+    """
+    A dataset holds either country rows from CSV uploads or points whose
+    country rows are derived, and rewritten, on every point upload (see
+    spatial.py); mixing them would let one overwrite the other. Raises
+    IngestError for such an upload unless mode='replace' starts over.
+    """
+    if mode == 'replace':
+        return
+    if points:
+        mixed = (
+            DiseaseData.objects.filter(dataset_type=dataset_name).exists()
+            and not DiseasePoint.objects.filter(dataset_type=dataset_name).exists()
+        )
+        holds, adding = 'country-level rows', 'point data'
+    else:
+        mixed = DiseasePoint.objects.filter(dataset_type=dataset_name).exists()
+        holds, adding = 'point data', 'country-level rows'
+    if mixed:
+        raise IngestError(
+            f"Dataset '{dataset_name}' holds {holds}, {adding} cannot be added to it. "
+            "Upload into a new dataset or use mode=replace"
+        )
+
+
+def _clean_counts(series):
+    """
+    Whole-column version of int(float(value.replace(',', ''))):
+    thousands separators stripped, unparseable cells -> <NA>.
+    """
+    if not pd.api.types.is_numeric_dtype(series):
+        series = series.astype(str).str.replace(',', '', regex=False)
+    numeric = pd.to_numeric(series, errors='coerce')
+    numeric = numeric.where(np.isfinite(numeric))
+    # int(float(x)) truncates toward zero
+    return np.trunc(numeric).astype('Int64')
+
+
+def _clean_dates(series):
+    """
+    One vectorized to_datetime over the column. Cells that do not match the
+    inferred format are re-parsed individually ('mixed'), the rest of the
+    column never leaves NumPy. Unparseable dates fall back to DEFAULT_DATE.
+    """
+    dates = pd.to_datetime(series, errors='coerce')
+    retry = dates.isna() & series.notna()
+    if retry.any():
+        dates = dates.astype(object)
+        dates[retry] = pd.to_datetime(series[retry].astype(str), errors='coerce', format='mixed')
+        dates = pd.to_datetime(dates, errors='coerce', utc=False)
+    return dates.fillna(pd.Timestamp(DEFAULT_DATE)).dt.date
+
+
+def clean_chunk(df, columns):
+    """
+    Vectorized cleaning of one parsed chunk.
+    Returns (frame, skipped) where frame has country, key, date, cases,
+    deaths columns; rows without a country are dropped via a mask.
+    """
+    countries = df[columns['country']]
+    has_country = countries.notna()
+    skipped = int((~has_country).sum())
+    df = df[has_country]
+
+    country = df[columns['country']].astype(str).str.strip()
+    empty = pd.Series(pd.NA, index=df.index, dtype='Int64')
+    frame = pd.DataFrame({
+        'country': country,
+        'key': country.str.lower(),
+        'date': _clean_dates(df[columns['date']]) if columns['date'] else DEFAULT_DATE,
+        'cases': _clean_counts(df[columns['cases']]) if columns['cases'] else empty,
+        'deaths': _clean_counts(df[columns['deaths']]) if columns['deaths'] else empty,
+    })
+    return frame, skipped
+
+
+def _nullable(series):
+    """Int64 column -> Python ints with None for <NA>"""
+    return series.astype(object).where(series.notna(), None)
+
+
+def load_frame(frame, dataset_name, geometry_ids):
+    """Cleaned chunk -> the DiseaseData column layout (country_geom_id resolved)"""
+    return pd.DataFrame({
+        'dataset_type': dataset_name,
+        'date': frame['date'],
+        'country': frame['country'],
+        'cases': frame['cases'],
+        'deaths': frame['deaths'],
+        'country_geom_id': frame['key'].map(geometry_ids).astype('Int64'),
+    })
+
+
+LOAD_COLUMNS = ['dataset_type', 'date', 'country', 'cases', 'deaths', 'country_geom_id']
+
+
+def merge_rows(cursor, source_sql, mode):
+    """
+    Write the rows selected by source_sql (LOAD_COLUMNS) into DiseaseData.
+    Rows of the same dataset/country/day within the upload are summed first.
+    Existing days are skipped, or with mode='upsert' updated only when their
+    cases/deaths differ, so unchanged history is never rewritten.
+    Returns (inserted, updated).
+    """
+    if mode == 'upsert':
+        conflict = """
+            DO UPDATE SET cases = EXCLUDED.cases, deaths = EXCLUDED.deaths, country_geom_id = EXCLUDED.country_geom_id
+            WHERE (t.cases, t.deaths) IS DISTINCT FROM (EXCLUDED.cases, EXCLUDED.deaths)
+        """
+    else:
+        conflict = 'DO NOTHING'
+    cursor.execute(f"""
+        WITH merged AS (
+            INSERT INTO {DiseaseData._meta.db_table} AS t ({', '.join(LOAD_COLUMNS)})
+            SELECT dataset_type, date, country, SUM(cases), SUM(deaths), MAX(country_geom_id)
+            FROM ({source_sql}) src
+            GROUP BY dataset_type, date, country
+            ON CONFLICT (dataset_type, country, date) {conflict}
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM merged
+    """)
+    inserted, updated = cursor.fetchone()
+    return inserted, updated
+
+
+class OrmLoader:
+    """
+    bulk_create in small batches (portable, slowest). Duplicates are summed
+    per chunk only; across chunks the first (append) or last (upsert) wins,
+    and inserted/updated counts are not known.
+    """
+
+    def __init__(self, cursor, mode='append'):
+        self.mode = mode
+
+    def load(self, rows):
+        rows = rows.groupby(['dataset_type', 'date', 'country'], as_index=False, sort=False).agg(
+            cases=('cases', lambda v: v.sum(min_count=1)),
+            deaths=('deaths', lambda v: v.sum(min_count=1)),
+            country_geom_id=('country_geom_id', 'max'),
+        )
+        records = [
+            DiseaseData(
+                dataset_type=dataset_type,
+                date=date_val,
+                country=country,
+                cases=cases,
+                deaths=deaths,
+                country_geom_id=geom_id
+            )
+            for dataset_type, date_val, country, cases, deaths, geom_id in zip(
+                rows['dataset_type'], rows['date'], rows['country'],
+                _nullable(rows['cases']), _nullable(rows['deaths']), _nullable(rows['country_geom_id'])
+            )
+        ]
+        if self.mode == 'upsert':
+            DiseaseData.objects.bulk_create(
+                records, batch_size=INSERT_BATCH_SIZE, update_conflicts=True,
+                unique_fields=['dataset_type', 'country', 'date'],
+                update_fields=['cases', 'deaths', 'country_geom'],
+            )
+        else:
+            DiseaseData.objects.bulk_create(records, batch_size=INSERT_BATCH_SIZE, ignore_conflicts=True)
+
+    def finish(self):
+        return None
+
+
+class CopyLoader:
+    """
+    Streams each chunk through COPY ... FROM STDIN (CSV) into a temporary
+    table; finish() merges it into DiseaseData with merge_rows. Must run
+    inside a transaction.
+    """
+
+    STAGING_TABLE = 'ingest_staging'
+
+    def __init__(self, cursor, mode='append'):
+        self.cursor = cursor
+        self.mode = mode
+        # ON COMMIT DROP only fires when the outermost transaction commits:
+        # an earlier ingest in the same one (ATOMIC_REQUESTS, tests) left it
+        self.cursor.execute(f"DROP TABLE IF EXISTS {self.STAGING_TABLE}")
+        self.cursor.execute(f"""
+            CREATE TEMPORARY TABLE {self.STAGING_TABLE} (
+                dataset_type varchar(50) NOT NULL,
+                date date NOT NULL,
+                country varchar(100) NOT NULL,
+                cases integer,
+                deaths integer,
+                country_geom_id bigint
+            ) ON COMMIT DROP
+        """)
+
+    def load(self, rows):
+        buf = io.StringIO()
+        rows[LOAD_COLUMNS].to_csv(buf, index=False, header=False, na_rep='\\N')
+        buf.seek(0)
+        copy_from(self.cursor, f"COPY {self.STAGING_TABLE} ({', '.join(LOAD_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf)
+
+    def finish(self):
+        return merge_rows(self.cursor, f"SELECT {', '.join(LOAD_COLUMNS)} FROM {self.STAGING_TABLE}", self.mode)
+
+
+def copy_from(cursor, sql, buf):
+    """COPY FROM STDIN through Django's cursor on either psycopg2 or psycopg 3"""
+    raw = cursor.cursor
+    if hasattr(raw, 'copy_expert'):
+        raw.copy_expert(sql, buf)
+    else:
+        with raw.copy(sql) as copy:
+            while data := buf.read(1 << 20):
+                copy.write(data)
+
+
+LOADERS = {
+    'orm': OrmLoader,
+    'copy': CopyLoader,
+    # Older name of 'copy', which now always stages
+    'copy_staged': CopyLoader,
+}
+
+
+def ingest_csv(file, dataset_name, mapping=None, chunksize=CHUNK_SIZE, progress=None, options=None, mode='append'):
+    """
+    Stream a CSV (path or file object) into DiseaseData chunk by chunk:
+    each chunk is parsed, resolved and staged before the next is read.
+
+    mapping holds optional manual columns (country/date/cases/deaths),
+    options the sniffed format (delimiter/encoding, see sniff.py) and mode
+    one of INGEST_MODES.
+    progress, if given, is called after every chunk with a dict of counters.
+    Returns a summary dict; raises IngestError for unusable files.
+    """
+    if mode not in INGEST_MODES:
+        raise IngestError(f"Unknown ingest mode '{mode}'")
+    mapping = mapping or {}
+    options = options or {}
+    start_time = time.time()
+    columns = None
+    geometry_ids = {}
+    touched_countries = set()
+    # rows_staged: cleaned rows handed to the loader; what the merge inserts is only known at the end
+    counters = {'chunks': 0, 'rows_parsed': 0, 'rows_staged': 0, 'skipped': 0}
+
+    # All-or-nothing: a failed chunk rolls back every row of this upload
+    with transaction.atomic(), connection.cursor() as cursor:
+        check_dataset_kind(dataset_name, mode)
+        if mode == 'replace':
+            DiseasePoint.objects.filter(dataset_type=dataset_name).delete()
+            DiseaseData.objects.filter(dataset_type=dataset_name).delete()
+        loader = LOADERS[LOADER](cursor, mode)
+        reader = pd.read_csv(
+            file, sep=options.get('delimiter', ','), encoding=options.get('encoding', 'utf-8'),
+            low_memory=False, chunksize=chunksize
+        )
+        for df in reader:
+            if columns is None:
+                columns = detect_columns(
+                    list(df.columns),
+                    mapping.get('country', ''), mapping.get('date', ''),
+                    mapping.get('cases', ''), mapping.get('deaths', '')
+                )
+                logger.info(f"Using columns: country='{columns['country']}', cases='{columns['cases']}', deaths='{columns['deaths']}', date='{columns['date']}'")
+                for kind in ('cases', 'deaths'):
+                    if columns[kind]:
+                        logger.info(f"Sample values from {columns[kind]}: {df[columns[kind]].head(3).tolist()}")
+
+            frame, skipped = clean_chunk(df, columns)
+
+            # Only countries not seen in earlier chunks need resolving
+            new_keys = frame['key'].drop_duplicates()
+            new_keys = new_keys[~new_keys.isin(geometry_ids.keys())]
+            if len(new_keys):
+                geometry_ids.update(resolve_countries(frame.loc[new_keys.index, 'country']))
+
+            try:
+                loader.load(load_frame(frame, dataset_name, geometry_ids))
+            except Exception as insert_err:
+                logger.error(f"Insert error in chunk {counters['chunks'] + 1}: {insert_err}")
+                raise
+            touched_countries.update(frame['country'].unique())
+
+            counters['chunks'] += 1
+            counters['rows_parsed'] += len(df)
+            counters['rows_staged'] += len(frame)
+            counters['skipped'] += skipped
+            if hasattr(file, 'tell'):
+                counters['bytes_read'] = file.tell()
+            elapsed = time.time() - start_time
+            counters['rows_per_sec'] = round(counters['rows_parsed'] / elapsed) if elapsed > 0 else 0
+            logger.info(
+                f"   Chunk {counters['chunks']}: {len(frame)} rows loaded "
+                f"({counters['rows_staged']} total, {counters['skipped']} skipped, {counters['rows_per_sec']} rows/sec)"
+            )
+            if progress:
+                progress(dict(counters))
+
+        if columns is None:
+            raise IngestError('CSV file is empty')
+
+        merged = loader.finish()
+        inserted, updated = merged if merged is not None else (counters['rows_staged'], 0)
+
+        # Keep the monthly rollup and the catalog in sync for the countries this file touched
+        if mode == 'replace':
+            refresh_rollup(dataset_name)
+        elif touched_countries:
+            refresh_rollup(dataset_name, touched_countries)
+        refresh_catalog(dataset_name, changed=bool(inserted or updated) or mode == 'replace')
+        transaction.on_commit(invalidate_catalog)
+
+    elapsed = time.time() - start_time
+    logger.info(
+        f"Upload complete ({mode})! {counters['rows_staged']} rows staged, {inserted} inserted, "
+        f"{updated} updated in {elapsed:.2f}s ({counters['rows_per_sec']} rows/sec)"
+    )
+    return {
+        'imported': inserted,
+        'updated': updated,
+        'mode': mode,
+        'total_rows': counters['rows_parsed'],
+        'skipped': counters['skipped'],
+        'chunks': counters['chunks'],
+        'dataset': dataset_name,
+        'elapsed_seconds': round(elapsed, 2)
+    }
@@ -0,0 +1,292 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import logging
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+from django.utils import timezone
+from .models import IngestJob
+from .ingest import IngestError, ingest_csv
+from .parallel import PARALLEL_MIN_BYTES, PARALLEL_WORKERS, ingest_parallel, sweep_staging_tables
+from .spatial import ingest_points, is_point_mapping
+
+logger = logging.getLogger(__name__)
+
+# 'thread': run jobs in a pool inside the web process.
+# 'worker': only queue them; `manage.py run_ingest_worker` picks them up.
+RUNNER = getattr(settings, 'INGEST_RUNNER', 'thread')
+WORKERS = getattr(settings, 'INGEST_WORKERS', 2)
+UPLOAD_DIR = getattr(settings, 'INGEST_UPLOAD_DIR', os.path.join(settings.BASE_DIR, 'uploads'))
+# Files sniffed by /api/detect-columns/ but never ingested are removed after this
+UPLOAD_TOKEN_TTL = getattr(settings, 'INGEST_UPLOAD_TOKEN_TTL', 24 * 3600)
+
+TOKEN_RE = re.compile(r'^[0-9a-f]{32}$')
+
+# Session-level advisory lock held by the process running a job, on the
+# ProgressReporter connection: it goes away with that process, which is how
+# recover_jobs() tells a running job from one whose process died
+JOB_LOCK_SQL = "SELECT pg_try_advisory_lock(hashtextextended(%s, 0))"
+JOB_UNLOCK_SQL = "SELECT pg_advisory_unlock(hashtextextended(%s, 0))"
+# A job just claimed takes its lock a moment later; leave it alone meanwhile
+RECOVER_GRACE_SECONDS = 60
+
+_executor = None
+
+
+def save_upload(uploaded_file, name):
+    """Stream an UploadedFile to INGEST_UPLOAD_DIR without loading it in memory. Returns the path."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(str(UPLOAD_DIR), f"{name}.csv")
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        # Already on disk: a rename instead of a second copy
+        uploaded_file.file.close()
+        shutil.move(uploaded_file.temporary_file_path(), path)
+        return path
+    with open(path, 'wb') as fh:
+        for chunk in uploaded_file.chunks():
+            fh.write(chunk)
+    return path
+
+
+def _sidecar_path(token):
+    return os.path.join(str(UPLOAD_DIR), f"{token}.json")
+
+
+def stage_upload(uploaded_file, options):
+    """
+    Keep a sniffed upload on disk so /api/upload/ can ingest it by token
+    instead of receiving the file again. options (delimiter, encoding) go to
+    a JSON sidecar next to the file. Returns the token.
+    """
+    purge_stale_uploads()
+    token = uuid.uuid4().hex
+    path = save_upload(uploaded_file, token)
+    register_upload(token, path, uploaded_file.name, options)
+    return token
+
+
+def register_upload(token, path, file_name, options):
+    """Write the sidecar that makes the file at path claimable with take_upload(token)"""
+    meta = {
+        'file_name': file_name,
+        'file_size': os.path.getsize(path),
+        'options': options,
+        'created': time.time(),
+    }
+    with open(_sidecar_path(token), 'w', encoding='utf-8') as fh:
+        json.dump(meta, fh)
+
+
+def take_upload(token):
+    """
+    Claim a staged upload: (path, meta) or None for unknown/expired tokens.
+    The sidecar is removed, so a token can be used once.
+    """
+    if not TOKEN_RE.match(token or ''):
+        return None
+    sidecar = _sidecar_path(token)
+    try:
+        with open(sidecar, encoding='utf-8') as fh:
+            meta = json.load(fh)
+        os.remove(sidecar)
+    except (OSError, ValueError):
+        return None
+    path = os.path.join(str(UPLOAD_DIR), f"{token}.csv")
+    if not os.path.exists(path):
+        return None
+    return path, meta
+
+
+def purge_stale_uploads():
+    """
+    Delete staged uploads and unfinished chunked uploads older than
+    INGEST_UPLOAD_TOKEN_TTL, and staging tables of crashed parallel ingests.
+    """
+    sweep_staging_tables()
+    if not os.path.isdir(UPLOAD_DIR):
+        return
+    cutoff = time.time() - UPLOAD_TOKEN_TTL
+    for name in os.listdir(UPLOAD_DIR):
+        if not name.endswith('.json'):
+            continue
+        sidecar = os.path.join(str(UPLOAD_DIR), name)
+        token = name.split('.', 1)[0]
+        try:
+            if os.path.getmtime(sidecar) < cutoff:
+                os.remove(sidecar)
+                os.remove(os.path.join(str(UPLOAD_DIR), f"{token}.csv"))
+                shutil.rmtree(os.path.join(str(UPLOAD_DIR), f"{token}.chunks"), ignore_errors=True)
+        except OSError:
+            pass
+
+
+def create_job(file_path, file_name, dataset_name, mapping, options=None, mode='append'):
+    """Queue an IngestJob for a file already in INGEST_UPLOAD_DIR and start it if running in-process"""
+    job = IngestJob(
+        dataset_type=dataset_name, file_name=file_name, file_path=file_path,
+        file_size=os.path.getsize(file_path), mapping=mapping, csv_options=options or {}, mode=mode
+    )
+    job.save()
+    if RUNNER == 'thread':
+        # Start only once the job row is visible to the pool's own connection
+        transaction.on_commit(lambda: _submit(job.id))
+    return job
+
+
+def _submit(job_id):
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='ingest')
+        # First job since this process started: pick up what a previous one left
+        for queued_id in recover_jobs():
+            if queued_id != job_id:
+                _executor.submit(run_job, queued_id)
+    _executor.submit(run_job, job_id)
+
+
+def recover_jobs():
+    """
+    Clean up after processes that died mid-job (run at worker startup):
+    'running' jobs whose process no longer holds their lock are marked
+    failed, and staging tables they left are dropped. Returns the ids of
+    jobs still queued, for runners that must submit them again.
+    """
+    failed = 0
+    with connection.cursor() as cursor:
+        started_before = timezone.now() - timedelta(seconds=RECOVER_GRACE_SECONDS)
+        for job in IngestJob.objects.filter(status='running', started_at__lt=started_before):
+            cursor.execute(JOB_LOCK_SQL, [str(job.id)])
+            if not cursor.fetchone()[0]:
+                continue  # still owned by a live process
+            try:
+                failed += IngestJob.objects.filter(id=job.id, status='running').update(
+                    status='failed', finished_at=timezone.now(),
+                    error='Upload interrupted: the ingest process stopped before finishing, please upload the file again',
+                )
+            finally:
+                cursor.execute(JOB_UNLOCK_SQL, [str(job.id)])
+    if failed:
+        logger.warning(f"Marked {failed} interrupted ingest job(s) as failed")
+    sweep_staging_tables()
+    return list(IngestJob.objects.filter(status='queued').order_by('created_at').values_list('id', flat=True))
+
+
+def claim_next_job():
+    """Atomically move the oldest queued job to running. Returns it or None."""
+    with transaction.atomic():
+        job = (
+            IngestJob.objects.select_for_update(skip_locked=True)
+            .filter(status='queued')
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = 'running'
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+    return job
+
+
+class ProgressReporter:
+    """
+    Writes ingest counters to the job row through a separate connection:
+    the ingest itself runs in one long transaction, so updates made on the
+    main connection would stay invisible to /api/upload-status/ until commit.
+    """
+
+    MIN_INTERVAL = 0.5
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.conn = connections.create_connection('default')
+        self.last_write = 0
+        # Marks the job as owned by this process until close() (see recover_jobs)
+        with self.conn.cursor() as cur:
+            cur.execute(JOB_LOCK_SQL, [str(job_id)])
+
+    def __call__(self, counters):
+        now = time.time()
+        if now - self.last_write < self.MIN_INTERVAL:
+            return
+        self.last_write = now
+        with self.conn.cursor() as cur:
+            cur.execute(
+                f"""
+                UPDATE {IngestJob._meta.db_table}
+                SET bytes_read = %s, rows_parsed = %s, rows_staged = %s, skipped = %s, rows_per_sec = %s
+                WHERE id = %s
+                """,
+                [
+                    counters.get('bytes_read', 0), counters['rows_parsed'], counters['rows_staged'],
+                    counters['skipped'], counters.get('rows_per_sec', 0), self.job_id
+                ]
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+def run_job(job_id, claimed=False):
+    """
+    Ingest one job's file. Safe to call from a worker thread or process.
+    claimed=True when the caller already moved the job to running (see
+    claim_next_job); otherwise it is claimed here.
+    """
+    close_old_connections()
+    try:
+        if not claimed:
+            # Conditional update: only one caller wins a queued job, so a job
+            # resubmitted by recover_jobs() or seen by two processes runs once
+            won = IngestJob.objects.filter(id=job_id, status='queued').update(
+                status='running', started_at=timezone.now()
+            )
+            if not won:
+                return
+        job = IngestJob.objects.get(id=job_id)
+
+        reporter = ProgressReporter(job.id)
+        # Progress counters were written by the reporter; only touch them on success
+        update_fields = ['status', 'error', 'result', 'finished_at']
+        try:
+            if is_point_mapping(job.mapping):
+                with open(job.file_path, 'rb') as fh:
+                    result = ingest_points(fh, job.dataset_type, job.mapping, progress=reporter, options=job.csv_options, mode=job.mode)
+            elif PARALLEL_WORKERS > 1 and job.file_size >= PARALLEL_MIN_BYTES:
+                result = ingest_parallel(
+                    job.file_path, job.dataset_type, job.mapping, progress=reporter,
+                    options=job.csv_options, mode=job.mode, job_id=job.id
+                )
+            else:
+                with open(job.file_path, 'rb') as fh:
+                    result = ingest_csv(fh, job.dataset_type, job.mapping, progress=reporter, options=job.csv_options, mode=job.mode)
+        except IngestError as e:
+            job.status, job.error = 'failed', str(e)
+        except Exception as e:
+            logger.error(f"Ingest job {job.id} failed: {e}", exc_info=True)
+            job.status, job.error = 'failed', f'Upload failed: {str(e)}'
+        else:
+            job.status, job.result = 'done', result
+            job.bytes_read = job.file_size
+            job.rows_parsed = result['total_rows']
+            job.rows_inserted = result['imported']
+            job.skipped = result['skipped']
+            job.rows_per_sec = round(result['total_rows'] / result['elapsed_seconds']) if result['elapsed_seconds'] else 0
+            update_fields += ['bytes_read', 'rows_parsed', 'rows_inserted', 'skipped', 'rows_per_sec']
+        finally:
+            reporter.close()
+
+        job.finished_at = timezone.now()
+        job.save(update_fields=update_fields)
+        try:
+            os.remove(job.file_path)
+        except OSError:
+            pass
+    finally:
+        # Worker threads own their connection; don't leak it
+        connection.close()
@@ -0,0 +1,104 @@
+import re
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+BENCH_TABLE = 'bench_diseasedata'
+
+# What DiseaseData is indexed with: disease_dataset_date_idx, and the index
+# behind the unique_disease_day constraint, which since migration 0019
+# carries INCLUDE (cases, deaths) and replaced disease_ds_country_date_idx.
+# Not UNIQUE here: generated rows may repeat a dataset/country/day.
+INDEXES = [
+    f"CREATE INDEX bench_dataset_date_idx ON {BENCH_TABLE} (dataset_type, date)",
+    f"CREATE INDEX bench_ds_country_date_idx ON {BENCH_TABLE} (dataset_type, country, date) INCLUDE (cases, deaths)",
+]
+
+# The queries the dashboard actually runs against DiseaseData
+QUERIES = [
+    ("dataset exists", f"SELECT 1 FROM {BENCH_TABLE} WHERE dataset_type = %s LIMIT 1"),
+    ("year of one dataset, grouped by country/month", f"""
+        SELECT country, EXTRACT(YEAR FROM date), EXTRACT(MONTH FROM date), SUM(cases), SUM(deaths)
+        FROM {BENCH_TABLE}
+        WHERE dataset_type = %s AND date BETWEEN '2020-01-01' AND '2020-12-31'
+        GROUP BY 1, 2, 3
+    """),
+    ("one country of one dataset", f"""
+        SELECT SUM(cases), SUM(deaths) FROM {BENCH_TABLE}
+        WHERE dataset_type = %s AND country = 'country_7' AND date BETWEEN '2020-01-01' AND '2020-12-31'
+    """),
+    ("distinct datasets", f"SELECT DISTINCT dataset_type FROM {BENCH_TABLE}"),
+]
+
+
+class Command(BaseCommand):
+    help = "Show query plans and timings for DiseaseData access patterns before/after adding its indexes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=3_000_000, help="Rows to generate (default 3M)")
+        parser.add_argument('--datasets', type=int, default=5)
+        parser.add_argument('--countries', type=int, default=200)
+        parser.add_argument('--keep', action='store_true', help="Keep the generated table afterwards")
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cur:
+            self.generate(cur, options['rows'], options['datasets'], options['countries'])
+            try:
+                before = self.run_queries(cur, "WITHOUT indexes")
+
+                self.stdout.write("Creating indexes...")
+                for sql in INDEXES:
+                    cur.execute(sql)
+                # VACUUM sets the visibility map so index-only scans are possible
+                cur.execute(f"VACUUM ANALYZE {BENCH_TABLE}")
+
+                after = self.run_queries(cur, "WITH indexes")
+            finally:
+                if not options['keep']:
+                    cur.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+
+        self.stdout.write("\nSummary (execution time, ms)")
+        for (label, _), t_before, t_after in zip(QUERIES, before, after):
+            speedup = f"{t_before / t_after:.1f}x" if t_after else "-"
+            self.stdout.write(f"  {label:<48} {t_before:>10.2f} {t_after:>10.2f}  {speedup}")
+
+    def generate(self, cur, rows, datasets, countries):
+        self.stdout.write(f"Generating {rows:,} rows in {BENCH_TABLE} ({datasets} datasets, {countries} countries)...")
+        cur.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        cur.execute(f"""
+            CREATE UNLOGGED TABLE {BENCH_TABLE} (
+                id bigserial PRIMARY KEY,
+                dataset_type varchar(50) NOT NULL,
+                date date NOT NULL,
+                country varchar(100) NOT NULL,
+                cases integer,
+                deaths integer
+            )
+        """)
+        cur.execute(f"""
+            INSERT INTO {BENCH_TABLE} (dataset_type, date, country, cases, deaths)
+            SELECT 'dataset_' || mod(i, %s),
+                   DATE '2015-01-01' + mod(i / (%s * %s), 3650)::int,
+                   'country_' || mod(i / %s, %s),
+                   (random() * 1000)::int,
+                   (random() * 50)::int
+            FROM generate_series(1, %s) AS i
+        """, [datasets, datasets, countries, datasets, countries, rows])
+        cur.execute(f"VACUUM ANALYZE {BENCH_TABLE}")
+
+    def run_queries(self, cur, title):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n=== {title} ==="))
+        timings = []
+        for label, sql in QUERIES:
+            params = ['dataset_1'] if '%s' in sql else None
+            # Warm the cache once so both runs measure the same thing
+            cur.execute(sql, params)
+            cur.fetchall()
+            cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params)
+            plan = [row[0] for row in cur.fetchall()]
+            match = re.search(r"Execution Time: ([\d.]+) ms", plan[-1])
+            timings.append(float(match.group(1)) if match else 0.0)
+
+            self.stdout.write(f"\n-- {label}")
+            for line in plan:
+                self.stdout.write(f"   {line}")
+        return timings
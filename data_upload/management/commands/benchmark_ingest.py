@@ -0,0 +1,101 @@
+import time
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from data_upload.ingest import DEFAULT_DATE, clean_chunk
+
+COLUMNS = {'country': 'Country', 'date': 'Date', 'cases': 'Cases', 'deaths': 'Deaths'}
+
+
+def legacy_parse(df, columns):
+    """The per-row itertuples loop upload_csv used before vectorized cleaning"""
+    rows = []
+    skipped = 0
+    country_idx = df.columns.get_loc(columns['country'])
+    cases_idx = df.columns.get_loc(columns['cases'])
+    deaths_idx = df.columns.get_loc(columns['deaths'])
+    date_idx = df.columns.get_loc(columns['date'])
+
+    for row in df.itertuples(index=False):
+        raw_country = row[country_idx]
+        if pd.isna(raw_country):
+            skipped += 1
+            continue
+        country_clean = str(raw_country).strip()
+
+        counts = []
+        for idx in (cases_idx, deaths_idx):
+            value = None
+            raw = row[idx]
+            try:
+                if isinstance(raw, str):
+                    raw = raw.replace(',', '')
+                if pd.notna(raw) and raw != '':
+                    value = int(float(raw))
+            except (ValueError, TypeError):
+                value = None
+            counts.append(value)
+
+        try:
+            dt = pd.to_datetime(row[date_idx], errors='coerce')
+            date_val = dt.date() if pd.notna(dt) else DEFAULT_DATE
+        except Exception:
+            date_val = DEFAULT_DATE
+
+        rows.append((country_clean, date_val, counts[0], counts[1]))
+    return rows, skipped
+
+
+def generate_frame(rows, seed=0):
+    """CSV-like frame with thousands separators, blanks and missing countries"""
+    rng = np.random.default_rng(seed)
+    countries = np.array([f" Country {i} " for i in range(200)], dtype=object)
+    dates = pd.date_range('2015-01-01', periods=3650).strftime('%Y-%m-%d').to_numpy(dtype=object)
+
+    country = countries[rng.integers(0, len(countries), rows)]
+    country[rng.random(rows) < 0.01] = None
+    cases = pd.Series(rng.integers(0, 5_000_000, rows)).map('{:,}'.format).to_numpy(dtype=object)
+    cases[rng.random(rows) < 0.02] = ''
+    deaths = rng.integers(0, 5000, rows).astype(float)
+    deaths[rng.random(rows) < 0.05] = np.nan
+
+    return pd.DataFrame({
+        'Country': country,
+        'Date': dates[rng.integers(0, len(dates), rows)],
+        'Cases': cases,
+        'Deaths': deaths,
+    })
+
+
+class Command(BaseCommand):
+    help = "Compare row-by-row vs vectorized CSV chunk cleaning throughput (no database writes)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help="Rows to generate (default 1M)")
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        self.stdout.write(f"Generating {rows:,} rows...")
+        df = generate_frame(rows)
+
+        started = time.perf_counter()
+        legacy_rows, legacy_skipped = legacy_parse(df, COLUMNS)
+        legacy_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        frame, skipped = clean_chunk(df, COLUMNS)
+        vector_elapsed = time.perf_counter() - started
+
+        # Both paths must agree before the timings mean anything
+        vector_rows = list(zip(
+            frame['country'], frame['date'],
+            frame['cases'].astype(object).where(frame['cases'].notna(), None),
+            frame['deaths'].astype(object).where(frame['deaths'].notna(), None),
+        ))
+        if skipped != legacy_skipped or vector_rows != legacy_rows:
+            self.stderr.write(self.style.ERROR("Vectorized output differs from the row loop"))
+            return
+
+        self.stdout.write(f"  row loop    {legacy_elapsed:8.2f}s  {rows / legacy_elapsed:12,.0f} rows/sec")
+        self.stdout.write(f"  vectorized  {vector_elapsed:8.2f}s  {rows / vector_elapsed:12,.0f} rows/sec")
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {legacy_elapsed / vector_elapsed:.1f}x (outputs identical)"))
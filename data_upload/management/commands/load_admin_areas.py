@@ -0,0 +1,73 @@
+from django.contrib.gis.gdal import DataSource
+from django.contrib.gis.geos import MultiPolygon
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from data_upload.geometry import country_key
+from data_upload.models import AdminArea
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        "Load administrative boundaries of one level (shapefile, GeoJSON, GeoPackage...) into AdminArea. "
+        "Load parents first: level 0, then 1, then 2..."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Any vector file GDAL can read")
+        parser.add_argument('--level', type=int, required=True, help="Admin level of the file (0 = country)")
+        parser.add_argument('--code-field', required=True, help="Unique id field, e.g. GID_2")
+        parser.add_argument('--name-field', required=True, help="Name field, e.g. NAME_2")
+        parser.add_argument('--parent-field', help="Field holding the parent's code, e.g. GID_1 (required for level > 0)")
+        parser.add_argument('--layer', default=0, help="Layer name or index (default: first layer)")
+
+    def handle(self, *args, **options):
+        level = options['level']
+        if level > 0 and not options['parent_field']:
+            raise CommandError("--parent-field is required for level > 0")
+        layer_ref = options['layer']
+        layer = DataSource(options['path'])[int(layer_ref) if str(layer_ref).isdigit() else layer_ref]
+
+        parents = {}
+        if level > 0:
+            parents = dict(AdminArea.objects.filter(level=level - 1).values_list('code', 'id'))
+            if not parents:
+                raise CommandError(f"No level {level - 1} areas loaded yet")
+
+        loaded, orphans, batch = 0, 0, []
+        with transaction.atomic():
+            for feature in layer:
+                geom = feature.geom
+                if geom.srid != 4326:
+                    geom.transform(4326)
+                geom = geom.geos
+                if geom.geom_type == 'Polygon':
+                    geom = MultiPolygon(geom, srid=4326)
+                elif geom.geom_type != 'MultiPolygon':
+                    continue
+
+                parent_id = None
+                if level > 0:
+                    parent_id = parents.get(str(feature.get(options['parent_field'])))
+                    if parent_id is None:
+                        orphans += 1
+                name = str(feature.get(options['name_field']))
+                batch.append(AdminArea(
+                    level=level, code=str(feature.get(options['code_field'])), name=name,
+                    key=country_key(name), parent_id=parent_id, geom=geom,
+                ))
+                if len(batch) >= BATCH_SIZE:
+                    loaded += self._save(batch)
+                    batch = []
+            loaded += self._save(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Loaded {loaded} level {level} areas ({orphans} without a parent)"))
+
+    def _save(self, batch):
+        # Re-running a file updates areas in place, keeping ids points refer to
+        AdminArea.objects.bulk_create(
+            batch, update_conflicts=True, unique_fields=['code'],
+            update_fields=['level', 'name', 'key', 'parent', 'geom'],
+        )
+        return len(batch)
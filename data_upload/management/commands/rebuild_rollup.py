@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from data_upload.models import DatasetCatalog, DiseaseData, DiseaseRollup
+from data_upload.stats import refresh_rollup
+from data_upload.catalog import refresh_catalog
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-dataset, per-country, per-month DiseaseRollup table and the dataset catalog from DiseaseData"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', help="Only rebuild this dataset (default: all datasets)")
+
+    def handle(self, *args, **options):
+        if options['dataset']:
+            datasets = [options['dataset']]
+        else:
+            datasets = list(
+                DiseaseData.objects.values_list('dataset_type', flat=True).distinct().order_by('dataset_type')
+            )
+            # Drop rollups of datasets that no longer have any rows
+            DiseaseRollup.objects.exclude(dataset_type__in=datasets).delete()
+            DatasetCatalog.objects.exclude(name__in=datasets).delete()
+
+        for dataset in datasets:
+            written = refresh_rollup(dataset)
+            # New version: responses cached from the drifted rollup are not reused
+            refresh_catalog(dataset, changed=True)
+            self.stdout.write(f"{dataset}: {written} monthly rows")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollup for {len(datasets)} dataset(s)"))
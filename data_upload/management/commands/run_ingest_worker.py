@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from data_upload.jobs import claim_next_job, recover_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Process queued CSV ingest jobs (use with INGEST_RUNNER = 'worker')"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty")
+
+    def handle(self, *args, **options):
+        # Jobs a crashed worker left 'running' would otherwise never finish
+        recover_jobs()
+        self.stdout.write("Waiting for ingest jobs...")
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f"Job {job.id}: {job.file_name} -> {job.dataset_type}")
+            run_job(job.id, claimed=True)
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from data_upload.geometry import TOLERANCE_LEVELS, warm_geojson_cache
+
+
+class Command(BaseCommand):
+    help = "Pre-simplify every country geometry at all tolerance levels (fills GEOMETRY_CACHE_DIR)"
+
+    def handle(self, *args, **options):
+        cached = warm_geojson_cache()
+        self.stdout.write(self.style.SUCCESS(
+            f"Cached {cached} geometries across tolerance levels {', '.join(map(str, TOLERANCE_LEVELS))}"
+        ))
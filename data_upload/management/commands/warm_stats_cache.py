@@ -0,0 +1,51 @@
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from data_upload.catalog import catalog
+from data_upload.geometry import snap_tolerance
+from data_upload.response_cache import CACHE_ALIAS, cached_body
+from data_upload.views import gis_stats_body, stats_body, stats_cache_key
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-compute the stats responses the map requests (one per dataset, year and sort order). "
+        "Needs a cache the web processes share (Redis, Memcached, database, file)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', help="Only warm this dataset")
+        parser.add_argument('--tolerance', type=float, default=0.02,
+                            help="Geometry tolerance of the /api/gis-stats/ responses to warm")
+
+    def handle(self, *args, **options):
+        cache = caches[CACHE_ALIAS]
+        if isinstance(cache, (LocMemCache, DummyCache)):
+            # Entries would live in this command's process and die with it
+            raise CommandError(
+                f"CACHES['{CACHE_ALIAS}'] is {type(cache).__name__}, which the web processes do not share; "
+                "configure a shared backend (Redis, Memcached, database or file) to warm it"
+            )
+        tolerance = snap_tolerance(options['tolerance'])
+        warmed = 0
+        for name, entry in sorted(catalog().items()):
+            if options['dataset'] and name != options['dataset']:
+                continue
+            if not entry['first_date'] or not entry['last_date']:
+                continue
+            # Same keys as the map's year slider: ?start_date=YYYY-01-01&end_date=YYYY-12-31
+            for year in range(entry['first_date'].year, entry['last_date'].year + 1):
+                start, end = f"{year}-01-01", f"{year}-12-31"
+                for sort_by in ('cases', 'deaths'):
+                    cached_body(
+                        stats_cache_key('stats', name, start, end, sort_by, breaks='quantile'),
+                        lambda: stats_body(name, start, end, sort_by)
+                    )
+                    cached_body(
+                        stats_cache_key('gis-stats', name, start, end, sort_by, tolerance=tolerance, breaks='quantile'),
+                        lambda: gis_stats_body(name, start, end, sort_by, tolerance)
+                    )
+                    warmed += 2
+            self.stdout.write(f"{name}: {entry['first_date'].year}-{entry['last_date'].year}")
+        self.stdout.write(self.style.SUCCESS(f"Warmed {warmed} stats responses"))
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-17 09:12
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# One CountryGeometry per normalized country name, preferring a non-empty
+# geometry from the most recent row, then point every data row at it.
+DEDUPE_GEOMETRIES = """
+INSERT INTO data_upload_countrygeometry (key, name, geom)
+SELECT DISTINCT ON (lower(btrim(country)))
+       lower(btrim(country)),
+       btrim(country),
+       CASE WHEN geom IS NULL OR ST_IsEmpty(geom) THEN NULL ELSE geom END
+FROM data_upload_diseasedata
+WHERE btrim(country) <> ''
+ORDER BY lower(btrim(country)), (geom IS NULL OR ST_IsEmpty(geom)), id DESC
+ON CONFLICT (key) DO NOTHING;
+
+UPDATE data_upload_diseasedata d
+SET country_geom_id = g.id
+FROM data_upload_countrygeometry g
+WHERE g.key = lower(btrim(d.country));
+"""
+
+RESTORE_GEOMETRIES = """
+UPDATE data_upload_diseasedata d
+SET geom = g.geom
+FROM data_upload_countrygeometry g
+WHERE g.id = d.country_geom_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_upload', '0006_discussionmessage_reply_to'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountryGeometry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('geom', django.contrib.gis.db.models.fields.MultiPolygonField(null=True, srid=4326)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='diseasedata',
+            name='country_geom',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='records', to='data_upload.countrygeometry'),
+        ),
+        migrations.RunSQL(DEDUPE_GEOMETRIES, RESTORE_GEOMETRIES),
+        migrations.RemoveField(
+            model_name='diseasedata',
+            name='geom',
+        ),
+    ]
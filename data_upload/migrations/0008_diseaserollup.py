@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-17 10:03
+
+from django.db import migrations, models
+
+
+BUILD_ROLLUP = """
+INSERT INTO data_upload_diseaserollup (dataset_type, country, year, month, cases, deaths, rows)
+SELECT dataset_type, country,
+       EXTRACT(YEAR FROM date)::int, EXTRACT(MONTH FROM date)::int,
+       COALESCE(SUM(cases), 0), COALESCE(SUM(deaths), 0), COUNT(*)
+FROM data_upload_diseasedata
+GROUP BY 1, 2, 3, 4;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_upload', '0007_countrygeometry_diseasedata_country_geom'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiseaseRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dataset_type', models.CharField(max_length=50)),
+                ('country', models.CharField(max_length=100)),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField()),
+                ('cases', models.BigIntegerField(default=0)),
+                ('deaths', models.BigIntegerField(default=0)),
+                ('rows', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('dataset_type', 'country', 'year', 'month'), name='unique_rollup_month')],
+            },
+        ),
+        migrations.RunSQL(BUILD_ROLLUP, migrations.RunSQL.noop),
+    ]
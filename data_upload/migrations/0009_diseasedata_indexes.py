@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-17 10:41
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction; building
+    # concurrently keeps uploads and the dashboard usable on large tables.
+    atomic = False
+
+    dependencies = [
+        ('data_upload', '0008_diseaserollup'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='diseasedata',
+            index=models.Index(fields=['dataset_type', 'date'], name='disease_dataset_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='diseasedata',
+            index=models.Index(fields=['dataset_type', 'country', 'date'], include=['cases', 'deaths'], name='disease_ds_country_date_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-17 11:26
+
+from django.db import migrations
+
+
+# world_countries is an imported reference table (not managed by Django), so
+# the indexes are only created when it exists. They back the lower(...)
+# lookups used to match uploaded country names.
+CREATE_INDEXES = """
+DO $$
+BEGIN
+    IF to_regclass('world_countries') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS world_countries_lower_name_idx ON world_countries (lower(name));
+        CREATE INDEX IF NOT EXISTS world_countries_lower_name_en_idx ON world_countries (lower(name_en));
+        CREATE INDEX IF NOT EXISTS world_countries_lower_adm0_a3_idx ON world_countries (lower(adm0_a3));
+    END IF;
+END $$;
+"""
+
+DROP_INDEXES = """
+DROP INDEX IF EXISTS world_countries_lower_name_idx;
+DROP INDEX IF EXISTS world_countries_lower_name_en_idx;
+DROP INDEX IF EXISTS world_countries_lower_adm0_a3_idx;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_upload', '0009_diseasedata_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_INDEXES, DROP_INDEXES),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_upload', '0011_ingestjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestjob',
+            name='csv_options',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
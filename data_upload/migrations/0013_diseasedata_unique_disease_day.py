@@ -0,0 +1,80 @@
+# Generated by Django 5.2.8 on 2026-10-17 13:10
+
+import logging
+
+from django.db import migrations, models
+
+
+logger = logging.getLogger(__name__)
+
+# Earlier uploads could store the same dataset/country/day several times.
+# They are collapsed the way ingest merges repeated rows of one upload:
+# cases and deaths summed into the most recently inserted row (highest id,
+# whose country_geom is kept), the other rows deleted.
+SUM_DUPLICATES = """
+UPDATE data_upload_diseasedata d
+SET cases = dup.cases, deaths = dup.deaths
+FROM (
+    SELECT MAX(id) AS keep_id, SUM(cases) AS cases, SUM(deaths) AS deaths
+    FROM data_upload_diseasedata
+    GROUP BY dataset_type, country, date
+    HAVING COUNT(*) > 1
+) dup
+WHERE d.id = dup.keep_id;
+"""
+
+DELETE_DUPLICATES = """
+DELETE FROM data_upload_diseasedata d
+USING (
+    SELECT dataset_type, country, date, MAX(id) AS keep_id
+    FROM data_upload_diseasedata
+    GROUP BY dataset_type, country, date
+    HAVING COUNT(*) > 1
+) dup
+WHERE d.dataset_type = dup.dataset_type
+  AND d.country = dup.country
+  AND d.date = dup.date
+  AND d.id <> dup.keep_id;
+"""
+
+
+def deduplicate(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(SUM_DUPLICATES)
+        days = cursor.rowcount
+        cursor.execute(DELETE_DUPLICATES)
+        removed = cursor.rowcount
+    if days:
+        logger.warning(f"Merged {removed} duplicate DiseaseData rows into {days} days (cases/deaths summed)")
+
+
+REBUILD_ROLLUP = """
+DELETE FROM data_upload_diseaserollup;
+INSERT INTO data_upload_diseaserollup (dataset_type, country, year, month, cases, deaths, rows)
+SELECT dataset_type, country,
+       EXTRACT(YEAR FROM date)::int, EXTRACT(MONTH FROM date)::int,
+       COALESCE(SUM(cases), 0), COALESCE(SUM(deaths), 0), COUNT(*)
+FROM data_upload_diseasedata
+GROUP BY 1, 2, 3, 4;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_upload', '0012_ingestjob_csv_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate, migrations.RunPython.noop),
+        migrations.RunSQL(REBUILD_ROLLUP, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='diseasedata',
+            constraint=models.UniqueConstraint(fields=('dataset_type', 'country', 'date'), name='unique_disease_day'),
+        ),
+        migrations.AddField(
+            model_name='ingestjob',
+            name='mode',
+            field=models.CharField(choices=[('append', 'Append new rows'), ('upsert', 'Insert new rows, update changed ones'), ('replace', 'Replace the whole dataset')], default='append', max_length=10),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-17 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_upload', '0013_diseasedata_unique_disease_day'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='discussionmessage',
+            name='data_upload_dataset_07514a_idx',
+        ),
+        migrations.AddIndex(
+            model_name='discussionmessage',
+            index=models.Index(fields=['dataset_type', '-created_at'], name='discussion_ds_created_idx'),
+        ),
+    ]
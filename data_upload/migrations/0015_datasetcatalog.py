@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-17 14:20
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+BUILD_CATALOG = """
+INSERT INTO data_upload_datasetcatalog (name, row_count, first_date, last_date, country_count, version, updated_at)
+SELECT dataset_type, COUNT(*), MIN(date), MAX(date), COUNT(DISTINCT country),
+       substr(md5(dataset_type || ':' || COUNT(*) || ':' || MAX(id)), 1, 16), now()
+FROM data_upload_diseasedata
+GROUP BY dataset_type;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_upload', '0014_discussion_ds_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetCatalog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('row_count', models.BigIntegerField(default=0)),
+                ('first_date', models.DateField(null=True)),
+                ('last_date', models.DateField(null=True)),
+                ('country_count', models.IntegerField(default=0)),
+                ('version', models.CharField(max_length=16)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RunSQL(BUILD_CATALOG, migrations.RunSQL.noop),
+    ]
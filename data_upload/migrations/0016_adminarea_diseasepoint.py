@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:05
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_upload', '0015_datasetcatalog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdminArea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.PositiveSmallIntegerField()),
+                ('code', models.CharField(max_length=50, unique=True)),
+                ('name', models.CharField(max_length=200)),
+                ('key', models.CharField(max_length=200)),
+                ('geom', django.contrib.gis.db.models.fields.MultiPolygonField(srid=4326)),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='data_upload.adminarea')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['level', 'key'], name='adminarea_level_key_idx'),
+                    models.Index(fields=['key'], name='adminarea_key_idx'),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='DiseasePoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dataset_type', models.CharField(max_length=50)),
+                ('date', models.DateField()),
+                ('location', django.contrib.gis.db.models.fields.PointField(null=True, srid=4326)),
+                ('cases', models.IntegerField(null=True)),
+                ('deaths', models.IntegerField(null=True)),
+                ('admin_area', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='points', to='data_upload.adminarea')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['dataset_type', 'date'], name='point_dataset_date_idx'),
+                    models.Index(fields=['dataset_type', 'admin_area', 'date'], include=['cases', 'deaths'], name='point_ds_area_date_idx'),
+                ],
+            },
+        ),
+    ]
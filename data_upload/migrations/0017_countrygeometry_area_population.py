@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:40
+
+from django.db import migrations, models
+
+
+FILL_AREA = """
+UPDATE data_upload_countrygeometry
+SET area_km2 = ST_Area(geom::geography) / 1e6
+WHERE geom IS NOT NULL AND NOT ST_IsEmpty(geom);
+"""
+
+# world_countries is an imported reference table; pop_est is only there in
+# Natural Earth style imports, so the backfill is skipped without it
+FILL_POPULATION = """
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'world_countries' AND column_name = 'pop_est'
+    ) THEN
+        UPDATE data_upload_countrygeometry g
+        SET population = w.pop_est::bigint
+        FROM world_countries w
+        WHERE g.population IS NULL AND w.pop_est > 0
+          AND (lower(w.name) = g.key OR lower(w.name_en) = g.key OR lower(w.adm0_a3) = g.key);
+    END IF;
+END $$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_upload', '0016_adminarea_diseasepoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='countrygeometry',
+            name='area_km2',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='countrygeometry',
+            name='population',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunSQL(FILL_AREA, migrations.RunSQL.noop),
+        migrations.RunSQL(FILL_POPULATION, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_upload', '0017_countrygeometry_area_population'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestjob',
+            name='rows_staged',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
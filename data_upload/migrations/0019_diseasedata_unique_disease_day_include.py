@@ -0,0 +1,73 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:20
+
+from django.contrib.postgres.operations import RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+# The unique constraint's index covers (dataset_type, country, date) with
+# cases/deaths included, so the separate covering index is redundant.
+# Dropping and re-adding the constraint would rebuild its index under an
+# ACCESS EXCLUSIVE lock; instead the new index is built CONCURRENTLY (a
+# UniqueConstraint cannot go through AddIndexConcurrently) and swapped in
+# with ADD CONSTRAINT ... USING INDEX, which only takes the lock briefly.
+# An invalid index left by an interrupted build is dropped first.
+BUILD_INDEX = [
+    "DROP INDEX CONCURRENTLY IF EXISTS unique_disease_day_include",
+    """
+    CREATE UNIQUE INDEX CONCURRENTLY unique_disease_day_include
+    ON data_upload_diseasedata (dataset_type, country, date) INCLUDE (cases, deaths)
+    """,
+]
+
+# USING INDEX renames the index to the constraint name
+SWAP_CONSTRAINT = """
+ALTER TABLE data_upload_diseasedata
+    DROP CONSTRAINT unique_disease_day,
+    ADD CONSTRAINT unique_disease_day UNIQUE USING INDEX unique_disease_day_include
+"""
+
+RESTORE_CONSTRAINT = [
+    "DROP INDEX CONCURRENTLY IF EXISTS unique_disease_day_plain",
+    """
+    CREATE UNIQUE INDEX CONCURRENTLY unique_disease_day_plain
+    ON data_upload_diseasedata (dataset_type, country, date)
+    """,
+    """
+    ALTER TABLE data_upload_diseasedata
+        DROP CONSTRAINT unique_disease_day,
+        ADD CONSTRAINT unique_disease_day UNIQUE USING INDEX unique_disease_day_plain
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    # CREATE / DROP INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('data_upload', '0018_ingestjob_rows_staged'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(BUILD_INDEX, migrations.RunSQL.noop),
+                migrations.RunSQL(SWAP_CONSTRAINT, RESTORE_CONSTRAINT),
+            ],
+            state_operations=[
+                migrations.RemoveConstraint(
+                    model_name='diseasedata',
+                    name='unique_disease_day',
+                ),
+                migrations.AddConstraint(
+                    model_name='diseasedata',
+                    constraint=models.UniqueConstraint(fields=('dataset_type', 'country', 'date'), include=('cases', 'deaths'), name='unique_disease_day'),
+                ),
+            ],
+        ),
+        RemoveIndexConcurrently(
+            model_name='diseasedata',
+            name='disease_ds_country_date_idx',
+        ),
+    ]
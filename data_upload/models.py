@@ -1,4 +1,21 @@
+import uuid
 from django.contrib.gis.db import models
+from django.utils import timezone
+
+class CountryGeometry(models.Model):
+    # Normalized country name (lowercase, stripped) as written in uploaded CSVs
+    key = models.CharField(max_length=100, unique=True)
+    name = models.CharField(max_length=100)
+    # Simplified outline from world_countries, NULL when no match was found
+    geom = models.MultiPolygonField(null=True)
+    # Computed once when the row is created (see fill_country_measures), read
+    # by the density / per-capita stats instead of ST_Area per request
+    area_km2 = models.FloatField(null=True, blank=True)
+    # world_countries.pop_est when available; editable in the admin
+    population = models.BigIntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
 
 class DiseaseData(models.Model):
     dataset_type = models.CharField(max_length=50)
@@ -6,8 +23,139 @@ class DiseaseData(models.Model):
     country = models.CharField(max_length=100)
     cases = models.IntegerField(null=True)
     deaths = models.IntegerField(null=True)
-    geom = models.MultiPolygonField(null=True)
+    country_geom = models.ForeignKey(CountryGeometry, on_delete=models.SET_NULL, null=True, blank=True, related_name='records')
+
+    class Meta:
+        indexes = [
+            # Dataset + date range filters, dataset existence checks
+            models.Index(fields=['dataset_type', 'date'], name='disease_dataset_date_idx'),
+        ]
+        constraints = [
+            # One value per dataset / country / day: re-uploads merge instead of duplicating.
+            # Its index also serves per-country grouping; cases/deaths included for index-only scans
+            models.UniqueConstraint(
+                fields=['dataset_type', 'country', 'date'], include=['cases', 'deaths'], name='unique_disease_day'
+            ),
+        ]
+
+class AdminArea(models.Model):
+    # Administrative boundary at any level: 0 = country, 1 = province, 2 = district...
+    # Loaded with `manage.py load_admin_areas`; points are assigned to them in spatial.py
+    level = models.PositiveSmallIntegerField()
+    # Source identifier (e.g. GID_2), unique across levels
+    code = models.CharField(max_length=50, unique=True)
+    name = models.CharField(max_length=200)
+    # Normalized name (lowercase, stripped) to match admin names in uploads
+    key = models.CharField(max_length=200)
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    # GiST-indexed (spatial_index defaults to True)
+    geom = models.MultiPolygonField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['level', 'key'], name='adminarea_level_key_idx'),
+            models.Index(fields=['key'], name='adminarea_key_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} (level {self.level})"
+
+class DiseasePoint(models.Model):
+    # One located report: coordinates and/or an admin area name (see spatial.py).
+    # Country-level DiseaseData rows of the dataset are derived from these.
+    dataset_type = models.CharField(max_length=50)
+    date = models.DateField()
+    # GiST-indexed; NULL when the row only named an admin area
+    location = models.PointField(null=True)
+    # Deepest AdminArea containing the point (or matching the name)
+    admin_area = models.ForeignKey(AdminArea, on_delete=models.SET_NULL, null=True, blank=True, related_name='points')
+    cases = models.IntegerField(null=True)
+    deaths = models.IntegerField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['dataset_type', 'date'], name='point_dataset_date_idx'),
+            # Per-area grouping for admin rollups, index-only with cases/deaths
+            models.Index(fields=['dataset_type', 'admin_area', 'date'], include=['cases', 'deaths'], name='point_ds_area_date_idx'),
+        ]
+
+class DiseaseRollup(models.Model):
+    # Per dataset / country / month sums of DiseaseData, refreshed on upload
+    dataset_type = models.CharField(max_length=50)
+    country = models.CharField(max_length=100)
+    year = models.IntegerField()
+    month = models.IntegerField()
+    cases = models.BigIntegerField(default=0)
+    deaths = models.BigIntegerField(default=0)
+    rows = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dataset_type', 'country', 'year', 'month'], name='unique_rollup_month'),
+        ]
     
+class DatasetCatalog(models.Model):
+    # One row per dataset, refreshed by every upload (see catalog.py)
+    name = models.CharField(max_length=50, unique=True)
+    row_count = models.BigIntegerField(default=0)
+    first_date = models.DateField(null=True)
+    last_date = models.DateField(null=True)
+    country_count = models.IntegerField(default=0)
+    # Changes whenever an upload writes rows; keys HTTP and response caches
+    version = models.CharField(max_length=16)
+    # When version last changed (HTTP Last-Modified)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} ({self.row_count} rows)"
+
+class IngestJob(models.Model):
+    # One CSV upload processed in the background (see jobs.py)
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    MODE_CHOICES = [
+        ('append', 'Append new rows'),
+        ('upsert', 'Insert new rows, update changed ones'),
+        ('replace', 'Replace the whole dataset'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    dataset_type = models.CharField(max_length=50)
+    file_name = models.CharField(max_length=255)
+    file_path = models.CharField(max_length=500)
+    file_size = models.BigIntegerField(default=0)
+    mapping = models.JSONField(default=dict, blank=True)
+    # Sniffed CSV format: {"delimiter": ",", "encoding": "utf-8"}
+    csv_options = models.JSONField(default=dict, blank=True)
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES, default='append')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', db_index=True)
+    bytes_read = models.BigIntegerField(default=0)
+    # Progress: rows read, rows cleaned and staged, rows parsed per second.
+    # rows_inserted is only set when the job is done (merged rows, not staged)
+    rows_parsed = models.BigIntegerField(default=0)
+    rows_staged = models.BigIntegerField(default=0)
+    rows_inserted = models.BigIntegerField(default=0)
+    skipped = models.BigIntegerField(default=0)
+    rows_per_sec = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    result = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.dataset_type} ({self.file_name}): {self.status}"
+
 class DiscussionMessage(models.Model):
     display_name = models.CharField(max_length=50, db_index=True)
     dataset_type = models.CharField(max_length=50, default='general', db_index=True)
@@ -19,7 +167,8 @@ class DiscussionMessage(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['display_name']),
-            models.Index(fields=['dataset_type']),
+            # Newest threads of a dataset; also covers dataset_type lookups
+            models.Index(fields=['dataset_type', '-created_at'], name='discussion_ds_created_idx'),
         ]
 
     def __str__(self):
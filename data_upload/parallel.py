@@ -0,0 +1,280 @@
+import io
+import os
+import csv
+import time
+import uuid
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for parsing/cleaning, and how many of them may COPY at once
+PARALLEL_WORKERS = getattr(settings, 'INGEST_PARALLEL_WORKERS', os.cpu_count() or 1)
+DB_CONNECTIONS = getattr(settings, 'INGEST_DB_CONNECTIONS', 4)
+# Files smaller than this go through the single-process ingest_csv
+PARALLEL_MIN_BYTES = getattr(settings, 'INGEST_PARALLEL_MIN_BYTES', 256 * 1024 * 1024)
+# Smallest byte range handed to one worker
+MIN_SHARD_BYTES = 16 * 1024 * 1024
+
+STAGING_COLUMNS = ['dataset_type', 'date', 'country', 'key', 'cases', 'deaths']
+# Staging tables are named <prefix><job id hex>; ones whose job is not
+# running are leftovers of a crashed process (see sweep_staging_tables)
+STAGING_PREFIX = 'ingest_staging_'
+
+_copy_slots = None
+
+
+def split_shards(path, shards):
+    """
+    Byte ranges [(start, end), ...] covering the file after its header line,
+    each ending on a newline. Assumes no quoted field spans several lines.
+    Returns (header_line, ranges).
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as fh:
+        header = fh.readline()
+        data_start = fh.tell()
+        step = max((size - data_start) // max(shards, 1), 1)
+
+        ranges = []
+        start = data_start
+        while start < size:
+            fh.seek(min(start + step, size))
+            fh.readline()  # move to the end of the current line
+            end = min(fh.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return header, ranges
+
+
+def _init_worker(copy_slots):
+    """Process pool initializer: fresh Django + DB state in every worker"""
+    global _copy_slots
+    import django
+    django.setup()
+    connections.close_all()
+    _copy_slots = copy_slots
+
+
+def _ingest_shard(path, start, end, names, columns, dataset_name, staging_table, delimiter, encoding):
+    """Parse, clean and COPY one byte range into the staging table (runs in a worker process)"""
+    from .ingest import clean_chunk, copy_from
+
+    timings = {}
+    started = time.perf_counter()
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        data = fh.read(end - start)
+    df = pd.read_csv(io.BytesIO(data), header=None, names=names, sep=delimiter, encoding=encoding, low_memory=False)
+    timings['parse'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    frame, skipped = clean_chunk(df, columns)
+    frame.insert(0, 'dataset_type', dataset_name)
+    buf = io.StringIO()
+    frame[STAGING_COLUMNS].to_csv(buf, index=False, header=False, na_rep='\\N')
+    buf.seek(0)
+    timings['clean'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with _copy_slots:
+        with connection.cursor() as cursor:
+            copy_from(
+                cursor,
+                f"COPY {staging_table} ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buf
+            )
+    timings['copy'] = time.perf_counter() - started
+
+    return {'rows_parsed': len(df), 'rows': len(frame), 'skipped': skipped, 'bytes': end - start, 'timings': timings}
+
+
+def staging_table_name(job_id=None):
+    """UNLOGGED staging table of one job (a random suffix without a job)"""
+    return f"{STAGING_PREFIX}{uuid.UUID(str(job_id)).hex if job_id else uuid.uuid4().hex}"
+
+
+def sweep_staging_tables():
+    """
+    Drop staging tables left behind by a process that died mid-ingest: the
+    table is created outside the merge transaction, so a crash skips its
+    DROP. Tables of jobs still running are kept. Returns the dropped names.
+    """
+    from .models import IngestJob
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT tablename FROM pg_tables WHERE schemaname = current_schema() AND starts_with(tablename, %s)",
+            [STAGING_PREFIX]
+        )
+        tables = [row[0] for row in cursor.fetchall()]
+        running = {
+            job_id.hex for job_id in
+            IngestJob.objects.filter(status='running').values_list('id', flat=True)
+        }
+        dropped = [table for table in tables if table[len(STAGING_PREFIX):] not in running]
+        for table in dropped:
+            cursor.execute(f'DROP TABLE IF EXISTS "{table}"')
+    if dropped:
+        logger.warning(f"Dropped {len(dropped)} orphaned staging table(s): {', '.join(dropped)}")
+    return dropped
+
+
+def ingest_parallel(path, dataset_name, mapping=None, workers=PARALLEL_WORKERS, progress=None, options=None, mode='append', job_id=None):
+    """
+    Multi-process ingest of a CSV file on disk:
+      1. split the file into newline-aligned byte ranges
+      2. a process pool parses + cleans ranges and COPYs them, at most
+         INGEST_DB_CONNECTIONS at a time, into an UNLOGGED staging table
+      3. countries are resolved once for the whole file
+      4. merge_rows moves staged rows into DiseaseData (per mode), joined
+         to their geometry ids, in the same transaction as the rollup refresh
+
+    The staging table is named after job_id, so sweep_staging_tables() can
+    tell a live one from a crashed job's. Without a job_id it is only
+    safe while no sweep runs.
+
+    Returns the same summary as ingest_csv plus per-stage 'timings' (wall
+    seconds; 'parse'/'clean'/'copy' are summed over workers as cpu_*).
+    """
+    from .ingest import INGEST_MODES, IngestError, check_dataset_kind, detect_columns, merge_rows
+    from .geometry import resolve_countries
+    from .models import CountryGeometry, DiseaseData, DiseasePoint
+    from .stats import refresh_rollup
+    from .catalog import invalidate_catalog, refresh_catalog
+
+    if mode not in INGEST_MODES:
+        raise IngestError(f"Unknown ingest mode '{mode}'")
+    # Checked again under the merge transaction; this one fails before the shards run
+    check_dataset_kind(dataset_name, mode)
+    mapping = mapping or {}
+    options = options or {}
+    delimiter = options.get('delimiter', ',')
+    encoding = options.get('encoding', 'utf-8')
+    # The BOM only precedes the header; every shard after it is plain UTF-8
+    shard_encoding = 'utf-8' if encoding == 'utf-8-sig' else encoding
+    total_started = time.perf_counter()
+    timings = {}
+
+    started = time.perf_counter()
+    size = os.path.getsize(path)
+    shard_count = max(1, min(workers * 4, size // MIN_SHARD_BYTES))
+    header, ranges = split_shards(path, shard_count)
+    if not header.strip():
+        raise IngestError('CSV file is empty')
+    header_encoding = 'utf-8-sig' if encoding.startswith('utf-8') else encoding
+    names = next(csv.reader([header.decode(header_encoding).rstrip('\r\n')], delimiter=delimiter))
+    columns = detect_columns(
+        names,
+        mapping.get('country', ''), mapping.get('date', ''),
+        mapping.get('cases', ''), mapping.get('deaths', '')
+    )
+    timings['split'] = time.perf_counter() - started
+    logger.info(f"Parallel ingest of {path}: {len(ranges)} shards, {workers} workers, {DB_CONNECTIONS} DB connections")
+
+    staging_table = staging_table_name(job_id)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            CREATE UNLOGGED TABLE {staging_table} (
+                dataset_type varchar(50) NOT NULL,
+                date date NOT NULL,
+                country varchar(100) NOT NULL,
+                key varchar(100) NOT NULL,
+                cases integer,
+                deaths integer
+            )
+        """)
+
+    counters = {'chunks': 0, 'rows_parsed': 0, 'rows_staged': 0, 'skipped': 0, 'bytes_read': 0}
+    cpu = {'cpu_parse': 0.0, 'cpu_clean': 0.0, 'cpu_copy': 0.0}
+    try:
+        started = time.perf_counter()
+        # Children must not inherit the parent's open DB connection; 'spawn'
+        # also keeps fork away from the web process's ingest threads
+        connections.close_all()
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(context.BoundedSemaphore(DB_CONNECTIONS),)
+        ) as pool:
+            futures = [
+                pool.submit(
+                    _ingest_shard, path, start, end, names, columns, dataset_name, staging_table,
+                    delimiter, shard_encoding
+                )
+                for start, end in ranges
+            ]
+            for future in as_completed(futures):
+                shard = future.result()
+                counters['chunks'] += 1
+                counters['rows_parsed'] += shard['rows_parsed']
+                counters['rows_staged'] += shard['rows']
+                counters['skipped'] += shard['skipped']
+                counters['bytes_read'] += shard['bytes']
+                for stage, seconds in shard['timings'].items():
+                    cpu[f"cpu_{stage}"] += seconds
+                elapsed = time.perf_counter() - total_started
+                counters['rows_per_sec'] = round(counters['rows_parsed'] / elapsed) if elapsed > 0 else 0
+                logger.info(f"   Shard {counters['chunks']}/{len(ranges)} staged ({counters['rows_staged']} rows)")
+                if progress:
+                    progress(dict(counters))
+        timings['parse_clean_copy'] = time.perf_counter() - started
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            # One resolution pass for every country in the file
+            started = time.perf_counter()
+            cursor.execute(f"SELECT DISTINCT country FROM {staging_table}")
+            countries = [row[0] for row in cursor.fetchall()]
+            resolve_countries(countries)
+            timings['resolve'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            check_dataset_kind(dataset_name, mode)
+            if mode == 'replace':
+                DiseasePoint.objects.filter(dataset_type=dataset_name).delete()
+                DiseaseData.objects.filter(dataset_type=dataset_name).delete()
+            inserted, updated = merge_rows(cursor, f"""
+                SELECT s.dataset_type, s.date, s.country, s.cases, s.deaths, g.id AS country_geom_id
+                FROM {staging_table} s
+                LEFT JOIN {CountryGeometry._meta.db_table} g ON g.key = s.key
+            """, mode)
+            timings['insert'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            if mode == 'replace':
+                refresh_rollup(dataset_name)
+            elif countries:
+                refresh_rollup(dataset_name, countries)
+            refresh_catalog(dataset_name, changed=bool(inserted or updated) or mode == 'replace')
+            transaction.on_commit(invalidate_catalog)
+            timings['rollup'] = time.perf_counter() - started
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+
+    elapsed = time.perf_counter() - total_started
+    timings['total'] = elapsed
+    timings.update(cpu)
+    timings = {stage: round(seconds, 3) for stage, seconds in timings.items()}
+    logger.info(
+        f"Parallel upload complete ({mode})! {inserted} inserted, {updated} updated "
+        f"in {elapsed:.2f}s, stages: {timings}"
+    )
+    return {
+        'imported': inserted,
+        'updated': updated,
+        'mode': mode,
+        'total_rows': counters['rows_parsed'],
+        'skipped': counters['skipped'],
+        'chunks': counters['chunks'],
+        'dataset': dataset_name,
+        'elapsed_seconds': round(elapsed, 2),
+        'workers': workers,
+        'timings': timings,
+    }
@@ -0,0 +1,81 @@
+import time
+import hashlib
+import logging
+import threading
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+# Which CACHES alias holds computed responses, and for how long. Keys carry
+# the dataset version, so entries never go stale, they just stop being asked for.
+CACHE_ALIAS = getattr(settings, 'STATS_CACHE_ALIAS', 'default')
+CACHE_TIMEOUT = getattr(settings, 'STATS_CACHE_TIMEOUT', 24 * 3600)
+# How long a miss may wait for another process computing the same key
+LOCK_TIMEOUT = 30
+WAIT_STEP = 0.05
+
+_key_locks = {}
+_key_locks_guard = threading.Lock()
+
+
+def response_key(prefix, version, **params):
+    """Cache key for one response: endpoint prefix, dataset version, normalized params"""
+    canonical = '&'.join(f"{name}={params[name]}" for name in sorted(params))
+    digest = hashlib.md5(canonical.encode('utf-8')).hexdigest()
+    return f"{prefix}:{version}:{digest}"
+
+
+def etag_for(key):
+    return '"%s"' % hashlib.md5(key.encode('utf-8')).hexdigest()
+
+
+def _local_lock(key):
+    with _key_locks_guard:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def cached_body(key, compute):
+    """
+    Response body for key, computed by compute() on a miss. Single flight:
+    threads of this process wait on a per-key lock, other processes on a
+    short-lived cache.add() lock, so concurrent misses compute once.
+    """
+    cache = caches[CACHE_ALIAS]
+    body = cache.get(key)
+    if body is not None:
+        return body
+
+    lock = _local_lock(key)
+    try:
+        with lock:
+            body = cache.get(key)
+            if body is not None:
+                return body
+
+            lock_key = f"{key}:lock"
+            deadline = time.monotonic() + LOCK_TIMEOUT
+            acquired = cache.add(lock_key, 1, LOCK_TIMEOUT)
+            while not acquired:
+                # Another process is computing it
+                time.sleep(WAIT_STEP)
+                body = cache.get(key)
+                if body is not None:
+                    return body
+                if time.monotonic() > deadline:
+                    # Compute anyway, but leave the other process's lock alone
+                    break
+                acquired = cache.add(lock_key, 1, LOCK_TIMEOUT)
+            try:
+                started = time.perf_counter()
+                body = compute()
+                cache.set(key, body, CACHE_TIMEOUT)
+                logger.info(f"Computed {key.split(':', 1)[0]} response in {time.perf_counter() - started:.2f}s")
+            finally:
+                if acquired:
+                    cache.delete(lock_key)
+            return body
+    finally:
+        # Every exit path drops the per-key lock, or one would leak per key
+        with _key_locks_guard:
+            _key_locks.pop(key, None)
@@ -0,0 +1,63 @@
+import csv
+import codecs
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the start of an upload to detect its format
+SNIFF_BYTES = 64 * 1024
+SAMPLES_PER_COLUMN = 3
+DELIMITERS = ',;\t|'
+
+
+def _decode(head):
+    """(text, encoding) for the first bytes of a file; a multi-byte character cut at the end is dropped"""
+    if head.startswith(codecs.BOM_UTF8):
+        return head[len(codecs.BOM_UTF8):].decode('utf-8', errors='ignore'), 'utf-8-sig'
+    try:
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        return decoder.decode(head, final=False), 'utf-8'
+    except UnicodeDecodeError:
+        # Spreadsheet exports on Windows
+        return head.decode('cp1252', errors='replace'), 'cp1252'
+
+
+def sniff_csv(head):
+    """
+    Columns, sample values, delimiter and encoding from the first bytes of a CSV.
+    Only complete lines are looked at. Returns
+    {"columns", "sample_data", "sample_rows", "delimiter", "encoding"}.
+    """
+    text, encoding = _decode(head)
+    lines = text.splitlines()
+    if len(head) >= SNIFF_BYTES and len(lines) > 1:
+        lines = lines[:-1]  # the last line is probably cut off
+    if not lines or not lines[0].strip():
+        raise ValueError('CSV file is empty')
+
+    try:
+        delimiter = csv.Sniffer().sniff('\n'.join(lines[:50]), delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        delimiter = ','
+
+    reader = csv.reader(lines, delimiter=delimiter)
+    # Header names exactly as pandas will see them during ingest
+    columns = next(reader)
+    sample_data = {col: [] for col in columns}
+    rows = 0
+    for row in reader:
+        rows += 1
+        for col, value in zip(columns, row):
+            value = value.strip()
+            if value and len(sample_data[col]) < SAMPLES_PER_COLUMN:
+                sample_data[col].append(value)
+        if all(len(values) >= SAMPLES_PER_COLUMN for values in sample_data.values()):
+            break
+
+    return {
+        'columns': columns,
+        'sample_data': sample_data,
+        'sample_rows': rows,
+        'delimiter': delimiter,
+        'encoding': encoding,
+    }
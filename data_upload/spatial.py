@@ -0,0 +1,472 @@
+import io
+import math
+import time
+import logging
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import connection, transaction
+from .models import AdminArea, DiseaseData, DiseasePoint
+from .geometry import resolve_countries
+from .ingest import (
+    CHUNK_SIZE, DEFAULT_DATE, INGEST_MODES, LOAD_COLUMNS, IngestError, _clean_counts, _clean_dates,
+    check_dataset_kind, copy_from, merge_rows
+)
+from .stats import refresh_rollup
+from .catalog import invalidate_catalog, refresh_catalog
+
+logger = logging.getLogger(__name__)
+
+LAT_NAMES = ('lat', 'latitude')
+LON_NAMES = ('lon', 'lng', 'long', 'longitude')
+ADMIN_HINTS = ('district', 'admin', 'province', 'region', 'county', 'prefecture', 'area')
+
+STAGING_TABLE = 'point_staging'
+STAGING_COLUMNS = ['date', 'lon', 'lat', 'admin_key', 'cases', 'deaths']
+
+
+def is_point_mapping(mapping):
+    """True when an upload mapped coordinates or an admin area column"""
+    mapping = mapping or {}
+    return bool(mapping.get('lat') or mapping.get('lon') or mapping.get('admin'))
+
+
+def detect_point_columns(columns, mapping):
+    """
+    Column mapping for a point / sub-national upload: lat+lon and/or an
+    admin area name, plus date/cases/deaths. Manual columns win.
+    """
+    lowered = {c.lower().strip(): c for c in columns}
+    lat = mapping.get('lat') or next((lowered[n] for n in LAT_NAMES if n in lowered), None)
+    lon = mapping.get('lon') or next((lowered[n] for n in LON_NAMES if n in lowered), None)
+    admin = mapping.get('admin') or next((c for c in columns if any(h in c.lower() for h in ADMIN_HINTS)), None)
+    date = mapping.get('date') or next((c for c in columns if any(x in c.lower() for x in ['date', 'year', 'time', 'period'])), None)
+    cases = mapping.get('cases') or next((c for c in columns if any(x in c.lower() for x in ['case', 'confirmed', 'count'])), None)
+    deaths = mapping.get('deaths') or next((c for c in columns if any(x in c.lower() for x in ['death', 'died', 'mortality', 'fatal'])), None)
+
+    if not (lat and lon) and not admin:
+        raise IngestError('CSV must contain latitude/longitude or an admin area column')
+    if not cases and not deaths:
+        raise IngestError('CSV must contain cases/deaths columns')
+    for col in (lat, lon, admin, date, cases, deaths):
+        if col and col not in columns:
+            raise IngestError(f"Column '{col}' not found in CSV")
+    return {'lat': lat, 'lon': lon, 'admin': admin, 'date': date, 'cases': cases, 'deaths': deaths}
+
+
+def clean_points(df, columns):
+    """
+    Vectorized cleaning of one chunk into STAGING_COLUMNS. Coordinates out
+    of range become NULL; rows with neither a position nor an admin name
+    are dropped. Returns (frame, skipped).
+    """
+    empty = pd.Series(pd.NA, index=df.index, dtype='Int64')
+    if columns['lat'] and columns['lon']:
+        lat = pd.to_numeric(df[columns['lat']], errors='coerce')
+        lon = pd.to_numeric(df[columns['lon']], errors='coerce')
+        valid = lat.between(-90, 90) & lon.between(-180, 180)
+        lat, lon = lat.where(valid), lon.where(valid)
+    else:
+        lat = lon = pd.Series(np.nan, index=df.index)
+    if columns['admin']:
+        admin = df[columns['admin']].astype('string').str.strip().str.lower().replace('', pd.NA)
+    else:
+        admin = pd.Series(pd.NA, index=df.index, dtype='string')
+
+    frame = pd.DataFrame({
+        'date': _clean_dates(df[columns['date']]) if columns['date'] else DEFAULT_DATE,
+        'lon': lon,
+        'lat': lat,
+        'admin_key': admin,
+        'cases': _clean_counts(df[columns['cases']]) if columns['cases'] else empty,
+        'deaths': _clean_counts(df[columns['deaths']]) if columns['deaths'] else empty,
+    })
+    located = frame['lat'].notna() | frame['admin_key'].notna()
+    return frame[located], int((~located).sum())
+
+
+def _assign_points(cursor, dataset_name, admin_level=None):
+    """
+    Move staged rows into DiseasePoint in one statement. Coordinates are
+    matched to the deepest AdminArea containing them: each point probes the
+    GiST index on AdminArea.geom (&& then ST_Intersects), so the join is
+    set-based rather than one lookup query per row. Rows without
+    coordinates match an area by name (at admin_level when given).
+    Needs _build_lineage() first. Returns (written, unassigned, no_country):
+    unassigned points matched no area, no_country points matched an area
+    without a level-0 ancestor; neither adds to the country rows.
+    """
+    area_table = AdminArea._meta.db_table
+    level_filter = 'AND a.level = %s' if admin_level is not None else ''
+    params = [dataset_name] + ([admin_level] if admin_level is not None else [])
+    cursor.execute(f"ANALYZE {STAGING_TABLE}")
+    cursor.execute(f"""
+        WITH written AS (
+            INSERT INTO {DiseasePoint._meta.db_table} (dataset_type, date, location, admin_area_id, cases, deaths)
+            SELECT %s, s.date, s.pt, COALESCE(hit.id, named.id), s.cases, s.deaths
+            FROM (
+                SELECT *, CASE WHEN lon IS NOT NULL AND lat IS NOT NULL
+                               THEN ST_SetSRID(ST_MakePoint(lon, lat), 4326) END AS pt
+                FROM {STAGING_TABLE}
+            ) s
+            LEFT JOIN LATERAL (
+                SELECT a.id FROM {area_table} a
+                WHERE s.pt IS NOT NULL AND a.geom && s.pt AND ST_Intersects(a.geom, s.pt)
+                ORDER BY a.level DESC
+                LIMIT 1
+            ) hit ON true
+            LEFT JOIN LATERAL (
+                SELECT a.id FROM {area_table} a
+                WHERE s.pt IS NULL AND a.key = s.admin_key {level_filter}
+                ORDER BY a.level DESC
+                LIMIT 1
+            ) named ON true
+            RETURNING admin_area_id
+        )
+        SELECT COUNT(*),
+               COUNT(*) FILTER (WHERE w.admin_area_id IS NULL),
+               COUNT(*) FILTER (WHERE w.admin_area_id IS NOT NULL AND l.area_id IS NULL)
+        FROM written w
+        LEFT JOIN {LINEAGE_TABLE} l ON l.area_id = w.admin_area_id
+    """, params)
+    return cursor.fetchone()
+
+
+LINEAGE_TABLE = 'admin_lineage'
+
+
+def _build_lineage(cursor):
+    """
+    Temp table admin_lineage(area_id, root_id): every AdminArea under a
+    level-0 (country) area, with that ancestor. Levels must grow down the
+    tree, so malformed parent links cannot loop. Areas whose chain does not
+    reach level 0 are left out (their points cannot be given a country);
+    returns how many areas that is.
+    """
+    area_table = AdminArea._meta.db_table
+    cursor.execute(f"DROP TABLE IF EXISTS {LINEAGE_TABLE}")
+    cursor.execute(f"""
+        CREATE TEMPORARY TABLE {LINEAGE_TABLE} ON COMMIT DROP AS
+        WITH RECURSIVE lineage(area_id, root_id, level) AS (
+            SELECT id, id, level FROM {area_table} WHERE level = 0
+            UNION ALL
+            SELECT c.id, l.root_id, c.level
+            FROM {area_table} c JOIN lineage l ON c.parent_id = l.area_id
+            WHERE c.level > l.level
+        )
+        SELECT area_id, root_id FROM lineage
+    """)
+    cursor.execute(f"CREATE INDEX ON {LINEAGE_TABLE} (area_id)")
+    cursor.execute(f"""
+        SELECT COUNT(*) FROM {area_table} a
+        WHERE NOT EXISTS (SELECT 1 FROM {LINEAGE_TABLE} l WHERE l.area_id = a.id)
+    """)
+    orphans = cursor.fetchone()[0]
+    if orphans:
+        logger.warning(f"{orphans} admin areas have no level-0 ancestor; their points get no country row")
+    return orphans
+
+
+def _derive_country_rows(cursor, dataset_name):
+    """
+    Recompute the dataset's country-level DiseaseData for the staged days
+    from all of its points (level-0 ancestor = country), so the map, stats
+    and rollup work unchanged. Points without one (counted by _assign_points)
+    are left out. Returns (inserted, updated, countries).
+    """
+    cursor.execute("DROP TABLE IF EXISTS point_country_rows")
+    cursor.execute(f"""
+        CREATE TEMPORARY TABLE point_country_rows ON COMMIT DROP AS
+        SELECT p.dataset_type, p.date, root.name AS country,
+               SUM(p.cases)::int AS cases, SUM(p.deaths)::int AS deaths
+        FROM {DiseasePoint._meta.db_table} p
+        JOIN {LINEAGE_TABLE} l ON l.area_id = p.admin_area_id
+        JOIN {AdminArea._meta.db_table} root ON root.id = l.root_id
+        WHERE p.dataset_type = %s AND p.date IN (SELECT DISTINCT date FROM {STAGING_TABLE})
+        GROUP BY p.dataset_type, p.date, root.name
+    """, [dataset_name])
+    cursor.execute("SELECT DISTINCT country FROM point_country_rows")
+    countries = [row[0] for row in cursor.fetchall()]
+    geometry_ids = resolve_countries(countries)
+
+    cursor.execute("ALTER TABLE point_country_rows ADD COLUMN country_geom_id bigint")
+    cursor.execute(
+        """
+        UPDATE point_country_rows r SET country_geom_id = g.id
+        FROM unnest(%s::text[], %s::bigint[]) AS g(key, id)
+        WHERE lower(trim(r.country)) = g.key
+        """,
+        [list(geometry_ids), list(geometry_ids.values())]
+    )
+    # Points are the source of truth for these days whatever the upload mode:
+    # the rows are recomputed from every point, so they overwrite. Datasets
+    # with country rows of their own are refused by check_dataset_kind()
+    inserted, updated = merge_rows(cursor, f"SELECT {', '.join(LOAD_COLUMNS)} FROM point_country_rows", 'upsert')
+    return inserted, updated, countries
+
+
+def ingest_points(file, dataset_name, mapping=None, chunksize=CHUNK_SIZE, progress=None, options=None, mode='append'):
+    """
+    Stream a CSV of located reports (lat/lon and/or admin area names) into
+    DiseasePoint, chunk by chunk through COPY into a staging table, then
+    assign admin areas with one spatial join and derive the country rows.
+    mode 'append' adds points, 'replace' drops the dataset first; 'upsert'
+    is not meaningful for points (they have no natural key). Either way the
+    dataset's country rows for the uploaded days are recomputed from all of
+    its points, so appending into a dataset of CSV country rows is refused.
+    Returns a summary dict like ingest_csv; raises IngestError.
+    """
+    if mode not in INGEST_MODES:
+        raise IngestError(f"Unknown ingest mode '{mode}'")
+    if mode == 'upsert':
+        raise IngestError("Point uploads support append or replace only")
+    mapping = mapping or {}
+    options = options or {}
+    admin_level = mapping.get('admin_level')
+    admin_level = int(admin_level) if str(admin_level or '').isdigit() else None
+    start_time = time.time()
+    columns = None
+    counters = {'chunks': 0, 'rows_parsed': 0, 'rows_staged': 0, 'skipped': 0}
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        check_dataset_kind(dataset_name, mode, points=True)
+        if mode == 'replace':
+            DiseasePoint.objects.filter(dataset_type=dataset_name).delete()
+            DiseaseData.objects.filter(dataset_type=dataset_name).delete()
+        # Temp tables outlive a savepoint: drop what an earlier ingest of
+        # the same outer transaction left (see CopyLoader)
+        cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+        cursor.execute(f"""
+            CREATE TEMPORARY TABLE {STAGING_TABLE} (
+                date date NOT NULL,
+                lon double precision,
+                lat double precision,
+                admin_key text,
+                cases integer,
+                deaths integer
+            ) ON COMMIT DROP
+        """)
+        reader = pd.read_csv(
+            file, sep=options.get('delimiter', ','), encoding=options.get('encoding', 'utf-8'),
+            low_memory=False, chunksize=chunksize
+        )
+        for df in reader:
+            if columns is None:
+                columns = detect_point_columns(list(df.columns), mapping)
+                logger.info(f"Using point columns: {columns}")
+
+            frame, skipped = clean_points(df, columns)
+            buf = io.StringIO()
+            frame[STAGING_COLUMNS].to_csv(buf, index=False, header=False, na_rep='\\N')
+            buf.seek(0)
+            copy_from(cursor, f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf)
+
+            counters['chunks'] += 1
+            counters['rows_parsed'] += len(df)
+            counters['rows_staged'] += len(frame)
+            counters['skipped'] += skipped
+            if hasattr(file, 'tell'):
+                counters['bytes_read'] = file.tell()
+            elapsed = time.time() - start_time
+            counters['rows_per_sec'] = round(counters['rows_parsed'] / elapsed) if elapsed > 0 else 0
+            logger.info(f"   Chunk {counters['chunks']}: {len(frame)} points staged ({counters['rows_staged']} total)")
+            if progress:
+                progress(dict(counters))
+
+        if columns is None:
+            raise IngestError('CSV file is empty')
+
+        join_start = time.time()
+        _build_lineage(cursor)
+        written, unassigned, no_country = _assign_points(cursor, dataset_name, admin_level)
+        logger.info(
+            f"Assigned {written - unassigned}/{written} points to admin areas in {time.time() - join_start:.2f}s "
+            f"({no_country} in areas without a country)"
+        )
+        inserted, updated, countries = _derive_country_rows(cursor, dataset_name)
+
+        if mode == 'replace':
+            refresh_rollup(dataset_name)
+        elif countries:
+            refresh_rollup(dataset_name, countries)
+        refresh_catalog(dataset_name, changed=bool(written) or mode == 'replace')
+        transaction.on_commit(invalidate_catalog)
+
+    elapsed = time.time() - start_time
+    logger.info(
+        f"Point upload complete ({mode})! {written} points, {unassigned} unassigned, "
+        f"{no_country} without a country in {elapsed:.2f}s"
+    )
+    return {
+        'imported': written,
+        'updated': 0,
+        'unassigned': unassigned,
+        'no_country': no_country,
+        'country_rows': inserted + updated,
+        'mode': mode,
+        'total_rows': counters['rows_parsed'],
+        'skipped': counters['skipped'],
+        'chunks': counters['chunks'],
+        'dataset': dataset_name,
+        'elapsed_seconds': round(elapsed, 2)
+    }
+
+
+def admin_rollup(dataset, level, start=None, end=None):
+    """
+    Cases/deaths per AdminArea at any level for a dataset and date range.
+    Points are first summed per assigned area (index-only scan), then each
+    area is climbed to its ancestor at `level`; points assigned to a
+    coarser area than `level` are reported as unassigned.
+    Returns (areas, unassigned) with areas sorted by cases.
+    """
+    area_table = AdminArea._meta.db_table
+    filters, params = ['dataset_type = %s'], [dataset]
+    if start:
+        filters.append('date >= %s')
+        params.append(start)
+    if end:
+        filters.append('date <= %s')
+        params.append(end)
+
+    with connection.cursor() as cur:
+        cur.execute(f"""
+            WITH RECURSIVE climb(area_id, ancestor_id, level) AS (
+                SELECT id, id, level FROM {area_table} WHERE level >= %s
+                UNION ALL
+                SELECT c.area_id, parent.id, parent.level
+                FROM climb c
+                JOIN {area_table} a ON a.id = c.ancestor_id
+                JOIN {area_table} parent ON parent.id = a.parent_id
+                WHERE c.level > %s
+            ),
+            per_area AS (
+                SELECT admin_area_id, SUM(cases) AS cases, SUM(deaths) AS deaths, COUNT(*) AS points
+                FROM {DiseasePoint._meta.db_table}
+                WHERE {' AND '.join(filters)}
+                GROUP BY admin_area_id
+            )
+            SELECT anc.id, anc.code, anc.name, COALESCE(SUM(p.cases), 0), COALESCE(SUM(p.deaths), 0),
+                   SUM(p.points), anc.id IS NULL
+            FROM per_area p
+            LEFT JOIN climb c ON c.area_id = p.admin_area_id AND c.level = %s
+            LEFT JOIN {area_table} anc ON anc.id = c.ancestor_id
+            GROUP BY anc.id, anc.code, anc.name
+            ORDER BY 4 DESC, 3
+        """, [level, level] + params + [level])
+        rows = cur.fetchall()
+
+    areas, unassigned = [], 0
+    for area_id, code, name, cases, deaths, points, missing in rows:
+        if missing:
+            unassigned += int(points)
+            continue
+        areas.append({
+            'id': area_id, 'code': code, 'name': name,
+            'cases': int(cases), 'deaths': int(deaths), 'points': int(points),
+        })
+    return areas, unassigned
+
+
+HOTSPOT_METHODS = ('grid', 'dbscan')
+HOTSPOT_MAX_ZOOM = 14
+# Neighbours (within one grid step) a point needs to seed a DBSCAN cluster
+DBSCAN_MIN_POINTS = 5
+# Most cells one response carries (the ones with most cases)
+HOTSPOT_MAX_CELLS = getattr(settings, 'HOTSPOT_MAX_CELLS', 5000)
+
+
+def hotspot_cell_size(zoom):
+    """Grid step in degrees: about 64 screen pixels at the given zoom"""
+    zoom = min(max(int(zoom), 0), HOTSPOT_MAX_ZOOM)
+    return 360.0 / (2 ** zoom) / 4
+
+
+def hotspot_bbox(bbox, zoom):
+    """
+    (west, south, east, north) widened to whole grid cells at the zoom and
+    clamped to the globe, so a grid cell is never cut by the box and small
+    pans reuse the same cached response. Raises ValueError when empty.
+    """
+    size = hotspot_cell_size(zoom)
+    west, south, east, north = bbox
+    # ST_SnapToGrid centres cells on multiples of size: edges sit half-way
+    west = max((math.floor(west / size - 0.5) + 0.5) * size, -180.0)
+    south = max((math.floor(south / size - 0.5) + 0.5) * size, -90.0)
+    east = min((math.ceil(east / size + 0.5) - 0.5) * size, 180.0)
+    north = min((math.ceil(north / size + 0.5) - 0.5) * size, 90.0)
+    if west >= east or south >= north:
+        raise ValueError('empty bbox')
+    return (west, south, east, north)
+
+
+def hotspot_cells(dataset, zoom, start=None, end=None, method='grid', bbox=None):
+    """
+    Aggregate a dataset's located points into cells for the zoom level:
+    'grid' bins them with ST_SnapToGrid, 'dbscan' clusters them with
+    ST_ClusterDBSCAN (eps = one grid step). bbox (west, south, east, north)
+    limits both to the points in view through the GiST index. Columnar
+    result, at most HOTSPOT_MAX_CELLS entries (most cases first): lon/lat
+    (cell centre or cluster centroid), cases, deaths, points, and for
+    dbscan the cluster extent in degrees.
+    """
+    size = hotspot_cell_size(zoom)
+    filters, params = ['dataset_type = %s', 'location IS NOT NULL'], [dataset]
+    if start:
+        filters.append('date >= %s')
+        params.append(start)
+    if end:
+        filters.append('date <= %s')
+        params.append(end)
+    if bbox:
+        filters.append('location && ST_MakeEnvelope(%s, %s, %s, %s, 4326)')
+        params.extend(bbox)
+    where = ' AND '.join(filters)
+    point_table = DiseasePoint._meta.db_table
+
+    if method == 'dbscan':
+        sql = f"""
+            SELECT ST_X(ST_Centroid(ST_Collect(location))), ST_Y(ST_Centroid(ST_Collect(location))),
+                   COALESCE(SUM(cases), 0), COALESCE(SUM(deaths), 0), COUNT(*),
+                   GREATEST(ST_XMax(ST_Extent(location)) - ST_XMin(ST_Extent(location)),
+                            ST_YMax(ST_Extent(location)) - ST_YMin(ST_Extent(location)))
+            FROM (
+                SELECT location, cases, deaths,
+                       ST_ClusterDBSCAN(location, eps := %s, minpoints := {DBSCAN_MIN_POINTS}) OVER () AS cluster_id
+                FROM {point_table}
+                WHERE {where}
+            ) clustered
+            WHERE cluster_id IS NOT NULL
+            GROUP BY cluster_id
+            ORDER BY 3 DESC
+            LIMIT %s
+        """
+    else:
+        sql = f"""
+            SELECT ST_X(cell), ST_Y(cell), COALESCE(SUM(cases), 0), COALESCE(SUM(deaths), 0), COUNT(*), NULL
+            FROM (
+                SELECT ST_SnapToGrid(location, %s) AS cell, cases, deaths
+                FROM {point_table}
+                WHERE {where}
+            ) binned
+            GROUP BY cell
+            ORDER BY 3 DESC
+            LIMIT %s
+        """
+    with connection.cursor() as cur:
+        # One extra row tells whether the cap cut anything
+        cur.execute(sql, [size] + params + [HOTSPOT_MAX_CELLS + 1])
+        rows = cur.fetchall()
+    truncated = len(rows) > HOTSPOT_MAX_CELLS
+    rows = rows[:HOTSPOT_MAX_CELLS]
+
+    cells = {
+        'lon': [round(r[0], 5) for r in rows],
+        'lat': [round(r[1], 5) for r in rows],
+        'cases': [int(r[2]) for r in rows],
+        'deaths': [int(r[3]) for r in rows],
+        'points': [int(r[4]) for r in rows],
+    }
+    if method == 'dbscan':
+        cells['extent'] = [round(r[5], 5) for r in rows]
+    return {'method': method, 'cell_size': size, 'count': len(rows), 'truncated': truncated, 'cells': cells}
@@ -1,3 +1,13 @@
+const discussionRoot = document.querySelector('[data-discussion-url]');
+const chatArea = document.getElementById('chatArea');
+const messagesUrl = discussionRoot.dataset.messagesUrl;
+const streamUrl = discussionRoot.dataset.streamUrl;
+const historyUrl = discussionRoot.dataset.historyUrl;
+const currentDataset = discussionRoot.dataset.dataset;
+const pollMs = parseInt(discussionRoot.dataset.pollMs, 10) || 4000;
+// Highest message id already on the page; only newer ones are requested
+let lastId = parseInt(discussionRoot.dataset.lastId, 10) || 0;
+
 document.getElementById('msgForm').onsubmit = async e => {
     e.preventDefault();
     const input = document.getElementById('messageInput');
@@ -9,7 +19,7 @@ document.getElementById('msgForm').onsubmit = async e => {
     await fetch('/api/post-message/', {
         method: 'POST',
         body: new URLSearchParams({
-            message: msg, 
+            message: msg,
             dataset: dataset,
             reply_to: replyToId
         }),
@@ -18,7 +28,7 @@ document.getElementById('msgForm').onsubmit = async e => {
     input.value = '';
     document.getElementById('replyToInput').value = '';
     document.getElementById('replyIndicator').style.display = 'none';
-    loadMessages();
+    fetchNewMessages();
 };
 
 document.getElementById('cancelReplyBtn').onclick = () => {
@@ -26,34 +36,147 @@ document.getElementById('cancelReplyBtn').onclick = () => {
     document.getElementById('replyIndicator').style.display = 'none';
 };
 
-function attachReplyListeners() {
-    document.querySelectorAll('.reply-btn').forEach(btn => {
-        btn.onclick = e => {
-            e.preventDefault();
-            const msgId = btn.dataset.msgId;
-            const msgName = btn.dataset.msgName;
-            document.getElementById('replyToInput').value = msgId;
-            document.getElementById('replyName').textContent = msgName;
-            document.getElementById('replyIndicator').style.display = 'block';
-            document.getElementById('messageInput').focus();
-        };
+// Keyset pagination: older threads are appended below the ones shown
+async function loadOlderThreads(btn) {
+    btn.disabled = true;
+    const params = new URLSearchParams({dataset: currentDataset, before: btn.dataset.before});
+    try {
+        const response = await fetch(`${historyUrl}?${params}`);
+        const page = await response.json();
+        // Server-rendered with the page's own template (escaped there)
+        document.getElementById('olderMessages').insertAdjacentHTML('beforebegin', page.html);
+        if (page.next_before) {
+            btn.dataset.before = page.next_before;
+            btn.disabled = false;
+        } else {
+            document.getElementById('olderMessages').remove();
+        }
+    } catch (err) {
+        console.error('Loading older messages failed:', err);
+        btn.disabled = false;
+    }
+}
+
+// One delegated listener covers messages added later as well
+chatArea.addEventListener('click', e => {
+    if (e.target.id === 'loadOlderBtn') {
+        loadOlderThreads(e.target);
+        return;
+    }
+    const btn = e.target.closest('.reply-btn');
+    if (!btn) return;
+    e.preventDefault();
+    document.getElementById('replyToInput').value = btn.dataset.msgId;
+    document.getElementById('replyName').textContent = btn.dataset.msgName;
+    document.getElementById('replyIndicator').style.display = 'block';
+    document.getElementById('messageInput').focus();
+});
+
+// Same markup as discussion.html; user text only ever goes through textContent
+function buildMessage(msg, isReply, repliedTo) {
+    const row = document.createElement('div');
+    row.className = 'd-flex justify-content-between align-items-start';
+
+    const body = document.createElement('div');
+    const time = document.createElement('small');
+    time.className = 'text-muted';
+    time.textContent = msg.created_label;
+    const name = document.createElement('strong');
+    name.textContent = msg.display_name;
+    body.append(time, ' ', name);
+    if (repliedTo) {
+        const target = document.createElement('small');
+        target.className = 'text-muted';
+        target.textContent = `↪ ${repliedTo}`;
+        body.append(' ', target);
+    }
+    body.append(': ');
+    msg.message.split('\n').forEach((line, i) => {
+        if (i > 0) body.appendChild(document.createElement('br'));
+        body.appendChild(document.createTextNode(line));
+    });
+
+    const btn = document.createElement('button');
+    btn.className = 'btn btn-sm btn-outline-secondary reply-btn';
+    btn.dataset.msgId = msg.id;
+    btn.dataset.msgName = msg.display_name;
+    btn.title = 'Reply';
+    btn.textContent = '↩️';
+    row.append(body, btn);
+
+    if (isReply) {
+        row.dataset.messageId = msg.id;
+        row.classList.add('mb-2');
+        row.style.cssText = 'background:#f0f0f0; padding:8px; border-radius:3px;';
+        return row;
+    }
+
+    const thread = document.createElement('div');
+    thread.className = 'thread d-flex flex-column mb-3 p-2 border-start border-primary';
+    thread.style.cssText = 'background:#fff; border-radius:4px;';
+    thread.dataset.messageId = msg.id;
+    const replies = document.createElement('div');
+    replies.className = 'replies ms-3 mt-2 ps-2 border-start border-secondary';
+    replies.style.display = 'none';
+    thread.append(row, replies);
+    return thread;
+}
+
+// Newest first, like the server-rendered page; replies go into their thread
+function addMessages(messages) {
+    messages.forEach(msg => {
+        lastId = Math.max(lastId, msg.id);
+        if (chatArea.querySelector(`[data-message-id="${msg.id}"]`)) return;
+
+        const parent = msg.reply_to && chatArea.querySelector(`[data-message-id="${msg.reply_to}"]`);
+        const thread = parent && parent.closest('.thread');
+        if (thread) {
+            const replies = thread.querySelector('.replies');
+            // Replies to a reply name who they answer, as in discussion_threads.html
+            const repliedTo = parent === thread ? null : parent.querySelector('.reply-btn').dataset.msgName;
+            replies.prepend(buildMessage(msg, true, repliedTo));
+            replies.style.display = '';
+        } else {
+            chatArea.prepend(buildMessage(msg, false));
+        }
+    });
+}
+
+let fetching = false;
+
+async function fetchNewMessages() {
+    if (fetching) return;
+    fetching = true;
+    try {
+        const params = new URLSearchParams({dataset: currentDataset, since_id: lastId});
+        const response = await fetch(`${messagesUrl}?${params}`);
+        if (response.ok) addMessages((await response.json()).messages);
+    } catch (err) {
+        console.error('Message update failed:', err);
+    } finally {
+        fetching = false;
+    }
+}
+
+function startPolling() {
+    setInterval(() => {
+        // Background tabs don't poll; they catch up when shown again
+        if (!document.hidden) fetchNewMessages();
+    }, pollMs);
+    document.addEventListener('visibilitychange', () => {
+        if (!document.hidden) fetchNewMessages();
     });
 }
 
-function loadMessages() {
-    const dataset = new URLSearchParams(window.location.search).get('dataset') || 'general';
-    const discussionUrl = document.querySelector('[data-discussion-url]').dataset.discussionUrl;
-    fetch(`${discussionUrl}?dataset=${dataset}`)
-        .then(r => r.text())
-        .then(html => {
-            const parser = new DOMParser();
-            const doc = parser.parseFromString(html, 'text/html');
-            document.getElementById('chatArea').innerHTML = 
-                doc.getElementById('chatArea').innerHTML;
-            attachReplyListeners();
-            document.getElementById('chatArea').scrollTop = document.getElementById('chatArea').scrollHeight;
-        });
+function startStream() {
+    const params = new URLSearchParams({dataset: currentDataset, since_id: lastId});
+    // Reconnects on its own, resuming from the Last-Event-ID it saw
+    const source = new EventSource(`${streamUrl}?${params}`);
+    source.addEventListener('messages', e => addMessages(JSON.parse(e.data)));
 }
 
-setInterval(loadMessages, 4000);
-loadMessages();
+if (discussionRoot.dataset.stream === '1' && window.EventSource) {
+    startStream();
+} else {
+    startPolling();
+}
@@ -1,8 +1,17 @@
-let map, geojsonLayer;
+let map, geojsonLayer, tileLayer, hotspotLayer;
 let lineChart, deathsChart, barChart;
 let currentSort = 'cases';
 let currentDataset = 'ebola';
 let rawMonthlyData = { cases: {}, deaths: {} };
+let countryStats = {};
+// Class thresholds of the shown year (server-computed, see class_breaks in stats.py)
+let caseBreaks = [];
+let geometryState = { dataset: null, version: null, tolerance: null };
+// Whole dataset as a country x month matrix (/api/cube/), sliced locally
+let cube = null;
+// Point datasets get a hotspot layer; others are remembered as having none
+let hotspotState = { dataset: null, available: true };
+let hotspotTimer = null;
 let debugMessages = [];
 
 // Debug console helper
@@ -84,237 +93,490 @@ document.addEventListener('DOMContentLoaded', function () {
         });
     }
 
-    // Load map + stats + charts
-    function loadEverything(year = slider.value) {
-        console.log('loadEverything called with year =', year);
-        const startDate = `${year}-01-01`;
-        const endDate = `${year}-12-31`;
+    // Mirrors tolerance_for_zoom() in geometry.py so the geometry URL only
+    // changes when the server would actually send a different resolution
+    function toleranceForZoom(zoom) {
+        if (zoom <= 2) return 0.1;
+        if (zoom <= 4) return 0.05;
+        if (zoom <= 6) return 0.02;
+        return 0.01;
+    }
+
+    // One colour per class (BREAK_CLASSES in stats.py), lightest first
+    const CLASS_COLORS = ['#FFFF99', '#FFD700', '#FFA500', '#FF6347', '#FF0000', '#8B0000'];
+    // Used when a year has too little data for breaks
+    const DEFAULT_BREAKS = [10, 100, 500, 1000, 5000];
+
+    function activeBreaks() {
+        return caseBreaks.length ? caseBreaks : DEFAULT_BREAKS;
+    }
+
+    // Fewer breaks than colours: spread the classes to both ends of the ramp
+    function classColor(cls, breakCount) {
+        return CLASS_COLORS[breakCount ? Math.round(cls * (CLASS_COLORS.length - 1) / breakCount) : 0];
+    }
+
+    function caseColor(cases) {
+        const breaks = activeBreaks();
+        let cls = 0;
+        while (cls < breaks.length && cases > breaks[cls]) cls++;
+        return classColor(cls, breaks.length);
+    }
+
+    function renderLegend() {
+        const legend = document.getElementById('legendItems');
+        if (!legend) return;
+        const breaks = activeBreaks();
+        const fmt = v => Math.round(v).toLocaleString();
+        legend.innerHTML = '';
+        for (let cls = breaks.length; cls >= 0; cls--) {
+            const label = cls === breaks.length ? `> ${fmt(breaks[cls - 1])}` :
+                cls === 0 ? `≤ ${fmt(breaks[0])}` : `${fmt(breaks[cls - 1])} – ${fmt(breaks[cls])}`;
+            const item = document.createElement('div');
+            item.className = 'd-flex align-items-center gap-2';
+            item.innerHTML = `
+                <div style="width: 20px; height: 20px; background-color: ${classColor(cls, breaks.length)}; border: 1px solid #333;"></div>
+                <small>${label}</small>
+            `;
+            legend.appendChild(item);
+        }
+    }
+
+    function styleFeature(feature) {
+        const stats = countryStats[feature.properties.id];
+        if (!stats) {
+            // No data for this country in the selected period
+            return { opacity: 0, fillOpacity: 0 };
+        }
+        return {
+            fill: true,
+            fillColor: caseColor(stats.cases || 0),
+            weight: 1.5,
+            opacity: 1,
+            color: 'black',
+            fillOpacity: 0.8
+        };
+    }
+
+    function countryPopup(p) {
+        const stats = countryStats[p.id] || {};
+        return `
+            <strong>${p.country}</strong><br>
+            Year: ${yearDisplay.textContent}<br>
+            Cases: <b>${(stats.cases || 0).toLocaleString()}</b><br>
+            Density: ${stats.density == null ? 'n/a' : `${stats.density.toFixed(4)} cases/km²`}<br>
+            Per 100k: ${stats.per_100k == null ? 'n/a' : stats.per_100k.toFixed(2)}
+        `;
+    }
 
-        // Load Map Data
-        fetch(`/api/gis-stats/?dataset=${currentDataset}&start_date=${startDate}&end_date=${endDate}&sort=${currentSort}`)
+    // Vector tiles (/tiles/...pbf): only tiles in view are fetched, simplified
+    // for their zoom level, and cached by the browser per dataset version.
+    // Colours still come from countryStats, so a year change only restyles.
+    function loadTiles(version) {
+        if (tileLayer && geometryState.dataset === currentDataset && geometryState.version === version) {
+            cube.keys.forEach(key => tileLayer.setFeatureStyle(key, styleFeature({ properties: { id: key } })));
+            return;
+        }
+        if (tileLayer) map.removeLayer(tileLayer);
+        geometryState = { dataset: currentDataset, version: version, tolerance: null };
+
+        tileLayer = L.vectorGrid.protobuf(
+            `/tiles/${encodeURIComponent(currentDataset)}/{z}/{x}/{y}.pbf?v=${version}`, {
+                rendererFactory: L.canvas.tile,
+                vectorTileLayerStyles: {
+                    countries: properties => styleFeature({ properties: properties })
+                },
+                interactive: true,
+                getFeatureId: feature => feature.properties.id,
+                // Matches MAX_ZOOM in tiles.py; deeper zooms scale those tiles
+                maxNativeZoom: 12
+            }
+        ).on('click', e => {
+            L.popup().setLatLng(e.latlng).setContent(countryPopup(e.layer.properties)).openOn(map);
+        }).addTo(map);
+    }
+
+    // Fetch country outlines once per dataset version + resolution; the browser
+    // caches the response, so year changes only restyle the existing layer.
+    // Only used when the VectorGrid plugin failed to load.
+    function loadGeometry(version, fitToData) {
+        const tolerance = toleranceForZoom(map.getZoom());
+        if (geojsonLayer && geometryState.dataset === currentDataset &&
+            geometryState.version === version && geometryState.tolerance === tolerance) {
+            geojsonLayer.setStyle(styleFeature);
+            return;
+        }
+
+        fetch(`/api/geometry/?dataset=${currentDataset}&v=${version}&tolerance=${tolerance}`)
             .then(r => r.json())
             .then(d => {
-                if (d && d.features && Array.isArray(d.features)) {
-                    if (geojsonLayer) map.removeLayer(geojsonLayer);
-
-                    geojsonLayer = L.geoJSON(d.features, {
-                        style: feature => {
-                            const cases = feature.properties.cases || 0;
-                            const color = cases > 5000 ? '#8B0000' :
-                                cases > 1000 ? '#FF0000' :
-                                    cases > 500 ? '#FF6347' :
-                                        cases > 100 ? '#FFA500' :
-                                            cases > 10 ? '#FFD700' : '#FFFF99';
-                            return {
-                                fillColor: color,
-                                weight: 1.5,
-                                color: 'black',
-                                fillOpacity: 0.8
-                            };
-                        },
-                        onEachFeature: (feature, layer) => {
-                            const p = feature.properties;
-                            layer.bindPopup(`
-                                <strong>${p.country}</strong><br>
-                                Year: ${p.year}<br>
-                                Cases: <b>${(p.cases || 0).toLocaleString()}</b><br>
-                                Density: ${(p.density || 0).toFixed(4)} cases/deg²
-                            `);
-                        }
-                    }).addTo(map);
+                if (!d || !Array.isArray(d.features)) {
+                    console.warn('No GeoJSON features in response; skipping map layer render');
+                    return;
+                }
+                if (geojsonLayer) map.removeLayer(geojsonLayer);
+                geometryState = { dataset: currentDataset, version: version, tolerance: tolerance };
 
-                    if (d.features.length > 0) {
-                        map.fitBounds(geojsonLayer.getBounds().pad(0.2));
+                geojsonLayer = L.geoJSON(d.features, {
+                    style: styleFeature,
+                    onEachFeature: (feature, layer) => {
+                        layer.bindPopup(() => countryPopup(feature.properties));
                     }
-                } else {
-                    console.warn('No GeoJSON features in response; skipping map layer render');
+                }).addTo(map);
+
+                if (fitToData && d.features.length > 0) {
+                    map.fitBounds(geojsonLayer.getBounds().pad(0.2));
                 }
             })
             .catch(err => console.error('Map load error:', err));
+    }
 
-        // Load Stats + Charts
-        fetch(`/api/gis-stats/?dataset=${currentDataset}&start_date=${startDate}&end_date=${endDate}&sort=${currentSort}`)
-            .then(r => {
-                console.log('Stats fetch status:', r.status);
-                return r.json();
-            })
+    // Switch geometry resolution when zooming across a tolerance level
+    map.on('zoomend', () => {
+        if (geometryState.version && !L.vectorGrid) loadGeometry(geometryState.version, false);
+    });
+    // Hotspots cover the view only: refetch after zooms (which end in a move) and pans
+    map.on('moveend', () => loadHotspots(slider.value));
+
+    // Clustered cells of point datasets (/api/hotspots/) in view, re-binned per zoom.
+    // Debounced so dragging the slider costs one request, not one per year.
+    const hotspotRenderer = L.canvas();
+    function loadHotspots(year) {
+        if (hotspotState.dataset === currentDataset && !hotspotState.available) return;
+        clearTimeout(hotspotTimer);
+        hotspotTimer = setTimeout(() => {
+            const dataset = currentDataset;
+            const params = new URLSearchParams({
+                dataset: dataset, zoom: map.getZoom(), start_date: `${year}-01-01`, end_date: `${year}-12-31`,
+                bbox: map.getBounds().toBBoxString()
+            });
+            fetch(`/api/hotspots/?${params}`)
+                .then(r => r.json())
+                .then(d => {
+                    if (dataset !== currentDataset) return;
+                    hotspotState = { dataset: dataset, available: !!d.has_points };
+                    if (hotspotLayer) {
+                        map.removeLayer(hotspotLayer);
+                        hotspotLayer = null;
+                    }
+                    if (!d.has_points || !d.count) return;
+
+                    const cells = d.cells;
+                    const maxCases = cells.cases.reduce((max, v) => Math.max(max, v), 1);
+                    hotspotLayer = L.layerGroup(cells.lon.map((lon, i) =>
+                        L.circleMarker([cells.lat[i], lon], {
+                            renderer: hotspotRenderer,
+                            radius: 4 + 16 * Math.sqrt(cells.cases[i] / maxCases),
+                            color: '#7f1d1d',
+                            weight: 1,
+                            fillColor: '#dc2626',
+                            fillOpacity: 0.6
+                        }).bindPopup(
+                            `Cases: <b>${cells.cases[i].toLocaleString()}</b><br>` +
+                            `Deaths: ${cells.deaths[i].toLocaleString()}<br>Reports: ${cells.points[i].toLocaleString()}`
+                        )
+                    )).addTo(map);
+                })
+                .catch(err => console.error('Hotspot load error:', err));
+        }, 250);
+    }
+
+    // base64 little-endian bytes -> typed array
+    function decodeArray(b64, ArrayType) {
+        const bytes = Uint8Array.from(atob(b64), c => c.charCodeAt(0));
+        return new ArrayType(bytes.buffer);
+    }
+
+    // One request per dataset version; every year and sort order is sliced from it
+    function loadCube() {
+        if (cube && cube.dataset === currentDataset) return Promise.resolve(cube);
+        const dataset = currentDataset;
+        return fetch(`/api/cube/?dataset=${encodeURIComponent(dataset)}`)
+            .then(r => r.json())
             .then(d => {
-                console.log('GIS stats response:', d);
-                // Update stats panel
-                document.getElementById('statsPanel').innerHTML = `
-                    <p><strong>Total Cases:</strong> ${d.stats.total_cases.toLocaleString()}</p>
-                    <p><strong>Total Deaths:</strong> ${d.stats.total_deaths.toLocaleString()}</p>
-                    <p><strong>CFR:</strong> ${d.stats.cfr_percent}%</p>
-                    <p><strong>Avg per Country:</strong> ${d.stats.avg_cases_per_country.toLocaleString()}</p>
-                    <p><strong>Countries Affected:</strong> ${d.stats.countries_affected}</p>
-                `;
-
-                // Prepare month labels and aggregate monthly totals from top10 monthly data
-                const monthLabels = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'];
-                const monthlyTotals = Array(12).fill(0);
-                const monthlyDeathsTotals = Array(12).fill(0);
-                const monthlyCases = (d.top10 && d.top10.monthly_cases) || {};
-                const monthlyDeaths = (d.top10 && d.top10.monthly_deaths) || {};
-
-                Object.values(monthlyCases).forEach(arr => {
-                    (arr || []).forEach((v, i) => { monthlyTotals[i] += (v || 0); });
-                });
+                const [startYear, startMonth] = (d.start || '0-1').split('-').map(Number);
+                cube = {
+                    dataset: dataset,
+                    version: d.version,
+                    countries: d.countries,
+                    keys: d.keys,
+                    months: d.months,
+                    // Month number (year * 12 + month - 1) of column 0
+                    first: startYear * 12 + startMonth - 1,
+                    cases: decodeArray(d.cases, Float64Array),
+                    deaths: decodeArray(d.deaths, Float64Array),
+                    rows: decodeArray(d.rows, Uint32Array),
+                    // Stored per country on the server: {key: {area, population}}
+                    measures: Object.fromEntries(d.keys.map((key, c) => [key, {
+                        area: d.area_km2[c], population: d.population[c]
+                    }])),
+                    breaks: d.breaks
+                };
+                debugLog(`Cube loaded: ${d.countries.length} countries x ${d.months} months`);
+                return cube;
+            });
+    }
 
-                Object.values(monthlyDeaths).forEach(arr => {
-                    (arr || []).forEach((v, i) => { monthlyDeathsTotals[i] += (v || 0); });
-                });
+    const round2 = v => Math.round(v * 100) / 100;
+
+    // Same numbers as /api/stats/ (summarize() in stats.py) for one calendar year
+    function yearStats(year, sortBy) {
+        const offset = year * 12 - cube.first;
+        const totals = [];
+        const byKey = {};
+        cube.countries.forEach((country, c) => {
+            const monthlyCases = Array(12).fill(0);
+            const monthlyDeaths = Array(12).fill(0);
+            let cases = 0, deaths = 0, rows = 0;
+            for (let m = 0; m < 12; m++) {
+                const col = offset + m;
+                if (col < 0 || col >= cube.months) continue;
+                const cell = c * cube.months + col;
+                monthlyCases[m] = cube.cases[cell];
+                monthlyDeaths[m] = cube.deaths[cell];
+                cases += cube.cases[cell];
+                deaths += cube.deaths[cell];
+                rows += cube.rows[cell];
+            }
+            // Countries without rows in the year are absent, as on the server
+            if (!rows) return;
+            totals.push({ country, cases, deaths, monthlyCases, monthlyDeaths });
+            const key = cube.keys[c];
+            byKey[key] = byKey[key] || { cases: 0, deaths: 0 };
+            byKey[key].cases += cases;
+            byKey[key].deaths += deaths;
+        });
+
+        Object.entries(byKey).forEach(([key, entry]) => {
+            const measure = cube.measures[key] || {};
+            entry.density = measure.area ? entry.cases / measure.area : null;
+            entry.per_100k = measure.population ? entry.cases / measure.population * 100000 : null;
+        });
+
+        const breaks = cube.breaks && cube.breaks.cases[year - cube.breaks.first_year];
+
+        const totalCases = totals.reduce((sum, t) => sum + t.cases, 0);
+        const totalDeaths = totals.reduce((sum, t) => sum + t.deaths, 0);
+        const top10 = totals.slice()
+            .sort((a, b) => (b[sortBy] - a[sortBy]) || (a.country < b.country ? -1 : a.country > b.country ? 1 : 0))
+            .slice(0, 10);
 
-                // Store raw monthly data for resolution switching
-                rawMonthlyData.cases = monthlyTotals;
-                rawMonthlyData.deaths = monthlyDeathsTotals;
-
-                // Render monthly charts
-                // Cases chart
-                if (lineChart) lineChart.destroy();
-                lineChart = new Chart(document.getElementById('lineChart'), {
-                    type: 'line',
-                    data: {
-                        labels: monthLabels,
-                        datasets: [{
-                            label: 'Monthly Cases',
-                            data: monthlyTotals,
-                            borderColor: '#2563eb',
-                            backgroundColor: 'rgba(37, 99, 235, 0.1)',
-                            tension: 0.4,
-                            fill: true,
-                            pointBackgroundColor: '#2563eb',
-                            pointRadius: 5
-                        }]
+        return {
+            version: cube.version,
+            countries: byKey,
+            breaks: { cases: breaks || [] },
+            stats: {
+                total_cases: totalCases,
+                total_deaths: totalDeaths,
+                cfr_percent: totalCases ? round2(totalDeaths / totalCases * 100) : 0,
+                avg_cases_per_country: totals.length ? round2(totalCases / totals.length) : 0,
+                countries_affected: totals.length
+            },
+            top10: {
+                countries: top10.map(t => t.country),
+                totals: top10.map(t => t[sortBy]),
+                monthly_cases: Object.fromEntries(top10.map(t => [t.country, t.monthlyCases])),
+                monthly_deaths: Object.fromEntries(top10.map(t => [t.country, t.monthlyDeaths])),
+                sort_by: sortBy
+            }
+        };
+    }
+
+    // Load map + stats + charts. Only the first call per dataset touches the
+    // network; slider and sort changes are computed from the cube.
+    function loadEverything(year = slider.value) {
+        loadCube()
+            .then(() => {
+                renderStats(yearStats(Number(year), currentSort));
+                loadHotspots(year);
+            })
+            .catch(err => {
+                console.error('Stats load error:', err);
+            });
+    }
+
+    function renderStats(d) {
+        // Join per-country numbers onto the (cached) geometry layer
+        countryStats = d.countries || {};
+        caseBreaks = (d.breaks && d.breaks.cases) || [];
+        renderLegend();
+        if (L.vectorGrid) {
+            loadTiles(d.version);
+        } else {
+            loadGeometry(d.version, geometryState.dataset !== currentDataset);
+        }
+
+        // Update stats panel
+        document.getElementById('statsPanel').innerHTML = `
+            <p><strong>Total Cases:</strong> ${d.stats.total_cases.toLocaleString()}</p>
+            <p><strong>Total Deaths:</strong> ${d.stats.total_deaths.toLocaleString()}</p>
+            <p><strong>CFR:</strong> ${d.stats.cfr_percent}%</p>
+            <p><strong>Avg per Country:</strong> ${d.stats.avg_cases_per_country.toLocaleString()}</p>
+            <p><strong>Countries Affected:</strong> ${d.stats.countries_affected}</p>
+        `;
+
+        // Prepare month labels and aggregate monthly totals from top10 monthly data
+        const monthLabels = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'];
+        const monthlyTotals = Array(12).fill(0);
+        const monthlyDeathsTotals = Array(12).fill(0);
+        const monthlyCases = (d.top10 && d.top10.monthly_cases) || {};
+        const monthlyDeaths = (d.top10 && d.top10.monthly_deaths) || {};
+
+        Object.values(monthlyCases).forEach(arr => {
+            (arr || []).forEach((v, i) => { monthlyTotals[i] += (v || 0); });
+        });
+
+        Object.values(monthlyDeaths).forEach(arr => {
+            (arr || []).forEach((v, i) => { monthlyDeathsTotals[i] += (v || 0); });
+        });
+
+        // Store raw monthly data for resolution switching
+        rawMonthlyData.cases = monthlyTotals;
+        rawMonthlyData.deaths = monthlyDeathsTotals;
+
+        // Render monthly charts
+        // Cases chart
+        if (lineChart) lineChart.destroy();
+        lineChart = new Chart(document.getElementById('lineChart'), {
+            type: 'line',
+            data: {
+                labels: monthLabels,
+                datasets: [{
+                    label: 'Monthly Cases',
+                    data: monthlyTotals,
+                    borderColor: '#2563eb',
+                    backgroundColor: 'rgba(37, 99, 235, 0.1)',
+                    tension: 0.4,
+                    fill: true,
+                    pointBackgroundColor: '#2563eb',
+                    pointRadius: 5
+                }]
+            },
+            options: {
+                responsive: true,
+                plugins: {
+                    title: {
+                        display: true,
+                        text: `Monthly Cases in ${document.getElementById('yearDisplay').textContent}`
                     },
-                    options: {
-                        responsive: true,
-                        plugins: {
-                            title: {
-                                display: true,
-                                text: `Monthly Cases in ${document.getElementById('yearDisplay').textContent}`
-                            },
-                            legend: { display: false }
-                        },
-                        scales: {
-                            y: { beginAtZero: true },
-                            x: { grid: { display: false } }
-                        }
-                    }
-                });
+                    legend: { display: false }
+                },
+                scales: {
+                    y: { beginAtZero: true },
+                    x: { grid: { display: false } }
+                }
+            }
+        });
 
-                // Deaths chart
-                if (deathsChart) deathsChart.destroy();
-                deathsChart = new Chart(document.getElementById('deathsChart'), {
-                    type: 'line',
-                    data: {
-                        labels: monthLabels,
-                        datasets: [{
-                            label: 'Monthly Deaths',
-                            data: monthlyDeathsTotals,
-                            borderColor: '#dc2626',
-                            backgroundColor: 'rgba(220, 38, 38, 0.1)',
-                            tension: 0.4,
-                            fill: true,
-                            pointBackgroundColor: '#dc2626',
-                            pointRadius: 5
-                        }]
+        // Deaths chart
+        if (deathsChart) deathsChart.destroy();
+        deathsChart = new Chart(document.getElementById('deathsChart'), {
+            type: 'line',
+            data: {
+                labels: monthLabels,
+                datasets: [{
+                    label: 'Monthly Deaths',
+                    data: monthlyDeathsTotals,
+                    borderColor: '#dc2626',
+                    backgroundColor: 'rgba(220, 38, 38, 0.1)',
+                    tension: 0.4,
+                    fill: true,
+                    pointBackgroundColor: '#dc2626',
+                    pointRadius: 5
+                }]
+            },
+            options: {
+                responsive: true,
+                plugins: {
+                    title: {
+                        display: true,
+                        text: `Monthly Deaths in ${document.getElementById('yearDisplay').textContent}`
                     },
-                    options: {
-                        responsive: true,
-                        plugins: {
+                    legend: { display: false }
+                },
+                scales: {
+                    y: { beginAtZero: true },
+                    x: { grid: { display: false } }
+                }
+            }
+        });
+
+        // Bar/mini-line Charts for Top 10 countries
+        const container = document.getElementById('top10Container');
+        container.innerHTML = '';
+
+        const top10 = d.top10 || {};
+        const countries = top10.countries || [];
+        const totals = top10.totals || [];
+        const monthlyData = top10.monthly_cases || {};
+
+        countries.forEach((country, idx) => {
+            const div = document.createElement('div');
+            div.className = 'border rounded p-3 mb-3 bg-light';
+            div.innerHTML = `
+                <div class="d-flex justify-content-between align-items-center mb-2">
+                    <strong>${idx + 1}. ${country}</strong>
+                    <span class="badge bg-primary fs-6">${(totals[idx] || 0).toLocaleString()} cases</span>
+                </div>
+                <canvas height="80"></canvas>
+            `;
+
+            const canvas = div.querySelector('canvas');
+            new Chart(canvas, {
+                type: 'line',
+                data: {
+                    labels: monthLabels,
+                    datasets: [{
+                        label: 'Cases',
+                        data: monthlyData[country] || Array(12).fill(0),
+                        borderColor: '#2563eb',
+                        backgroundColor: 'rgba(37, 99, 235, 0.1)',
+                        tension: 0.4,
+                        fill: true,
+                        pointRadius: 3
+                    }]
+                },
+                options: {
+                    responsive: true,
+                    plugins: {
+                        legend: {
+                            display: true,
+                            labels: {
+                                boxWidth: 12,
+                                boxHeight: 12,
+                                usePointStyle: true
+                            }
+                        },
+                        tooltip: { enabled: true }
+                    },
+                    scales: {
+                        x: {
+                            display: true,
+                            grid: { display: false },
+                            ticks: { display: false },
                             title: {
                                 display: true,
-                                text: `Monthly Deaths in ${document.getElementById('yearDisplay').textContent}`
-                            },
-                            legend: { display: false }
-                        },
-                        scales: {
-                            y: { beginAtZero: true },
-                            x: { grid: { display: false } }
-                        }
-                    }
-                });
-
-                // Bar/mini-line Charts for Top 10 countries
-                const container = document.getElementById('top10Container');
-                container.innerHTML = '';
-
-                const top10 = d.top10 || {};
-                const countries = top10.countries || [];
-                const totals = top10.totals || [];
-                const monthlyData = top10.monthly_cases || {};
-
-                countries.forEach((country, idx) => {
-                    const div = document.createElement('div');
-                    div.className = 'border rounded p-3 mb-3 bg-light';
-                    div.innerHTML = `
-                        <div class="d-flex justify-content-between align-items-center mb-2">
-                            <strong>${idx + 1}. ${country}</strong>
-                            <span class="badge bg-primary fs-6">${(totals[idx] || 0).toLocaleString()} cases</span>
-                        </div>
-                        <canvas height="80"></canvas>
-                    `;
-
-                    const canvas = div.querySelector('canvas');
-                    new Chart(canvas, {
-                        type: 'line',
-                        data: {
-                            labels: monthLabels,
-                            datasets: [{
-                                label: 'Cases',
-                                data: monthlyData[country] || Array(12).fill(0),
-                                borderColor: '#2563eb',
-                                backgroundColor: 'rgba(37, 99, 235, 0.1)',
-                                tension: 0.4,
-                                fill: true,
-                                pointRadius: 3
-                            }]
+                                text: 'Months (Jan–Dec)',
+                                font: { size: 10 }
+                            }
                         },
-                        options: {
-                            responsive: true,
-                            plugins: {
-                                legend: {
-                                    display: true,
-                                    labels: {
-                                        boxWidth: 12,
-                                        boxHeight: 12,
-                                        usePointStyle: true
-                                    }
-                                },
-                                tooltip: { enabled: true }
-                            },
-                            scales: {
-                                x: {
-                                    display: true,
-                                    grid: { display: false },
-                                    ticks: { display: false },
-                                    title: {
-                                        display: true,
-                                        text: 'Months (Jan–Dec)',
-                                        font: { size: 10 }
-                                    }
-                                },
-                                y: {
-                                    display: true,
-                                    beginAtZero: true,
-                                    grid: { display: false },
-                                    ticks: { display: false },
-                                    title: {
-                                        display: true,
-                                        text: 'Cases',
-                                        font: { size: 10 }
-                                    }
-                                }
+                        y: {
+                            display: true,
+                            beginAtZero: true,
+                            grid: { display: false },
+                            ticks: { display: false },
+                            title: {
+                                display: true,
+                                text: 'Cases',
+                                font: { size: 10 }
                             }
                         }
-                    });
-
-                    container.appendChild(div);
-                });
-            })
-            .catch(err => {
-                console.error('Stats load error:', err);
+                    }
+                }
             });
+
+            container.appendChild(div);
+        });
     }
 
     function loadDatasetList() {
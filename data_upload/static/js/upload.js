@@ -78,30 +78,39 @@ function initUploadForm() {
 
     if (!form || !statusDiv) return;
 
+    // Token of the file already sent through /api/uploads/ (single use)
+    let uploadToken = null;
+    // Chunked upload still in flight for the selected file
+    let pendingUpload = null;
+
     // Handle CSV file selection - detect columns automatically
     csvFileInput.addEventListener('change', async function() {
         const file = this.files[0];
+        uploadToken = null;
         if (!file) {
             columnMappingSection.style.display = 'none';
             return;
         }
 
         try {
-            // Send file to backend to detect columns
-            const formData = new FormData();
-            formData.append('csv_file', file);
-
-            const response = await fetch('/api/detect-columns/', {
-                method: 'POST',
-                body: formData,
-                headers: {
-                    'X-CSRFToken': document.querySelector('[name=csrfmiddlewaretoken]').value
-                }
+            // Send the file in resumable chunks; finalize answers with the detected columns
+            pendingUpload = chunkedUpload(file, (done, total) => {
+                const percent = Math.round(done / total * 100);
+                statusDiv.innerHTML = `
+                    <div class="alert alert-info">
+                        <strong>📤 Sending ${file.name}</strong>
+                        <div class="progress mt-2" style="height: 24px;">
+                            <div class="progress-bar bg-success" style="width: ${percent}%">${percent}%</div>
+                        </div>
+                    </div>`;
             });
+            const result = await pendingUpload;
+            pendingUpload = null;
+            statusDiv.innerHTML = '';
 
-            const result = await response.json();
+            if (!result.error && result.columns) {
+                uploadToken = result.upload_token || null;
 
-            if (response.ok && result.columns) {
                 // Populate all column dropdowns
                 populateColumnDropdowns(result.columns);
                 
@@ -122,6 +131,7 @@ function initUploadForm() {
                 columnMappingSection.style.display = 'none';
             }
         } catch (err) {
+            pendingUpload = null;
             console.error('Column detection failed:', err);
             columnError.textContent = 'Error reading CSV file: ' + err.message;
             columnError.style.display = 'block';
@@ -129,6 +139,77 @@ function initUploadForm() {
         }
     });
 
+    const PARALLEL_CHUNKS = 4;
+    const CHUNK_RETRIES = 3;
+
+    function csrfToken() {
+        return document.querySelector('[name=csrfmiddlewaretoken]').value;
+    }
+
+    // Resumable upload: /api/uploads/ init, PUT each missing chunk (a few in
+    // parallel, retried on failure), then finalize. The upload id is kept in
+    // localStorage so re-selecting the same file resumes where it stopped.
+    async function chunkedUpload(file, onProgress) {
+        const storageKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
+        let session = null;
+
+        const savedId = localStorage.getItem(storageKey);
+        if (savedId) {
+            const response = await fetch(`/api/uploads/${savedId}/`);
+            if (response.ok) session = await response.json();
+        }
+        if (!session) {
+            const response = await fetch('/api/uploads/', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfToken()},
+                body: JSON.stringify({file_name: file.name, file_size: file.size})
+            });
+            session = await response.json();
+            if (!response.ok) return {error: session.error || 'Could not start upload'};
+            session.missing = Array.from({length: session.chunks}, (_, i) => i);
+            localStorage.setItem(storageKey, session.upload_id);
+        }
+
+        const queue = [...session.missing];
+        let done = session.chunks - queue.length;
+        onProgress(done, session.chunks);
+
+        async function sendChunk(index) {
+            const start = index * session.chunk_size;
+            const blob = file.slice(start, Math.min(start + session.chunk_size, file.size));
+            for (let attempt = 1; ; attempt++) {
+                try {
+                    const response = await fetch(`/api/uploads/${session.upload_id}/chunks/${index}/`, {
+                        method: 'PUT',
+                        headers: {'X-CSRFToken': csrfToken()},
+                        body: blob
+                    });
+                    if (response.ok) return;
+                    if (attempt >= CHUNK_RETRIES) throw new Error((await response.json()).error);
+                } catch (err) {
+                    if (attempt >= CHUNK_RETRIES) throw err;
+                }
+                await new Promise(resolve => setTimeout(resolve, 500 * attempt));
+            }
+        }
+
+        async function worker() {
+            while (queue.length) {
+                await sendChunk(queue.shift());
+                onProgress(++done, session.chunks);
+            }
+        }
+        await Promise.all(Array.from({length: PARALLEL_CHUNKS}, worker));
+
+        const response = await fetch(`/api/uploads/${session.upload_id}/finalize/`, {
+            method: 'POST',
+            headers: {'X-CSRFToken': csrfToken()}
+        });
+        const result = await response.json();
+        localStorage.removeItem(storageKey);
+        return response.ok ? result : {error: result.error || 'Upload failed'};
+    }
+
     // Populate column dropdowns with available columns
     function populateColumnDropdowns(columns) {
         const dropdowns = ['date_col', 'country_col', 'cases_col', 'deaths_col'];
@@ -249,8 +330,18 @@ function initUploadForm() {
                 </div>
             </div>`;
 
+        // The server already has the file if columns were detected: send only its token
+        if (pendingUpload) {
+            statusDiv.innerHTML = '<div class="alert alert-info">Waiting for the file transfer to finish...</div>';
+            try { await pendingUpload; } catch (err) { /* falls back to a direct upload */ }
+        }
         const formData = new FormData();
-        formData.append('csv_file', file);
+        if (uploadToken) {
+            formData.append('upload_token', uploadToken);
+            uploadToken = null;
+        } else {
+            formData.append('csv_file', file);
+        }
         formData.append('dataset_name', nameInput.value.trim().toLowerCase().replace(/\s+/g, '_'));
         
         // Add column mappings
@@ -260,44 +351,109 @@ function initUploadForm() {
         const deathsCol = document.getElementById('deaths_col').value;
         if (deathsCol) formData.append('deaths_col', deathsCol);
 
+        formData.append('mode', document.getElementById('ingest_mode').value);
+        formData.append('background', '1');
+
         const uploadStartTime = Date.now();
 
+        function showProgress(percent, label) {
+            statusDiv.innerHTML = `
+                <div class="alert alert-info">
+                    <strong>📤 ${file.name}</strong><br>
+                    Size: ${fileSizeMB} MB<br>
+                    <div class="progress mt-3" style="height: 32px;">
+                        <div class="progress-bar progress-bar-striped progress-bar-animated bg-success" style="width: ${percent}%">
+                            ${percent}%
+                        </div>
+                    </div>
+                    <small class="d-block mt-2">${label}</small>
+                </div>`;
+        }
+
+        function showSuccess(result) {
+            const uploadTime = ((Date.now() - uploadStartTime) / 1000).toFixed(2);
+            const rowsPerSec = (result.imported / uploadTime).toFixed(0);
+
+            statusDiv.innerHTML = `
+                <div class="alert alert-success">
+                    <h5>✅ Upload Complete!</h5>
+                    <strong>${result.imported.toLocaleString()}</strong> rows imported<br>
+                    ${result.updated ? `<small>${result.updated.toLocaleString()} rows updated</small><br>` : ''}
+                    <small>${result.skipped || 0} rows skipped</small><br>
+                    ${result.unassigned ? `<small>${result.unassigned.toLocaleString()} points outside every admin area</small><br>` : ''}
+                    ${result.no_country ? `<small>${result.no_country.toLocaleString()} points in areas without a country (level 0) ancestor</small><br>` : ''}
+                    <strong>Time:</strong> ${uploadTime}s (${rowsPerSec} rows/sec)<br>
+                    <strong>Dataset:</strong> ${result.dataset}<br><br>
+                    <a href="/map/?dataset=${result.dataset}" class="btn btn-primary">
+                        📍 View on Interactive Map
+                    </a>
+                </div>`;
+
+            fileInput.value = '';
+            nameInput.value = '';
+            columnMappingSection.style.display = 'none';
+            if (typeof loadMapData === 'function') loadMapData();
+        }
+
+        function showError(errorMsg) {
+            statusDiv.innerHTML = `<div class="alert alert-danger">❌ Error: ${errorMsg}</div>`;
+        }
+
+        // Poll the background job until it finishes; the bar follows bytes ingested.
+        // Gives up when the job shows no sign of life for JOB_STALL_MS.
+        const JOB_STALL_MS = 10 * 60 * 1000;
+
+        async function pollJob(statusUrl) {
+            let lastChange = Date.now();
+            let lastState = '';
+            while (Date.now() - lastChange < JOB_STALL_MS) {
+                await new Promise(resolve => setTimeout(resolve, 1000));
+                const response = await fetch(statusUrl);
+                const job = await response.json();
+                if (!response.ok) {
+                    showError(job.error || 'Upload status unavailable');
+                    return;
+                }
+                if (job.status === 'done') {
+                    showSuccess(job.result);
+                    return;
+                }
+                if (job.status === 'failed') {
+                    showError(job.error || 'Unknown error');
+                    return;
+                }
+                const state = `${job.status}:${job.bytes_read}:${job.rows_staged}`;
+                if (state !== lastState) {
+                    lastState = state;
+                    lastChange = Date.now();
+                }
+                const label = job.status === 'queued'
+                    ? 'Waiting for an ingest worker...'
+                    : `${job.rows_staged.toLocaleString()} rows staged (${job.rows_per_sec.toLocaleString()} rows/sec parsed)`;
+                showProgress(Math.min(job.percent, 99), label);
+            }
+            showError(`No progress for ${JOB_STALL_MS / 60000} minutes, the upload may have been interrupted. ` +
+                      `Check <a href="${statusUrl}">its status</a> later or upload the file again.`);
+        }
+
         try {
-            // ⚡ Send to optimized endpoint with keepalive for large files
             const response = await fetch('/api/upload/', {
                 method: 'POST',
                 body: formData,
                 headers: {
                     'X-CSRFToken': document.querySelector('[name=csrfmiddlewaretoken]').value
-                },
-                keepalive: true  // Prevents connection drops on large uploads
+                }
             });
 
             const result = await response.json();
-            const uploadTime = ((Date.now() - uploadStartTime) / 1000).toFixed(2);
 
-            if (response.ok && result.status === 'success') {
-                const rowsPerSec = (result.imported / uploadTime).toFixed(0);
-                
-                statusDiv.innerHTML = `
-                    <div class="alert alert-success">
-                        <h5>✅ Upload Complete!</h5>
-                        <strong>${result.imported.toLocaleString()}</strong> rows imported<br>
-                        <small>${result.skipped || 0} rows skipped</small><br>
-                        <strong>Time:</strong> ${uploadTime}s (${rowsPerSec} rows/sec)<br>
-                        <strong>Dataset:</strong> ${result.dataset}<br><br>
-                        <a href="/map/?dataset=${result.dataset}" class="btn btn-primary">
-                            📍 View on Interactive Map
-                        </a>
-                    </div>`;
-                
-                fileInput.value = '';
-                nameInput.value = '';
-                columnMappingSection.style.display = 'none';
-                if (typeof loadMapData === 'function') loadMapData();
+            if (response.status === 202 && result.status_url) {
+                showProgress(0, 'File received, processing...');
+                await pollJob(result.status_url);
+            } else if (response.ok && result.status === 'success') {
+                showSuccess(result);
             } else {
-                const errorMsg = result.error || 'Unknown error';
-                statusDiv.innerHTML = `<div class="alert alert-danger">❌ Error: ${errorMsg}</div>`;
+                showError(result.error || 'Unknown error');
             }
         } catch (err) {
             console.error("Upload failed:", err);
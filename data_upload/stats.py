@@ -0,0 +1,396 @@
+import base64
+import logging
+import warnings
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
+from .models import CountryGeometry, DiseaseData, DiseaseRollup
+from .catalog import catalog, catalog_version
+
+logger = logging.getLogger(__name__)
+
+FRAME_COLUMNS = ['country', 'year', 'month', 'cases', 'deaths', 'rows']
+
+# Choropleth classes (map.js has one colour per class) and how to cut them
+BREAK_CLASSES = 6
+BREAK_METHODS = ('quantile', 'jenks')
+RATE_FIELDS = ('cases', 'density', 'per_100k')
+
+
+def monthly_frame(qs):
+    """
+    Aggregate a DiseaseData queryset into one row per (country, year, month).
+    This single GROUP BY is the only pass over raw rows the dashboard needs.
+    """
+    monthly = (
+        qs.annotate(year=ExtractYear('date'), month=ExtractMonth('date'))
+          .values('country', 'year', 'month')
+          .annotate(
+              cases=Coalesce(Sum('cases'), 0),
+              deaths=Coalesce(Sum('deaths'), 0),
+              rows=Count('id')
+          )
+          .order_by()
+    )
+    return pd.DataFrame.from_records(list(monthly), columns=FRAME_COLUMNS)
+
+
+def _month_bounds(start, end):
+    """
+    ((year, month), (year, month)) when start/end fall on month boundaries
+    (missing ends are open), else None: the rollup cannot answer the range.
+    """
+    try:
+        start_date = date.fromisoformat(start) if start else None
+        end_date = date.fromisoformat(end) if end else None
+    except ValueError:
+        return None
+    if start_date and start_date.day != 1:
+        return None
+    if end_date and (end_date + timedelta(days=1)).day != 1:
+        return None
+    return (
+        (start_date.year, start_date.month) if start_date else None,
+        (end_date.year, end_date.month) if end_date else None,
+    )
+
+
+def rollup_frame(dataset=None, start=None, end=None):
+    """
+    Monthly frame read from DiseaseRollup, or None when the rollup has no
+    rows for the dataset or the date range is not month-aligned.
+    """
+    bounds = _month_bounds(start, end)
+    if bounds is None:
+        return None
+    # Every dataset in the catalog has had its rollup refreshed
+    entries = catalog()
+    if (dataset is None and not entries) or (dataset is not None and dataset not in entries):
+        return None
+    rollup = DiseaseRollup.objects.all() if dataset is None else DiseaseRollup.objects.filter(dataset_type=dataset)
+
+    first, last = bounds
+    if first:
+        rollup = rollup.filter(Q(year__gt=first[0]) | Q(year=first[0], month__gte=first[1]))
+    if last:
+        rollup = rollup.filter(Q(year__lt=last[0]) | Q(year=last[0], month__lte=last[1]))
+    if dataset is None:
+        # Several datasets share (country, year, month) cells
+        monthly = rollup.values('country', 'year', 'month').annotate(
+            cases=Sum('cases'), deaths=Sum('deaths'), rows=Sum('rows')
+        ).order_by()
+    else:
+        monthly = rollup.values(*FRAME_COLUMNS)
+    return pd.DataFrame.from_records(list(monthly), columns=FRAME_COLUMNS)
+
+
+def dashboard_frame(dataset=None, start=None, end=None):
+    """Monthly frame for the dashboard: rollup when it can answer, raw rows otherwise"""
+    frame = rollup_frame(dataset, start, end)
+    if frame is not None:
+        return frame
+    qs = DiseaseData.objects.all() if dataset is None else DiseaseData.objects.filter(dataset_type=dataset)
+    if start:
+        qs = qs.filter(date__gte=start)
+    if end:
+        qs = qs.filter(date__lte=end)
+    return monthly_frame(qs)
+
+
+def refresh_rollup(dataset, countries=None):
+    """
+    Recompute DiseaseRollup for a dataset from DiseaseData. Pass the
+    countries an upload touched to refresh only their rows.
+    Returns the number of rollup rows written.
+    """
+    rollup_table = DiseaseRollup._meta.db_table
+    data_table = DiseaseData._meta.db_table
+    params = [dataset]
+    country_filter = ''
+    existing = DiseaseRollup.objects.filter(dataset_type=dataset)
+    if countries is not None:
+        countries = list(countries)
+        existing = existing.filter(country__in=countries)
+        country_filter = 'AND country = ANY(%s)'
+        params.append(countries)
+
+    with transaction.atomic():
+        existing.delete()
+        with connection.cursor() as cur:
+            cur.execute(
+                f"""
+                INSERT INTO {rollup_table} (dataset_type, country, year, month, cases, deaths, rows)
+                SELECT dataset_type, country,
+                       EXTRACT(YEAR FROM date)::int, EXTRACT(MONTH FROM date)::int,
+                       COALESCE(SUM(cases), 0), COALESCE(SUM(deaths), 0), COUNT(*)
+                FROM {data_table}
+                WHERE dataset_type = %s {country_filter}
+                GROUP BY 1, 2, 3, 4
+                """,
+                params
+            )
+            written = cur.rowcount
+    logger.info(f"Rollup refreshed for dataset='{dataset}': {written} monthly rows")
+    return written
+
+
+def dataset_names():
+    """Sorted dataset names, from the in-memory dataset catalog"""
+    return sorted(name for name in catalog() if name)
+
+
+def dataset_countries(dataset=None):
+    """Distinct country names of a dataset (all data when None)"""
+    rollup = DiseaseRollup.objects.all() if dataset is None else DiseaseRollup.objects.filter(dataset_type=dataset)
+    if rollup.exists():
+        return list(rollup.order_by().values_list('country', flat=True).distinct())
+    qs = DiseaseData.objects.all() if dataset is None else DiseaseData.objects.filter(dataset_type=dataset)
+    return list(qs.order_by().values_list('country', flat=True).distinct())
+
+
+def country_totals(frame):
+    """Per-country cases/deaths totals, sorted by country name"""
+    if frame.empty:
+        return pd.DataFrame(columns=['country', 'cases', 'deaths'])
+    totals = frame.groupby('country', sort=True)[['cases', 'deaths']].sum()
+    return totals.reset_index()
+
+
+def totals_by_key(frame):
+    """Per-country totals keyed by normalized country key: {key: {"cases", "deaths"}}"""
+    if frame.empty:
+        return {}
+    keys = frame['country'].astype(str).str.strip().str.lower()
+    totals = frame.groupby(keys)[['cases', 'deaths']].sum()
+    return {
+        key: {"cases": int(row.cases), "deaths": int(row.deaths)}
+        for key, row in zip(totals.index, totals.itertuples(index=False))
+    }
+
+
+def dataset_version(dataset=None):
+    """
+    Version of a dataset (all data when dataset is None), from the catalog.
+    Changes whenever an upload writes rows, so it can key HTTP caches.
+    """
+    return catalog_version(dataset)
+
+
+def summarize(frame, sort_by='cases'):
+    """
+    Global stats and top 10 block of the dashboard from a monthly frame.
+    Monthly series are summed across years, so a multi-year range still
+    yields one Jan..Dec array per country.
+    """
+    totals = country_totals(frame)
+    total_cases = int(totals['cases'].sum()) if not totals.empty else 0
+    total_deaths = int(totals['deaths'].sum()) if not totals.empty else 0
+    countries = len(totals)
+
+    cfr = round(total_deaths / total_cases * 100, 2) if total_cases else 0
+    avg = round(total_cases / countries, 2) if countries else 0
+
+    top10 = totals.sort_values([sort_by, 'country'], ascending=[False, True]).head(10)
+    top10_countries = top10['country'].tolist()
+
+    monthly_cases = {}
+    monthly_deaths = {}
+    if top10_countries:
+        pivot = (
+            frame[frame['country'].isin(top10_countries)]
+            .groupby(['country', 'month'])[['cases', 'deaths']].sum()
+        )
+        months = pd.MultiIndex.from_product([top10_countries, range(1, 13)], names=['country', 'month'])
+        pivot = pivot.reindex(months, fill_value=0)
+        for country in top10_countries:
+            monthly_cases[country] = [int(v) for v in pivot.loc[country, 'cases']]
+            monthly_deaths[country] = [int(v) for v in pivot.loc[country, 'deaths']]
+
+    return {
+        "stats": {
+            "total_cases": total_cases,
+            "total_deaths": total_deaths,
+            "cfr_percent": cfr,
+            "avg_cases_per_country": avg,
+            "countries_affected": countries,
+        },
+        "top10": {
+            "countries": top10_countries,
+            "totals": [int(v) for v in top10[sort_by]],
+            "monthly_cases": monthly_cases,
+            "monthly_deaths": monthly_deaths,
+            "sort_by": sort_by
+        },
+    }
+
+
+def country_measures():
+    """{country key: (area_km2, population)}, stored once per CountryGeometry row"""
+    return {
+        key: (area, population)
+        for key, area, population in CountryGeometry.objects.values_list('key', 'area_km2', 'population')
+    }
+
+
+def add_rates(countries, measures=None):
+    """
+    Add density (cases per km²) and per_100k (cases per 100,000 people) to
+    totals_by_key() entries; None where area or population is unknown.
+    """
+    measures = country_measures() if measures is None else measures
+    for key, entry in countries.items():
+        area, population = measures.get(key, (None, None))
+        entry['density'] = round(entry['cases'] / area, 6) if area else None
+        entry['per_100k'] = round(entry['cases'] / population * 100000, 4) if population else None
+    return countries
+
+
+def _jenks(values, classes):
+    """
+    Fisher-Jenks natural breaks: exact minimum within-class variance by
+    dynamic programming. Every class count is one broadcast (n+1) x (n+1)
+    step over prefix sums, so the only Python loop is over classes.
+    """
+    x = np.sort(values)
+    n = len(x)
+    s1 = np.concatenate(([0.0], np.cumsum(x)))
+    s2 = np.concatenate(([0.0], np.cumsum(x * x)))
+    start = np.arange(n + 1)[:, None]
+    stop = np.arange(n + 1)[None, :]
+    count = stop - start
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Squared deviations of x[start:stop] around its mean
+        ssd = (s2[stop] - s2[start]) - (s1[stop] - s1[start]) ** 2 / count
+    ssd[count <= 0] = np.inf
+
+    cost = ssd[0]
+    choices = []
+    for _ in range(1, classes):
+        total = cost[:, None] + ssd
+        best = np.argmin(total, axis=0)
+        cost = total[best, np.arange(n + 1)]
+        choices.append(best)
+
+    cuts, stop_at = [], n
+    for best in reversed(choices):
+        stop_at = best[stop_at]
+        cuts.append(stop_at)
+    # Upper bound of every class but the last
+    return [x[cut - 1] for cut in sorted(cuts) if cut > 0]
+
+
+def class_breaks(values, method='quantile', classes=BREAK_CLASSES):
+    """
+    Class thresholds for a choropleth: a value above breaks[i] falls in a
+    class above i. values is 1-D, or 2-D for one set of breaks per row
+    (quantiles are then one nanquantile over the whole matrix). NaN values
+    are ignored; duplicate thresholds are dropped.
+    """
+    values = np.asarray(values, dtype='float64')
+    if values.shape[-1] == 0:
+        return [[] for _ in range(len(values))] if values.ndim == 2 else []
+    if method == 'jenks':
+        rows = values if values.ndim == 2 else values[None, :]
+        result = []
+        for row in rows:
+            row = row[~np.isnan(row)]
+            distinct = len(np.unique(row))
+            result.append(_jenks(row, min(classes, distinct)) if distinct > 1 else [])
+    else:
+        with np.errstate(all='ignore'), warnings.catch_warnings():
+            # All-NaN rows (years without data) give NaN breaks
+            warnings.simplefilter('ignore', RuntimeWarning)
+            cuts = np.nanquantile(values, np.linspace(0, 1, classes + 1)[1:-1], axis=-1)
+        result = cuts.T if values.ndim == 2 else [cuts]
+    breaks = [sorted({round(float(v), 6) for v in row if np.isfinite(v)}) for row in result]
+    return breaks if values.ndim == 2 else breaks[0]
+
+
+def rate_breaks(countries, method='quantile'):
+    """{field: breaks} over add_rates() entries, for every RATE_FIELDS field"""
+    return {
+        field: class_breaks(
+            [entry[field] if entry.get(field) is not None else np.nan for entry in countries.values()], method
+        )
+        for field in RATE_FIELDS
+    }
+
+
+def _encode(values, dtype):
+    """Base64 of a little-endian typed array (decoded with a JS TypedArray)"""
+    return base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode('ascii')
+
+
+def dataset_cube(dataset):
+    """
+    The whole dataset as a country x month matrix, for the map to slice
+    locally. cases/deaths are float64 (exact past int32), rows uint32, all
+    row-major: cell (c, m) is at c * months + m, month 0 being "start".
+    Countries are sorted by name; "keys" are their geometry ids, with
+    stored area/population alongside and per-year class breaks.
+    """
+    frame = dashboard_frame(dataset)
+    if frame.empty:
+        return {
+            "dataset": dataset, "start": None, "months": 0, "countries": [], "keys": [],
+            "area_km2": [], "population": [], "cases": "", "deaths": "", "rows": "", "breaks": None,
+        }
+
+    countries = sorted(frame['country'].unique())
+    country_index = pd.Index(countries).get_indexer(frame['country'])
+    month_number = frame['year'].astype(int) * 12 + frame['month'].astype(int) - 1
+    first = int(month_number.min())
+    months = int(month_number.max()) - first + 1
+    cells = country_index * months + (month_number.to_numpy() - first)
+
+    matrix = {}
+    for column in ('cases', 'deaths', 'rows'):
+        values = np.zeros(len(countries) * months, dtype='float64')
+        np.add.at(values, cells, frame[column].to_numpy(dtype='float64'))
+        matrix[column] = values
+
+    keys = [str(c).strip().lower() for c in countries]
+    measures = country_measures()
+    area = np.array([measures.get(key, (None, None))[0] or np.nan for key in keys], dtype='float64')
+    population = np.array([measures.get(key, (None, None))[1] or np.nan for key in keys], dtype='float64')
+
+    return {
+        "dataset": dataset,
+        "start": f"{first // 12:04d}-{first % 12 + 1:02d}",
+        "months": months,
+        "countries": countries,
+        "keys": keys,
+        "area_km2": [None if np.isnan(v) else round(float(v), 3) for v in area],
+        "population": [None if np.isnan(v) else int(v) for v in population],
+        "cases": _encode(matrix['cases'], '<f8'),
+        "deaths": _encode(matrix['deaths'], '<f8'),
+        "rows": _encode(matrix['rows'], '<u4'),
+        "breaks": _yearly_breaks(matrix, len(countries), months, first, area, population),
+    }
+
+
+def _yearly_breaks(matrix, country_count, months, first, area, population):
+    """
+    Quantile class breaks of every calendar year in the cube, for cases,
+    density and per_100k: one reduceat for the yearly totals and one
+    nanquantile per field across all years. Countries without rows in a
+    year are left out of that year.
+    """
+    years = (first + np.arange(months)) // 12
+    year_starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+    yearly_cases = np.add.reduceat(matrix['cases'].reshape(country_count, months), year_starts, axis=1)
+    yearly_rows = np.add.reduceat(matrix['rows'].reshape(country_count, months), year_starts, axis=1)
+    cases = np.where(yearly_rows > 0, yearly_cases, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fields = {
+            'cases': cases,
+            'density': cases / area[:, None],
+            'per_100k': cases / population[:, None] * 100000,
+        }
+    breaks = {"method": "quantile", "first_year": int(years[0])}
+    # Rows of the transposed matrices are years
+    breaks.update((field, class_breaks(values.T)) for field, values in fields.items())
+    return breaks
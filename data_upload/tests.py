@@ -1,3 +1,877 @@
-from django.test import TestCase
+import io
+import os
+import uuid
+import shutil
+import tempfile
+import json
+import asyncio
+import base64
+import importlib
+from itertools import combinations
+from datetime import date
+from types import SimpleNamespace
+from unittest import mock
+from django.core.cache import caches
+from django.contrib.gis.geos import MultiPolygon, Point, Polygon
+from django.db import connection
+import numpy as np
+import pandas as pd
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone
+from .ingest import DEFAULT_DATE, LOAD_COLUMNS, IngestError, clean_chunk, ingest_csv, merge_rows
+from .analytics import SERIAL_INTERVAL_DAYS, _metrics
+from .chunked import UploadError, finalize_upload, init_upload, upload_status, write_chunk
+from .jobs import run_job, take_upload
+from .response_cache import CACHE_ALIAS, cached_body
+from .models import AdminArea, CountryGeometry, DatasetCatalog, DiscussionMessage, DiseaseData, DiseasePoint, IngestJob
+from .spatial import hotspot_bbox, hotspot_cell_size, hotspot_cells, ingest_points
+from .sniff import SNIFF_BYTES, sniff_csv
+from .stats import _jenks, class_breaks, dataset_cube
+from .views import MessageFeed, StatsView, TileView, _messages_since, _not_modified, _thread_page
 
-# Create your tests here.
+dedupe_migration = importlib.import_module('data_upload.migrations.0013_diseasedata_unique_disease_day')
+
+
+class MergeRowsTests(TestCase):
+    """merge_rows() against a staged source, per upload mode"""
+
+    def merge(self, rows, mode):
+        with connection.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS merge_source")
+            cur.execute("""
+                CREATE TEMPORARY TABLE merge_source (
+                    dataset_type varchar(50), date date, country varchar(100),
+                    cases integer, deaths integer, country_geom_id bigint
+                )
+            """)
+            for row in rows:
+                cur.execute("INSERT INTO merge_source VALUES (%s, %s, %s, %s, %s, NULL)", row)
+            return merge_rows(cur, f"SELECT {', '.join(LOAD_COLUMNS)} FROM merge_source", mode)
+
+    def stored(self, dataset='ebola'):
+        return {
+            (row['date'].isoformat(), row['country']): (row['cases'], row['deaths'])
+            for row in DiseaseData.objects.filter(dataset_type=dataset).values('date', 'country', 'cases', 'deaths')
+        }
+
+    def test_append_inserts_new_days_and_keeps_existing(self):
+        self.assertEqual(self.merge([
+            ('ebola', '2024-01-01', 'Guinea', 5, 1),
+            ('ebola', '2024-01-02', 'Guinea', 6, 0),
+        ], 'append'), (2, 0))
+
+        inserted, updated = self.merge([
+            ('ebola', '2024-01-02', 'Guinea', 60, 9),
+            ('ebola', '2024-01-03', 'Guinea', 7, 2),
+        ], 'append')
+
+        self.assertEqual((inserted, updated), (1, 0))
+        self.assertEqual(self.stored(), {
+            ('2024-01-01', 'Guinea'): (5, 1),
+            ('2024-01-02', 'Guinea'): (6, 0),
+            ('2024-01-03', 'Guinea'): (7, 2),
+        })
+
+    def test_repeated_days_of_one_upload_are_summed(self):
+        inserted, updated = self.merge([
+            ('ebola', '2024-01-01', 'Guinea', 5, 1),
+            ('ebola', '2024-01-01', 'Guinea', 3, None),
+            ('ebola', '2024-01-01', 'Liberia', None, None),
+        ], 'append')
+
+        self.assertEqual((inserted, updated), (2, 0))
+        self.assertEqual(self.stored(), {
+            ('2024-01-01', 'Guinea'): (8, 1),
+            ('2024-01-01', 'Liberia'): (None, None),
+        })
+
+    def test_upsert_updates_only_changed_days(self):
+        self.merge([
+            ('ebola', '2024-01-01', 'Guinea', 5, 1),
+            ('ebola', '2024-01-02', 'Guinea', 6, None),
+        ], 'append')
+
+        inserted, updated = self.merge([
+            ('ebola', '2024-01-01', 'Guinea', 7, 1),
+            ('ebola', '2024-01-02', 'Guinea', 6, None),
+            ('ebola', '2024-01-03', 'Guinea', 1, 0),
+        ], 'upsert')
+
+        self.assertEqual((inserted, updated), (1, 1))
+        self.assertEqual(self.stored(), {
+            ('2024-01-01', 'Guinea'): (7, 1),
+            ('2024-01-02', 'Guinea'): (6, None),
+            ('2024-01-03', 'Guinea'): (1, 0),
+        })
+
+    def test_upsert_of_identical_values_is_a_no_op(self):
+        rows = [('ebola', '2024-01-01', 'Guinea', 5, None)]
+        self.merge(rows, 'append')
+        row_id, = DiseaseData.objects.values_list('id', flat=True)
+        with connection.cursor() as cur:
+            cur.execute(f"SELECT ctid::text FROM {DiseaseData._meta.db_table} WHERE id = %s", [row_id])
+            version = cur.fetchone()[0]
+
+        self.assertEqual(self.merge(rows, 'upsert'), (0, 0))
+        with connection.cursor() as cur:
+            cur.execute(f"SELECT ctid::text FROM {DiseaseData._meta.db_table} WHERE id = %s", [row_id])
+            # IS DISTINCT FROM skipped the UPDATE: the row was not rewritten
+            self.assertEqual(cur.fetchone()[0], version)
+
+    def test_other_datasets_are_untouched(self):
+        self.merge([('cholera', '2024-01-01', 'Guinea', 2, 0)], 'append')
+        self.assertEqual(self.merge([('ebola', '2024-01-01', 'Guinea', 5, 1)], 'upsert'), (1, 0))
+        self.assertEqual(self.stored('cholera'), {('2024-01-01', 'Guinea'): (2, 0)})
+
+
+@mock.patch('data_upload.ingest.resolve_countries', return_value={})
+class IngestModeTests(TestCase):
+    """ingest_csv() modes end to end, through the COPY loader"""
+
+    def setUp(self):
+        DiseaseData.objects.bulk_create([
+            DiseaseData(dataset_type='ebola', date=date(2024, 1, 1), country='Guinea', cases=5, deaths=1),
+            DiseaseData(dataset_type='ebola', date=date(2024, 1, 2), country='Guinea', cases=6, deaths=0),
+            DiseaseData(dataset_type='cholera', date=date(2024, 1, 1), country='Guinea', cases=2, deaths=0),
+        ])
+
+    def ingest(self, text, mode):
+        return ingest_csv(io.StringIO(text), 'ebola', mode=mode)
+
+    def test_replace_drops_days_missing_from_the_file(self, _resolve):
+        result = self.ingest("country,date,cases,deaths\nGuinea,2024-01-02,9,1\nGuinea,2024-01-02,1,0\n", 'replace')
+
+        self.assertEqual((result['imported'], result['updated']), (1, 0))
+        self.assertEqual(
+            list(DiseaseData.objects.filter(dataset_type='ebola').values_list('date', 'cases', 'deaths')),
+            [(date(2024, 1, 2), 10, 1)]
+        )
+        self.assertEqual(DiseaseData.objects.filter(dataset_type='cholera').count(), 1)
+
+    def test_append_and_upsert_counts(self, _resolve):
+        text = "country,date,cases,deaths\nGuinea,2024-01-02,8,0\nGuinea,2024-01-03,1,0\n"
+
+        result = self.ingest(text, 'append')
+        self.assertEqual((result['imported'], result['updated']), (1, 0))
+        self.assertEqual(DiseaseData.objects.get(dataset_type='ebola', date=date(2024, 1, 2)).cases, 6)
+
+        result = self.ingest(text, 'upsert')
+        self.assertEqual((result['imported'], result['updated']), (0, 1))
+        self.assertEqual(DiseaseData.objects.get(dataset_type='ebola', date=date(2024, 1, 2)).cases, 8)
+
+
+def box(west, south, east, north):
+    return MultiPolygon(Polygon.from_bbox((west, south, east, north)), srid=4326)
+
+
+@mock.patch('data_upload.spatial.resolve_countries', return_value={})
+class PointIngestTests(TestCase):
+    """ingest_points(): admin area assignment and derived country rows"""
+
+    def setUp(self):
+        guinea = AdminArea.objects.create(level=0, code='GIN', name='Guinea', key='guinea', geom=box(-15, 7, -7, 13))
+        self.conakry = AdminArea.objects.create(
+            level=1, code='GIN.1', name='Conakry', key='conakry', parent=guinea, geom=box(-14, 9, -13, 10)
+        )
+
+    def ingest(self, text, dataset='ebola-points', mode='append'):
+        return ingest_points(io.StringIO(text), dataset, mode=mode)
+
+    def test_point_inside_an_area(self, _resolve):
+        result = self.ingest("date,lat,lon,cases,deaths\n2024-01-01,9.5,-13.5,4,1\n2024-01-01,8.0,-10.0,2,0\n")
+
+        self.assertEqual((result['imported'], result['unassigned'], result['no_country']), (2, 0, 0))
+        # The deepest containing area wins
+        self.assertEqual(DiseasePoint.objects.filter(admin_area=self.conakry).count(), 1)
+        row = DiseaseData.objects.get(dataset_type='ebola-points')
+        self.assertEqual((row.date, row.country, row.cases, row.deaths), (date(2024, 1, 1), 'Guinea', 6, 1))
+
+    def test_point_outside_every_area(self, _resolve):
+        result = self.ingest("date,lat,lon,cases,deaths\n2024-01-01,0.5,0.5,3,0\n")
+
+        self.assertEqual((result['imported'], result['unassigned'], result['country_rows']), (1, 1, 0))
+        self.assertIsNone(DiseasePoint.objects.get(dataset_type='ebola-points').admin_area_id)
+        self.assertFalse(DiseaseData.objects.filter(dataset_type='ebola-points').exists())
+
+    def test_refuses_mixing_with_country_rows(self, _resolve):
+        DiseaseData.objects.create(dataset_type='ebola', date=date(2024, 1, 1), country='Guinea', cases=5, deaths=1)
+        text = "date,lat,lon,cases,deaths\n2024-01-01,9.5,-13.5,4,1\n"
+
+        with self.assertRaises(IngestError):
+            self.ingest(text, dataset='ebola')
+        self.assertFalse(DiseasePoint.objects.exists())
+
+        # ...and the other way round
+        self.ingest(text)
+        with mock.patch('data_upload.ingest.resolve_countries', return_value={}), self.assertRaises(IngestError):
+            ingest_csv(io.StringIO("country,date,cases,deaths\nGuinea,2024-01-02,1,0\n"), 'ebola-points')
+
+        # replace starts over
+        result = self.ingest(text, dataset='ebola', mode='replace')
+        self.assertEqual(result['imported'], 1)
+        self.assertEqual(DiseaseData.objects.get(dataset_type='ebola').cases, 4)
+
+
+class HotspotTests(TestCase):
+    """hotspot_cells() grid and DBSCAN aggregation, limited to a bbox"""
+
+    ZOOM = 6  # 1.40625 degree cells
+
+    def setUp(self):
+        # Five reports around (0, 0), one far away at (20, 20)
+        spots = [(0.1, 0.1), (0.2, 0.2), (0.3, 0.1), (0.2, 0.3), (0.1, 0.2), (20.0, 20.0)]
+        DiseasePoint.objects.bulk_create([
+            DiseasePoint(dataset_type='ebola-points', date=date(2024, 1, 1), location=Point(lon, lat, srid=4326),
+                         cases=i + 1, deaths=0)
+            for i, (lon, lat) in enumerate(spots)
+        ])
+
+    def test_grid(self):
+        result = hotspot_cells('ebola-points', self.ZOOM)
+        self.assertEqual((result['count'], result['truncated']), (2, False))
+        # Most cases first
+        self.assertEqual((result['cells']['cases'], result['cells']['points']), ([15, 6], [5, 1]))
+        self.assertEqual((result['cells']['lon'][0], result['cells']['lat'][0]), (0, 0))
+
+    def test_dbscan_drops_noise(self):
+        result = hotspot_cells('ebola-points', self.ZOOM, method='dbscan')
+        self.assertEqual(result['count'], 1)
+        cells = result['cells']
+        self.assertEqual((cells['cases'], cells['points']), ([15], [5]))
+        self.assertEqual((cells['lon'][0], cells['lat'][0]), (0.18, 0.18))
+        self.assertEqual(cells['extent'], [0.2])
+
+    def test_bbox_limits_both_methods(self):
+        bbox = hotspot_bbox((15, 15, 25, 25), self.ZOOM)
+        for method in ('grid', 'dbscan'):
+            result = hotspot_cells('ebola-points', self.ZOOM, method=method, bbox=bbox)
+            # The lone far point is a grid cell but DBSCAN noise
+            self.assertEqual(result['count'], 1 if method == 'grid' else 0)
+        result = hotspot_cells('ebola-points', self.ZOOM, bbox=hotspot_bbox((-1, -1, 1, 1), self.ZOOM))
+        self.assertEqual(result['cells']['cases'], [15])
+
+    def test_bbox_is_widened_to_whole_cells(self):
+        size = hotspot_cell_size(self.ZOOM)
+        self.assertEqual(hotspot_bbox((0.1, 0.1, 0.2, 0.2), self.ZOOM), (-size / 2, -size / 2, size / 2, size / 2))
+        self.assertEqual(hotspot_bbox((-200, -100, 200, 100), self.ZOOM), (-180.0, -90.0, 180.0, 90.0))
+        with self.assertRaises(ValueError):
+            hotspot_bbox((10, 0, 5, 1), self.ZOOM)
+
+    def test_cell_cap(self):
+        with mock.patch('data_upload.spatial.HOTSPOT_MAX_CELLS', 1):
+            result = hotspot_cells('ebola-points', self.ZOOM)
+        self.assertEqual((result['count'], result['truncated'], result['cells']['cases']), (1, True, [15]))
+
+
+@mock.patch('data_upload.jobs.connection')
+@mock.patch('data_upload.jobs.close_old_connections')
+@mock.patch('data_upload.jobs.ProgressReporter')
+class RunJobTests(TestCase):
+    """run_job() ingests a job only for the caller that claimed it"""
+
+    RESULT = {'total_rows': 1, 'imported': 1, 'skipped': 0, 'elapsed_seconds': 0}
+
+    def setUp(self):
+        self.job = IngestJob.objects.create(dataset_type='ebola', file_name='a.csv', file_path='/nonexistent/a.csv')
+
+    def run_job(self, **kwargs):
+        with mock.patch('data_upload.jobs.open', mock.mock_open(read_data=b''), create=True), \
+                mock.patch('data_upload.jobs.ingest_csv', return_value=self.RESULT) as ingest:
+            run_job(self.job.id, **kwargs)
+        return ingest.call_count
+
+    def test_queued_job_runs_once(self, *_mocks):
+        self.assertEqual(self.run_job(), 1)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'done')
+        # A second submission (recover_jobs, another process) loses the claim
+        self.assertEqual(self.run_job(), 0)
+
+    def test_running_job_needs_the_claim(self, *_mocks):
+        IngestJob.objects.filter(id=self.job.id).update(status='running')
+        self.assertEqual(self.run_job(), 0)
+        # claim_next_job() already moved it to running for the worker
+        self.assertEqual(self.run_job(claimed=True), 1)
+
+
+@mock.patch('data_upload.ingest.resolve_countries', return_value={})
+class CatalogVersionTests(TestCase):
+    """The catalog version keys every cache: it moves only when rows change"""
+
+    TEXT = "country,date,cases,deaths\nGuinea,2024-01-01,5,1\nLiberia,2024-01-01,2,0\n"
+
+    def ingest(self, text, mode='upsert'):
+        ingest_csv(io.StringIO(text), 'ebola', mode=mode)
+        return DatasetCatalog.objects.get(name='ebola')
+
+    def test_version_moves_with_the_rows(self, _resolve):
+        entry = self.ingest(self.TEXT, 'append')
+        self.assertEqual((entry.row_count, entry.country_count), (2, 2))
+        version, updated_at = entry.version, entry.updated_at
+
+        # Same rows again: nothing inserted or updated, caches stay valid
+        entry = self.ingest(self.TEXT)
+        self.assertEqual((entry.version, entry.updated_at), (version, updated_at))
+        entry = self.ingest(self.TEXT, 'append')
+        self.assertEqual(entry.version, version)
+
+        entry = self.ingest(self.TEXT.replace(',5,1', ',6,1'))
+        self.assertNotEqual(entry.version, version)
+        self.assertEqual(entry.row_count, 2)
+
+        version = entry.version
+        entry = self.ingest("country,date,cases,deaths\nGuinea,2024-01-02,1,0\n")
+        self.assertNotEqual(entry.version, version)
+        self.assertEqual((entry.row_count, entry.last_date), (3, date(2024, 1, 2)))
+
+    def test_replace_always_moves_it(self, _resolve):
+        version = self.ingest(self.TEXT, 'append').version
+        self.assertNotEqual(self.ingest(self.TEXT, 'replace').version, version)
+
+
+class DeduplicateMigrationTests(TestCase):
+    """0013 collapses repeated dataset/country/day rows by summing them"""
+
+    def test_duplicates_are_summed_into_the_newest_row(self):
+        with connection.cursor() as cur:
+            # Rolled back with the test; lets the old duplicate rows exist again
+            cur.execute(f"ALTER TABLE {DiseaseData._meta.db_table} DROP CONSTRAINT unique_disease_day")
+        geom = CountryGeometry.objects.create(key='guinea', name='Guinea')
+        rows = DiseaseData.objects.bulk_create([
+            DiseaseData(dataset_type='ebola', date=date(2024, 1, 1), country='Guinea', cases=5, deaths=1),
+            DiseaseData(dataset_type='ebola', date=date(2024, 1, 1), country='Guinea', cases=None, deaths=2),
+            DiseaseData(dataset_type='ebola', date=date(2024, 1, 1), country='Guinea', cases=3, deaths=None,
+                        country_geom=geom),
+            DiseaseData(dataset_type='ebola', date=date(2024, 1, 2), country='Guinea', cases=4, deaths=0),
+            DiseaseData(dataset_type='cholera', date=date(2024, 1, 1), country='Guinea', cases=1, deaths=0),
+        ])
+
+        dedupe_migration.deduplicate(None, SimpleNamespace(connection=connection))
+
+        kept = DiseaseData.objects.get(dataset_type='ebola', date=date(2024, 1, 1))
+        self.assertEqual(kept.id, max(row.id for row in rows[:3]))
+        self.assertEqual((kept.cases, kept.deaths, kept.country_geom_id), (8, 3, geom.id))
+        self.assertEqual(DiseaseData.objects.filter(dataset_type='ebola').count(), 2)
+        self.assertEqual(DiseaseData.objects.get(dataset_type='cholera').cases, 1)
+
+
+class CleanChunkTests(SimpleTestCase):
+    """Vectorized cleaning of one parsed CSV chunk"""
+
+    COLUMNS = {'country': 'Country', 'date': 'Date', 'cases': 'Cases', 'deaths': 'Deaths'}
+
+    def chunk(self):
+        return pd.DataFrame({
+            'Country': [' Guinea ', 'Liberia', None, 'Sierra Leone', 'Mali'],
+            'Date': ['2024-01-05', 'March 3, 2024', '2024-02-01', 'not a date', '2024-01-07'],
+            'Cases': ['1,234', '12.7', '5', 'abc', ''],
+            'Deaths': [1, 2, 3, None, 4],
+        })
+
+    def test_rows_without_a_country_are_skipped(self):
+        frame, skipped = clean_chunk(self.chunk(), self.COLUMNS)
+        self.assertEqual(skipped, 1)
+        self.assertEqual(frame['country'].tolist(), ['Guinea', 'Liberia', 'Sierra Leone', 'Mali'])
+        self.assertEqual(frame['key'].tolist(), ['guinea', 'liberia', 'sierra leone', 'mali'])
+
+    def test_counts_drop_thousands_separators_and_truncate(self):
+        frame, _ = clean_chunk(self.chunk(), self.COLUMNS)
+        self.assertEqual(str(frame['cases'].dtype), 'Int64')
+        cases = [None if pd.isna(v) else int(v) for v in frame['cases']]
+        deaths = [None if pd.isna(v) else int(v) for v in frame['deaths']]
+        # '1,234' -> 1234, '12.7' -> 12, 'abc' and '' -> <NA>
+        self.assertEqual(cases, [1234, 12, None, None])
+        self.assertEqual(deaths, [1, 2, None, 4])
+
+    def test_mixed_date_formats(self):
+        frame, _ = clean_chunk(self.chunk(), self.COLUMNS)
+        self.assertEqual(frame['date'].tolist(), [
+            date(2024, 1, 5), date(2024, 3, 3), DEFAULT_DATE, date(2024, 1, 7),
+        ])
+
+    def test_unmapped_columns(self):
+        columns = dict(self.COLUMNS, date=None, deaths=None)
+        frame, skipped = clean_chunk(self.chunk(), columns)
+        self.assertEqual(skipped, 1)
+        self.assertTrue((frame['date'] == DEFAULT_DATE).all())
+        self.assertTrue(frame['deaths'].isna().all())
+
+
+class ClassBreaksTests(SimpleTestCase):
+    """Choropleth class thresholds (quantile and Fisher-Jenks)"""
+
+    def brute_force_jenks(self, values, classes):
+        """Lowest within-class squared deviation over every possible split"""
+        x = np.sort(values)
+        best, best_cuts = np.inf, None
+        for cuts in combinations(range(1, len(x)), classes - 1):
+            parts = np.split(x, cuts)
+            cost = sum(((part - part.mean()) ** 2).sum() for part in parts)
+            if cost < best - 1e-9:
+                best, best_cuts = cost, cuts
+        return [x[cut - 1] for cut in best_cuts]
+
+    def test_jenks_finds_natural_gaps(self):
+        self.assertEqual(_jenks(np.array([1, 2, 3, 10, 11, 12, 50, 51, 52.]), 3), [3.0, 12.0])
+
+    def test_jenks_matches_brute_force(self):
+        rng = np.random.default_rng(7)
+        for classes in (2, 3, 4):
+            values = np.round(rng.lognormal(3, 1.2, 12), 2)
+            self.assertEqual(_jenks(values, classes), self.brute_force_jenks(values, classes))
+
+    def test_quantile_breaks(self):
+        self.assertEqual(class_breaks([1, 2, 3, 4, 5], 'quantile', 4), [2.0, 3.0, 4.0])
+        # NaN is ignored, duplicate thresholds collapse
+        self.assertEqual(class_breaks([1, np.nan, 3, np.nan, 5], 'quantile', 2), [3.0])
+        self.assertEqual(class_breaks([5, 5, 5, 5], 'quantile', 4), [5.0])
+
+    def test_one_row_of_breaks_per_row_of_a_matrix(self):
+        # An all-NaN row (a year without data) has no breaks
+        self.assertEqual(class_breaks([[1, 2, 3, 4], [np.nan] * 4], 'quantile', 2), [[2.5], []])
+        self.assertEqual(
+            class_breaks([[1, 2, 3, 10, 11, 12], [5, 5, 5, 5, 5, 5]], 'jenks', 2), [[3.0], []]
+        )
+
+    def test_empty_input(self):
+        self.assertEqual(class_breaks([], 'quantile'), [])
+        self.assertEqual(class_breaks([], 'jenks'), [])
+        self.assertEqual(class_breaks(np.empty((2, 0)), 'quantile'), [[], []])
+
+
+class DatasetCubeTests(SimpleTestCase):
+    """The country x month matrix served by /api/cube/"""
+
+    FRAME = pd.DataFrame({
+        'country': ['Liberia', 'Guinea', 'Guinea', 'Liberia', 'Liberia'],
+        'year': [2023, 2023, 2024, 2024, 2024],
+        'month': [12, 11, 1, 2, 2],
+        'cases': [10, 5, 7, 2, 1],
+        'deaths': [1, 0, 1, 0, 0],
+        'rows': [2, 1, 1, 1, 1],
+    })
+    MEASURES = {'guinea': (245857.0, 13000000), 'liberia': (None, None)}
+
+    def cube(self, frame):
+        with mock.patch('data_upload.stats.dashboard_frame', return_value=frame), \
+                mock.patch('data_upload.stats.country_measures', return_value=self.MEASURES):
+            return dataset_cube('ebola')
+
+    def decode(self, payload, dtype):
+        return np.frombuffer(base64.b64decode(payload), dtype=dtype).tolist()
+
+    def test_layout(self):
+        cube = self.cube(self.FRAME)
+        self.assertEqual(cube['start'], '2023-11')
+        self.assertEqual(cube['months'], 4)
+        self.assertEqual(cube['countries'], ['Guinea', 'Liberia'])
+        self.assertEqual(cube['keys'], ['guinea', 'liberia'])
+        self.assertEqual(cube['area_km2'], [245857.0, None])
+        self.assertEqual(cube['population'], [13000000, None])
+        # Row-major country x month, repeated cells summed
+        self.assertEqual(self.decode(cube['cases'], '<f8'), [5, 0, 7, 0, 0, 10, 0, 3])
+        self.assertEqual(self.decode(cube['deaths'], '<f8'), [0, 0, 1, 0, 0, 1, 0, 0])
+        self.assertEqual(self.decode(cube['rows'], '<u4'), [1, 0, 1, 0, 0, 2, 0, 2])
+
+    def test_yearly_breaks(self):
+        breaks = self.cube(self.FRAME)['breaks']
+        self.assertEqual((breaks['method'], breaks['first_year']), ('quantile', 2023))
+        # One list per calendar year; 2023: Guinea 5, Liberia 10 / 2024: Guinea 7, Liberia 3
+        self.assertEqual(len(breaks['cases']), 2)
+        self.assertEqual(breaks['cases'][0][0], round(5 + 5 / 6, 6))
+        self.assertEqual(breaks['cases'][1][-1], round(3 + 4 * 5 / 6, 6))
+        # Only Guinea has an area and a population
+        self.assertEqual(breaks['density'], [[round(5 / 245857, 6)], [round(7 / 245857, 6)]])
+        self.assertEqual(breaks['per_100k'], [[round(5 / 13000000 * 100000, 6)], [round(7 / 13000000 * 100000, 6)]])
+
+    def test_empty_dataset(self):
+        cube = self.cube(pd.DataFrame(columns=self.FRAME.columns))
+        self.assertEqual((cube['months'], cube['countries'], cube['breaks']), (0, [], None))
+
+
+class ResponseCacheTests(SimpleTestCase):
+    """ETag revalidation and dataset-versioned cache keys of the stats endpoints"""
+
+    def setUp(self):
+        caches[CACHE_ALIAS].clear()
+        self.entries = {'ebola': {'version': 'a' * 16, 'updated_at': timezone.now()}}
+        for target in ('data_upload.views.catalog', 'data_upload.catalog.catalog'):
+            patcher = mock.patch(target, side_effect=lambda: self.entries)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('data_upload.views.stats_body', return_value=b'{}')
+        self.stats_body = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, etag=None):
+        headers = {'If-None-Match': etag} if etag else {}
+        request = RequestFactory().get('/api/stats/', {'dataset': 'ebola'}, headers=headers)
+        return StatsView.as_view()(request)
+
+    def test_not_modified_parses_the_header(self):
+        def matches(header):
+            return _not_modified(RequestFactory().get('/', headers={'If-None-Match': header}), '"abc"')
+
+        self.assertTrue(matches('"abc"'))
+        self.assertTrue(matches('"x", W/"abc" ,"y"'))
+        self.assertTrue(matches('*'))
+        self.assertFalse(matches('"abcd", "x"'))
+        self.assertFalse(matches('"ab"'))
+        self.assertFalse(_not_modified(RequestFactory().get('/'), '"abc"'))
+
+    def test_etag_revalidation(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+
+        second = self.get(etag)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], etag)
+        # Served from the cache, then revalidated without a body
+        self.assertEqual(self.get().content, b'{}')
+        self.assertEqual(self.stats_body.call_count, 1)
+
+    def test_new_version_misses_the_cache(self):
+        etag = self.get()['ETag']
+        self.entries['ebola'] = {'version': 'b' * 16, 'updated_at': timezone.now()}
+
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.stats_body.call_count, 2)
+
+    def test_dates_are_validated_and_normalized(self):
+        request = RequestFactory().get('/api/stats/', {'dataset': 'ebola', 'start_date': '01/02/2024'})
+        response = StatsView.as_view()(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content), {'error': 'start_date and end_date must be YYYY-MM-DD dates'})
+
+        request = RequestFactory().get('/api/stats/', {'dataset': 'ebola', 'start_date': ' 2024-01-01 '})
+        StatsView.as_view()(request)
+        self.assertEqual(self.stats_body.call_args.args[1], '2024-01-01')
+
+    def test_waiter_leaves_a_foreign_lock(self):
+        cache = caches[CACHE_ALIAS]
+        cache.add('k:lock', 1)
+        with mock.patch('data_upload.response_cache.LOCK_TIMEOUT', 0):
+            self.assertEqual(cached_body('k', lambda: b'body'), b'body')
+        # The process holding it deletes it when done, not the one that gave up waiting
+        self.assertEqual(cache.get('k:lock'), 1)
+        self.assertEqual(cache.get('k'), b'body')
+
+
+class DiscussionTests(TestCase):
+    """Thread pages, history paging and the since_id delta feed"""
+
+    def post(self, message, reply_to=None, dataset='general'):
+        return DiscussionMessage.objects.create(display_name='ann', message=message, dataset_type=dataset, reply_to=reply_to)
+
+    def threads(self, count, dataset='general'):
+        return [self.post(f'thread {i}', dataset=dataset) for i in range(count)]
+
+    def test_thread_page_query_count(self):
+        for thread in self.threads(3):
+            reply = self.post('reply', thread)
+            self.post('nested', reply)
+
+        with self.assertNumQueries(3):
+            threads, next_before = _thread_page('general')
+            # Replied-to messages are preloaded for the template
+            names = [reply.reply_to.display_name for thread in threads for reply in thread.thread_replies]
+        self.assertEqual(len(names), 6)
+        self.assertIsNone(next_before)
+        newest = threads[0]
+        self.assertEqual(newest.reply_count, 1)
+        self.assertEqual([reply.message for reply in newest.thread_replies], ['nested', 'reply'])
+
+        # Still constant for an older page: one more query reads the cursor
+        with self.assertNumQueries(4):
+            self.client.get('/api/messages/history/', {'dataset': 'general', 'before': newest.id})
+
+    def test_history_pages(self):
+        ids = [thread.id for thread in self.threads(5)][::-1]
+
+        page, next_before = _thread_page('general', limit=2)
+        self.assertEqual(([t.id for t in page], next_before), (ids[:2], ids[1]))
+        page, next_before = _thread_page('general', next_before, limit=2)
+        self.assertEqual(([t.id for t in page], next_before), (ids[2:4], ids[3]))
+        # Last page: fewer than limit, no cursor
+        page, next_before = _thread_page('general', next_before, limit=2)
+        self.assertEqual(([t.id for t in page], next_before), (ids[4:], None))
+
+    def test_history_last_page_of_exactly_limit(self):
+        ids = [thread.id for thread in self.threads(4)][::-1]
+        page, next_before = _thread_page('general', ids[1], limit=2)
+        self.assertEqual(([t.id for t in page], next_before), (ids[2:], None))
+
+    def test_history_of_an_empty_thread_list(self):
+        self.threads(2, dataset='other')
+        response = self.client.get('/api/messages/history/', {'dataset': 'general'})
+        payload = json.loads(response.content)
+        self.assertEqual((payload['html'].strip(), payload['next_before']), ('', None))
+
+    def test_delta_cursor(self):
+        first, second = self.threads(2)
+        self.post('elsewhere', dataset='other')
+
+        payload = json.loads(self.client.get('/api/messages/', {'since_id': 0}).content)
+        self.assertEqual([m['id'] for m in payload['messages']], [first.id, second.id])
+        self.assertEqual(payload['last_id'], second.id)
+
+        payload = json.loads(self.client.get('/api/messages/', {'since_id': first.id}).content)
+        self.assertEqual([m['id'] for m in payload['messages']], [second.id])
+
+        # Caught up: nothing new, the cursor stays put
+        payload = json.loads(self.client.get('/api/messages/', {'since_id': second.id}).content)
+        self.assertEqual((payload['messages'], payload['last_id']), ([], second.id))
+
+        # A malformed cursor starts from the beginning
+        payload = json.loads(self.client.get('/api/messages/', {'since_id': 'x'}).content)
+        self.assertEqual(len(payload['messages']), 2)
+
+    def test_delta_batches(self):
+        ids = [thread.id for thread in self.threads(3)]
+        self.assertEqual([m['id'] for m in _messages_since('general', 0, limit=2)], ids[:2])
+        self.assertEqual([m['id'] for m in _messages_since('general', ids[1], limit=2)], ids[2:])
+
+
+@mock.patch('data_upload.views.STREAM_POLL_SECONDS', 0)
+@mock.patch('data_upload.views.MESSAGE_BATCH', 2)
+@mock.patch('data_upload.views._latest_message_id', return_value=10)
+class MessageFeedTests(SimpleTestCase):
+    """One shared poller per dataset fanning messages out to every stream"""
+
+    def setUp(self):
+        self.addCleanup(MessageFeed.feeds.clear)
+
+    async def test_subscribers_share_one_poller(self, _latest):
+        batches = [[{'id': 11}, {'id': 12}], [{'id': 13}], []]
+        calls = []
+
+        def since(dataset, last_id):
+            calls.append(last_id)
+            return batches.pop(0) if batches else []
+
+        with mock.patch('data_upload.views._messages_since', side_effect=since):
+            feed, first = MessageFeed.subscribe('general')
+            same, second = MessageFeed.subscribe('general')
+            self.assertIs(feed, same)
+
+            for queue in (first, second):
+                # A full batch is followed by another query straight away
+                self.assertEqual(await asyncio.wait_for(queue.get(), 1), [{'id': 11}, {'id': 12}])
+                self.assertEqual(await asyncio.wait_for(queue.get(), 1), [{'id': 13}])
+            self.assertEqual(calls[:2], [10, 12])
+
+            feed.unsubscribe(first)
+            feed.unsubscribe(second)
+            await asyncio.wait_for(feed.task, 1)
+        # The last subscriber leaving stops the poller
+        self.assertNotIn('general', MessageFeed.feeds)
+
+    async def test_failure_closes_the_streams(self, _latest):
+        with mock.patch('data_upload.views._messages_since', side_effect=RuntimeError('db down')), \
+                self.assertLogs('data_upload.views', 'ERROR'):
+            feed, queue = MessageFeed.subscribe('general')
+            self.assertIsNone(await asyncio.wait_for(queue.get(), 1))
+            await asyncio.wait_for(feed.task, 1)
+        self.assertNotIn('general', MessageFeed.feeds)
+
+
+class SniffCsvTests(SimpleTestCase):
+    """Format detection from the head of an upload"""
+
+    def test_delimiters(self):
+        for delimiter in (';', '\t', '|', ','):
+            head = delimiter.join(['country', 'date', 'cases']) + '\n' + delimiter.join(['Guinea', '2024-01-01', '1,5']) + '\n'
+            sniffed = sniff_csv(head.encode('utf-8'))
+            self.assertEqual(sniffed['delimiter'], delimiter)
+            self.assertEqual(sniffed['columns'], ['country', 'date', 'cases'])
+
+    def test_encodings(self):
+        sniffed = sniff_csv(b'\xef\xbb\xbfcountry,cases\nC\xc3\xb4te d\xe2\x80\x99Ivoire,3\n')
+        # The BOM is not part of the first header name
+        self.assertEqual((sniffed['encoding'], sniffed['columns'][0]), ('utf-8-sig', 'country'))
+        self.assertEqual(sniffed['sample_data']['country'], ['C\u00f4te d\u2019Ivoire'])
+
+        sniffed = sniff_csv('country,cases\nC\u00f4te d\u2019Ivoire,3\n'.encode('cp1252'))
+        self.assertEqual(sniffed['encoding'], 'cp1252')
+        self.assertEqual(sniffed['sample_data']['country'], ['C\u00f4te d\u2019Ivoire'])
+
+    def test_multibyte_character_cut_at_the_end(self):
+        head = ('country,cases\n' + 'C\u00f4te,1\n' * (SNIFF_BYTES // 9)).encode('utf-8')[:SNIFF_BYTES]
+        self.assertEqual(sniff_csv(head)['encoding'], 'utf-8')
+
+    def test_sample_rows_stop_once_every_column_has_samples(self):
+        # sample_rows counts the rows read until each column had 3 values,
+        # not every row of the head
+        head = 'country,deaths\n' + 'Guinea,\n' * 4 + 'Guinea,1\n' * 10
+        sniffed = sniff_csv(head.encode('utf-8'))
+        self.assertEqual(sniffed['sample_rows'], 7)
+        self.assertEqual(sniffed['sample_data'], {'country': ['Guinea'] * 3, 'deaths': ['1'] * 3})
+
+        sniffed = sniff_csv(b'country,deaths\nGuinea,1\n')
+        self.assertEqual(sniffed['sample_rows'], 1)
+
+    def test_cut_last_line_is_ignored(self):
+        # A full head ends mid-line: '1,2' may be the start of '1,23'
+        head = ('a,b\n' + '1,\n' * ((SNIFF_BYTES - 7) // 3) + '1,2').encode('utf-8')
+        self.assertEqual(len(head), SNIFF_BYTES)
+        self.assertEqual(sniff_csv(head)['sample_data']['b'], [])
+        self.assertEqual(sniff_csv(b'a,b\n1,\n1,2')['sample_data']['b'], ['2'])
+
+    def test_empty(self):
+        with self.assertRaises(ValueError):
+            sniff_csv(b'\n')
+
+
+@mock.patch('data_upload.chunked.CHUNK_SIZE', 4)
+@mock.patch('data_upload.chunked.purge_stale_uploads')
+class ChunkedUploadTests(SimpleTestCase):
+    """Resumable uploads: chunks in any order, re-sent or missing"""
+
+    BODY = b'country,cases\nGuinea,1\n'  # 23 bytes: 5 chunks of 4, then 3
+
+    def setUp(self):
+        upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, upload_dir, ignore_errors=True)
+        for target in ('data_upload.chunked.UPLOAD_DIR', 'data_upload.jobs.UPLOAD_DIR'):
+            patcher = mock.patch(target, upload_dir)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def send(self, upload_id, index, data=None):
+        data = self.BODY[index * 4:(index + 1) * 4] if data is None else data
+        return write_chunk(upload_id, index, io.BytesIO(data), len(data))
+
+    def test_reassembly_out_of_order_with_duplicates(self, _purge):
+        session = init_upload('a.csv', len(self.BODY))
+        upload_id = session['upload_id']
+        self.assertEqual(session['chunks'], 6)
+
+        for index in (5, 2, 0, 2, 4):
+            status = self.send(upload_id, index)
+        self.assertEqual((status['received'], status['missing']), (4, [1, 3]))
+        with self.assertRaises(UploadError):
+            finalize_upload(upload_id)
+
+        self.send(upload_id, 3)
+        self.send(upload_id, 1)
+        result = finalize_upload(upload_id)
+        self.assertEqual((result['columns'], result['upload_token']), (['country', 'cases'], upload_id))
+
+        path, meta = take_upload(upload_id)
+        with open(path, 'rb') as fh:
+            self.assertEqual(fh.read(), self.BODY)
+        self.assertEqual(meta['options'], {'delimiter': ',', 'encoding': 'utf-8'})
+        # The session is gone once finalized
+        with self.assertRaises(UploadError):
+            upload_status(upload_id)
+
+    def test_short_last_chunk(self, _purge):
+        upload_id = init_upload('a.csv', len(self.BODY))['upload_id']
+        with self.assertRaises(UploadError):
+            self.send(upload_id, 5, b'1\n\n\n')
+        self.assertEqual(self.send(upload_id, 5)['received'], 1)
+
+    def test_size_mismatch_is_rejected(self, _purge):
+        upload_id = init_upload('a.csv', len(self.BODY))['upload_id']
+        with self.assertRaises(UploadError):
+            self.send(upload_id, 0, b'country')
+        # Declared length right, body short: nothing is counted
+        with self.assertRaises(UploadError):
+            write_chunk(upload_id, 1, io.BytesIO(b'ry'), 4)
+        with self.assertRaises(UploadError):
+            self.send(upload_id, 6, b'xxxx')
+        self.assertEqual(upload_status(upload_id)['received'], 0)
+
+    def test_bad_sessions(self, _purge):
+        with self.assertRaises(UploadError):
+            init_upload('a.csv', 0)
+        with self.assertRaises(UploadError):
+            upload_status('../etc')
+        with self.assertRaises(UploadError):
+            upload_status(uuid.uuid4().hex)
+
+
+class TileViewTests(SimpleTestCase):
+    """/tiles/<dataset>/<z>/<x>/<y>.pbf status codes"""
+
+    def setUp(self):
+        entries = {'ebola': {'version': 'a' * 16, 'updated_at': timezone.now()}}
+        for target in ('data_upload.views.catalog', 'data_upload.catalog.catalog'):
+            patcher = mock.patch(target, return_value=entries)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get(self, z, x, y, body=b''):
+        request = RequestFactory().get('/tiles/ebola/%d/%d/%d.pbf' % (z, x, y))
+        with mock.patch('data_upload.views.country_tile', return_value=body) as tile:
+            return TileView.as_view()(request, dataset='ebola', z=z, x=x, y=y), tile
+
+    def test_tile(self):
+        response, tile = self.get(3, 4, 2, b'\x1a\x02')
+        self.assertEqual((response.status_code, response.content), (200, b'\x1a\x02'))
+        self.assertEqual(response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        tile.assert_called_once_with('ebola', 3, 4, 2, None, None)
+
+    def test_empty_tile_is_204(self):
+        response, _tile = self.get(3, 0, 0)
+        self.assertEqual((response.status_code, response.content), (204, b''))
+        # Still revalidatable like any other tile
+        self.assertIn('ETag', response)
+
+    def test_malformed_dates(self):
+        for query in ({'start_date': '2024-13-01'}, {'end_date': "2024'; --"}):
+            request = RequestFactory().get('/tiles/ebola/3/4/2.pbf', query)
+            with mock.patch('data_upload.views.country_tile') as tile:
+                response = TileView.as_view()(request, dataset='ebola', z=3, x=4, y=2)
+            self.assertEqual(response.status_code, 400)
+            tile.assert_not_called()
+
+    def test_out_of_range(self):
+        for z, x, y in ((13, 0, 0), (2, 4, 0), (2, 0, 4), (-1, 0, 0)):
+            response, tile = self.get(z, x, y)
+            self.assertEqual(response.status_code, 404)
+            tile.assert_not_called()
+
+
+class AnalyticsMetricsTests(SimpleTestCase):
+    """Growth rate, doubling time, Rt and CFR from _metrics()"""
+
+    def series(self, rate, periods=30, freq='D'):
+        index = pd.date_range('2024-01-01', periods=periods, freq=freq)
+        return pd.Series(100 * np.exp(rate * np.arange(periods)), index=index)
+
+    def test_constant_exponential_growth(self):
+        rate = 0.1
+        cases = self.series(rate)
+        metrics = _metrics(cases, cases * 0.02, 'daily')
+
+        # Needs two full 7-day windows
+        growth = metrics['growth_rate']
+        self.assertTrue(growth.iloc[:13].isna().all())
+        np.testing.assert_allclose(growth.iloc[13:], rate)
+        np.testing.assert_allclose(metrics['doubling_time'].iloc[13:], np.log(2) / rate)
+        np.testing.assert_allclose(metrics['rt'].iloc[13:], np.exp(rate * SERIAL_INTERVAL_DAYS))
+        np.testing.assert_allclose(metrics['cfr'].iloc[6:], 2.0)
+
+    def test_weekly_rt_uses_days(self):
+        rate = 0.35
+        metrics = _metrics(self.series(rate, 12, 'W-MON'), self.series(rate, 12, 'W-MON'), 'weekly')
+        np.testing.assert_allclose(metrics['growth_rate'].iloc[7:], rate)
+        np.testing.assert_allclose(metrics['rt'].iloc[7:], np.exp(rate / 7 * SERIAL_INTERVAL_DAYS))
+
+    def test_decline_has_no_doubling_time(self):
+        frame = pd.DataFrame({'Guinea': self.series(-0.1), 'Liberia': self.series(0.05)})
+        metrics = _metrics(frame, frame * 0, 'daily')
+        np.testing.assert_allclose(metrics['growth_rate']['Guinea'].iloc[13:], -0.1)
+        self.assertTrue(metrics['doubling_time']['Guinea'].isna().all())
+        np.testing.assert_allclose(metrics['doubling_time']['Liberia'].iloc[13:], np.log(2) / 0.05)
+
+    def test_no_cases(self):
+        zeros = self.series(0) * 0
+        metrics = _metrics(zeros, zeros, 'daily')
+        # 0/0 growth and CFR stay missing rather than inf
+        self.assertTrue(metrics['growth_rate'].isna().all())
+        self.assertTrue(metrics['cfr'].isna().all())
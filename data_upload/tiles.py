@@ -0,0 +1,94 @@
+import logging
+from django.db import connection
+from .geometry import tolerance_for_zoom
+from .response_cache import cached_body, response_key
+from .stats import dashboard_frame, dataset_version, totals_by_key
+
+logger = logging.getLogger(__name__)
+
+# Mapbox Vector Tile parameters: tile coordinate space and the margin kept
+# around it so polygon edges don't show seams between tiles
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+# Outlines are stored simplified to ~1km, deeper zooms add nothing
+MAX_ZOOM = 12
+LAYER_NAME = 'countries'
+# Web Mercator stops short of the poles; Antarctica is clipped to this
+# latitude before ST_Transform(..., 3857), which cannot project +-90
+MERCATOR_MAX_LAT = 85.0511287798
+
+
+def tile_in_range(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def _country_totals(dataset, start, end):
+    """{country key: {"cases", "deaths"}} for the range, shared by every tile of it"""
+    key = response_key('tile-totals', dataset_version(dataset), dataset=dataset or '', start=start or '', end=end or '')
+    return cached_body(key, lambda: totals_by_key(dashboard_frame(dataset, start, end)))
+
+
+def _render_tile(dataset, z, x, y, start, end):
+    """
+    One MVT tile: stored country outlines clipped to the tile, simplified
+    for the zoom level, with the range's cases/deaths and the country id
+    (normalized key, as in /api/stats/) as properties.
+    """
+    totals = _country_totals(dataset, start, end)
+    if not totals:
+        return b''
+    keys = sorted(totals)
+    with connection.cursor() as cur:
+        cur.execute(
+            f"""
+            WITH bounds AS (
+                SELECT ST_TileEnvelope(%s, %s, %s) AS env,
+                       ST_Transform(ST_TileEnvelope(%s, %s, %s, margin => %s), 4326) AS env_4326
+            ),
+            totals AS (
+                SELECT * FROM unnest(%s::text[], %s::bigint[], %s::bigint[]) AS t(key, cases, deaths)
+            ),
+            clipped AS (
+                SELECT g.key, g.name, t.cases, t.deaths,
+                       CASE WHEN ST_YMin(g.geom) < -{MERCATOR_MAX_LAT} OR ST_YMax(g.geom) > {MERCATOR_MAX_LAT}
+                            THEN ST_Intersection(g.geom, ST_MakeEnvelope(-180, -{MERCATOR_MAX_LAT}, 180, {MERCATOR_MAX_LAT}, 4326))
+                            ELSE g.geom END AS geom
+                FROM data_upload_countrygeometry g
+                JOIN totals t ON t.key = g.key
+                CROSS JOIN bounds
+                WHERE g.geom IS NOT NULL AND g.geom && bounds.env_4326
+            ),
+            features AS (
+                SELECT c.key AS id, c.name AS country, c.cases, c.deaths,
+                       ST_AsMVTGeom(
+                           ST_Transform(ST_SimplifyPreserveTopology(c.geom, %s), 3857),
+                           bounds.env, {TILE_EXTENT}, {TILE_BUFFER}, true
+                       ) AS geom
+                FROM clipped c
+                CROSS JOIN bounds
+                WHERE NOT ST_IsEmpty(c.geom)
+            )
+            SELECT ST_AsMVT(features, %s, {TILE_EXTENT}, 'geom')
+            FROM features WHERE geom IS NOT NULL
+            """,
+            [
+                z, x, y, z, x, y, TILE_BUFFER / TILE_EXTENT,
+                keys, [totals[k]['cases'] for k in keys], [totals[k]['deaths'] for k in keys],
+                tolerance_for_zoom(z), LAYER_NAME,
+            ]
+        )
+        row = cur.fetchone()
+    return bytes(row[0]) if row and row[0] else b''
+
+
+def tile_key(dataset, z, x, y, start=None, end=None):
+    """Cache key of a tile: dataset version, range and tile address"""
+    return response_key(
+        'tile', dataset_version(dataset),
+        dataset=dataset or '', start=start or '', end=end or '', z=z, x=x, y=y
+    )
+
+
+def country_tile(dataset, z, x, y, start=None, end=None):
+    """Encoded tile bytes (empty when nothing is in view), cached per tile_key()"""
+    return cached_body(tile_key(dataset, z, x, y, start, end), lambda: _render_tile(dataset, z, x, y, start, end))
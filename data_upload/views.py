@@ -1,165 +1,510 @@
+import os
+import math
 import time
+import asyncio
 import json
+import uuid
 import logging
+from datetime import date
 from django.urls import reverse
 import pandas as pd
 from django.views import View
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from asgiref.sync import sync_to_async
 from django.db import connection
 from django.shortcuts import render, redirect
-from django.contrib.gis.geos import GEOSGeometry, MultiPolygon
-from django.db.models import Q, Sum, Count, FloatField
+from django.template.loader import render_to_string
+from django.db.models import Q, Sum, Count, FloatField, Max
 from django.db.models.functions import ExtractYear, Coalesce, ExtractMonth
 from django.views.decorators.csrf import csrf_exempt
-from .models import DiseaseData, DiscussionMessage
+from .models import DiscussionMessage, DiseasePoint, IngestJob
+from .geometry import country_geojson, country_key, snap_tolerance, tolerance_for_zoom
+from .ingest import INGEST_MODES, IngestError, ingest_csv
+from .jobs import create_job, save_upload, stage_upload, take_upload
+from .sniff import SNIFF_BYTES, sniff_csv
+from .chunked import UploadError, finalize_upload, init_upload, write_chunk, upload_status as chunked_status
+from .catalog import catalog, last_modified
+from .response_cache import cached_body, etag_for, response_key
+from .tiles import country_tile, tile_in_range, tile_key
+from .analytics import WINDOWS, analytics_payload
+from .spatial import (
+    HOTSPOT_MAX_ZOOM, HOTSPOT_METHODS, admin_rollup, hotspot_bbox, hotspot_cells, ingest_points, is_point_mapping
+)
+from .stats import (
+    BREAK_METHODS, add_rates, country_totals, dashboard_frame, dataset_countries, dataset_cube,
+    dataset_names, dataset_version, rate_breaks,
+    summarize, totals_by_key
+)
+from django.utils import timezone
+from django.utils.http import http_date
 from django.utils.crypto import get_random_string
 import re
 
 logger = logging.getLogger(__name__)
 
-class GISStatsView(View):
-    def get(self, request):
-        dataset = request.GET.get('dataset', 'ebola')
-        start = request.GET.get('start_date')
-        end = request.GET.get('end_date')
+# Discussion updates: clients poll /api/messages/ for deltas, or with
+# DISCUSSION_STREAM (ASGI server only) hold one SSE connection each
+DISCUSSION_STREAM = getattr(settings, 'DISCUSSION_STREAM', False)
+# Longest a stream stays open, and how long it may go without a message
+DISCUSSION_STREAM_SECONDS = getattr(settings, 'DISCUSSION_STREAM_SECONDS', 300)
+DISCUSSION_STREAM_IDLE_SECONDS = getattr(settings, 'DISCUSSION_STREAM_IDLE_SECONDS', 120)
+DISCUSSION_POLL_MS = getattr(settings, 'DISCUSSION_POLL_MS', 4000)
+MESSAGE_BATCH = 200
+THREADS_PER_PAGE = 50
+STREAM_POLL_SECONDS = 1.0
+STREAM_HEARTBEAT_SECONDS = 15.0
+STREAM_RETRY_MS = 2000
+
+def _dataset_param(request):
+    """
+    Requested ?dataset=, or None when it has no rows and we fall back to
+    all data, so UI can still render something.
+    """
+    return _known_dataset(request.GET.get('dataset', 'ebola'))
 
-        qs = DiseaseData.objects.filter(dataset_type=dataset)
-        # Fallback in case dataset has no rows, so UI can still render something
-        if not qs.exists():
-            logger.info(f"No rows for dataset='{dataset}', falling back to all data")
-            qs = DiseaseData.objects.all()
 
-        if start:
-            qs = qs.filter(date__gte=start)
-        if end:
-            qs = qs.filter(date__lte=end)
-
-        # Global stats
-        agg = qs.aggregate(
-            total_cases=Coalesce(Sum('cases'), 0),
-            total_deaths=Coalesce(Sum('deaths'), 0),
-            countries=Count('country', distinct=True)
+def _known_dataset(dataset):
+    """dataset when it has rows, else None (all data)"""
+    if dataset in catalog():
+        return dataset
+    logger.info(f"No rows for dataset='{dataset}', falling back to all data")
+    return None
+
+
+def _sort_param(request):
+    sort_by = (request.GET.get('sort') or 'cases').lower()
+    if sort_by not in ['cases', 'deaths']:
+        sort_by = 'cases'
+    return sort_by
+
+
+def _breaks_param(request):
+    method = (request.GET.get('breaks') or 'quantile').lower()
+    return method if method in BREAK_METHODS else 'quantile'
+
+
+def _date_param(request, name):
+    """?name=YYYY-MM-DD normalized, None when absent; ValueError when malformed"""
+    value = (request.GET.get(name) or '').strip()
+    return date.fromisoformat(value).isoformat() if value else None
+
+
+DATE_ERROR = 'start_date and end_date must be YYYY-MM-DD dates'
+
+
+def _date_range(request):
+    """(start, end) from ?start_date=&end_date=, see _date_param"""
+    return _date_param(request, 'start_date'), _date_param(request, 'end_date')
+
+
+def _bbox_param(request, zoom):
+    """?bbox=west,south,east,north widened to whole hotspot cells, None when absent; ValueError when malformed"""
+    value = (request.GET.get('bbox') or '').strip()
+    if not value:
+        return None
+    parts = [float(part) for part in value.split(',')]
+    if len(parts) != 4 or not all(math.isfinite(part) for part in parts):
+        raise ValueError(value)
+    return hotspot_bbox(parts, zoom)
+
+
+def _not_modified(request, etag):
+    """If-None-Match lists etag (weak comparison, as for GET) or is *"""
+    header = request.headers.get('If-None-Match', '')
+    tags = {tag.strip().removeprefix('W/') for tag in header.split(',')}
+    return '*' in tags or etag.removeprefix('W/') in tags
+
+
+def _cache_headers(response, etag, immutable=False, modified=None):
+    """ETag (and Last-Modified) plus either a year-long immutable lifetime or always-revalidate"""
+    response['ETag'] = etag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified.timestamp())
+    if immutable:
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def stats_cache_key(prefix, dataset, start, end, sort_by, **extra):
+    """Response cache key of a stats endpoint; moves with the dataset version"""
+    return response_key(
+        prefix, dataset_version(dataset),
+        dataset=dataset or '', start=start or '', end=end or '', sort=sort_by, **extra
+    )
+
+
+def gis_stats_body(dataset, start, end, sort_by, tolerance, breaks='quantile'):
+    """Encoded /api/gis-stats/ response: stats, top 10, class breaks and choropleth features"""
+    # One grouped pass (country, year, month), read from the rollup when it
+    # covers the range; everything else is pivoted in pandas
+    frame = dashboard_frame(dataset, start, end)
+    payload = summarize(frame, sort_by)
+    rates = add_rates(totals_by_key(frame))
+    payload["breaks"] = {"method": breaks, **rate_breaks(rates, breaks)}
+
+    # Build GeoJSON features for choropleth
+    features = []
+    try:
+        country_aggs = country_totals(frame)
+        geometries = country_geojson(
+            (country_key(c) for c in country_aggs['country']),
+            tolerance
         )
-        cfr = round(agg['total_deaths'] / agg['total_cases'] * 100, 2) if agg['total_cases'] else 0
-        avg = round(agg['total_cases'] / agg['countries'], 2) if agg['countries'] else 0
+
+        # Optional: derive year label from start date
+        year_label = None
+        if start:
+            try:
+                year_label = str(pd.to_datetime(start).year)
+            except Exception:
+                year_label = None
+
+        for item in country_aggs.itertuples(index=False):
+            geom_json = geometries.get(country_key(item.country))
+            if not geom_json:
+                # Skip countries we cannot map
+                continue
+
+            rate = rates.get(country_key(item.country), {})
+            properties = {
+                "country": item.country,
+                "year": year_label,
+                "cases": int(item.cases or 0),
+                "deaths": int(item.deaths or 0),
+                "density": rate.get("density"),
+                "per_100k": rate.get("per_100k")
+            }
+            features.append(
+                b'{"type":"Feature","geometry":' + geom_json +
+                b',"properties":' + json.dumps(properties).encode('utf-8') + b'}'
+            )
+    except Exception as e:
+        logger.error(f"Error building GeoJSON features: {e}")
+
+    return _features_body(payload, features)
+
+
+def stats_body(dataset, start, end, sort_by, breaks='quantile'):
+    """Encoded /api/stats/ response"""
+    frame = dashboard_frame(dataset, start, end)
+    payload = summarize(frame, sort_by)
+    payload["version"] = dataset_version(dataset)
+    # Density / per-capita from areas and populations stored per country
+    payload["countries"] = add_rates(totals_by_key(frame))
+    payload["breaks"] = {"method": breaks, **rate_breaks(payload["countries"], breaks)}
+    return json.dumps(payload).encode('utf-8')
+
+
+class GISStatsView(View):
+    """
+    Legacy combined endpoint. Responses are cached per dataset version,
+    range, sort and tolerance (see response_cache.py) and revalidated by ETag.
+    """
+    def get(self, request):
+        try:
+            start, end = _date_range(request)
+        except ValueError:
+            return JsonResponse({'error': DATE_ERROR}, status=400)
+        dataset = _dataset_param(request)
 
         # Top 10 countries (default by cases). Support optional sort query param
-        sort_by = (request.GET.get('sort') or 'cases').lower()
-        if sort_by not in ['cases', 'deaths']:
-            sort_by = 'cases'
-        if sort_by == 'deaths':
-            top10 = qs.values('country').annotate(total=Coalesce(Sum('deaths'), 0)).order_by('-total')[:10]
-        else:
-            top10 = qs.values('country').annotate(total=Coalesce(Sum('cases'), 0)).order_by('-total')[:10]
-        top10_countries = [item['country'] for item in top10]
-
-        # Monthly data for EACH top 10 country (cases and deaths)
-        top10_monthly_cases = {}
-        top10_monthly_deaths = {}
-        for country in top10_countries:
-            monthly = qs.filter(country=country).annotate(
-                month=ExtractMonth('date'),
-                year=ExtractYear('date')
-            ).values('month', 'year').annotate(
-                cases=Coalesce(Sum('cases'), 0), 
-                deaths=Coalesce(Sum('deaths'), 0)
-            ).order_by('year', 'month')
-
-            cases_by_month = [0] * 12
-            deaths_by_month = [0] * 12
-            for m in monthly:
-                if m['month']:
-                    idx = m['month'] - 1
-                    cases_by_month[idx] = m['cases'] or 0
-                    deaths_by_month[idx] = m['deaths'] or 0
-            top10_monthly_cases[country] = cases_by_month
-            top10_monthly_deaths[country] = deaths_by_month
-
-        # Build GeoJSON features for choropleth
+        sort_by = _sort_param(request)
+        tolerance = snap_tolerance(_request_tolerance(request))
+        breaks = _breaks_param(request)
+
+        key = stats_cache_key('gis-stats', dataset, start, end, sort_by, tolerance=tolerance, breaks=breaks)
+        etag = etag_for(key)
+        modified = last_modified(dataset)
+        if _not_modified(request, etag):
+            return _cache_headers(HttpResponseNotModified(), etag, modified=modified)
+
+        body = cached_body(key, lambda: gis_stats_body(dataset, start, end, sort_by, tolerance, breaks))
+        return _cache_headers(HttpResponse(body, content_type='application/json'), etag, modified=modified)
+
+
+def _request_tolerance(request, default=0.02):
+    """Simplification tolerance from ?tolerance= or ?zoom= (Leaflet zoom level)"""
+    try:
+        if request.GET.get('tolerance'):
+            return float(request.GET['tolerance'])
+        if request.GET.get('zoom'):
+            return tolerance_for_zoom(float(request.GET['zoom']))
+    except ValueError:
+        pass
+    return default
+
+
+def _features_body(payload, features):
+    """
+    JSON bytes with a "features" list appended after the payload keys.
+    Features are already-encoded bytes (cached geometry spliced in as-is),
+    so the big polygons are never parsed or re-dumped per request.
+    """
+    head = json.dumps(payload).encode('utf-8')[:-1]
+    if payload:
+        head += b','
+    return head + b'"features":[' + b','.join(features) + b']}'
+
+
+def _features_response(payload, features):
+    return HttpResponse(_features_body(payload, features), content_type='application/json')
+
+class GeometryView(View):
+    """
+    Country outlines for a dataset, no numbers. Features carry the country
+    id (normalized key) that StatsView uses, and the client joins the two.
+    Geometry only changes with the dataset, so a request carrying the
+    current ?v=<version> may be cached by the browser forever.
+    """
+    def get(self, request):
+        dataset = _dataset_param(request)
+        tolerance = snap_tolerance(_request_tolerance(request))
+        version = dataset_version(dataset)
+
+        etag = f'"geom-{version}-{tolerance}"'
+        immutable = request.GET.get('v') == version
+        modified = last_modified(dataset)
+        if _not_modified(request, etag):
+            return _cache_headers(HttpResponseNotModified(), etag, immutable, modified)
+
+        names = {}
+        for country in dataset_countries(dataset):
+            names.setdefault(country_key(country), country)
+        geometries = country_geojson(names, tolerance)
+
         features = []
-        try:
-            country_aggs = list(
-                qs.values('country')
-                  .annotate(total_cases=Coalesce(Sum('cases'), 0), total_deaths=Coalesce(Sum('deaths'), 0))
-                  .order_by('country')
+        for key, geom_json in sorted(geometries.items()):
+            properties = {"id": key, "country": names[key]}
+            features.append(
+                b'{"type":"Feature","geometry":' + geom_json +
+                b',"properties":' + json.dumps(properties).encode('utf-8') + b'}'
             )
-            for item in country_aggs:
-                country = item['country']
-                geom_json = None
-
-                # Prefer geometry stored in DiseaseData
-                row = qs.filter(country=country).exclude(geom__isnull=True).first()
-                if row and row.geom and not row.geom.empty:
-                    try:
-                        geom_json = json.loads(row.geom.geojson)
-                    except Exception as ge:
-                        logger.warning(f"Stored geom -> GeoJSON conversion failed for {country}: {ge}")
-                        geom_json = None
-
-                # Fallback: fetch from reference table world_countries if not present in DiseaseData
-                if not geom_json:
-                    key = (country or '').strip().lower()
-                    if key:
-                        try:
-                            with connection.cursor() as cur:
-                                cur.execute(
-                                    """
-                                    SELECT ST_AsGeoJSON(ST_SimplifyPreserveTopology(geom, 0.02))
-                                    FROM world_countries
-                                    WHERE lower(name) = %s OR lower(name_en) = %s OR lower(adm0_a3) = %s
-                                    LIMIT 1
-                                    """,
-                                    [key, key, key]
-                                )
-                                rowg = cur.fetchone()
-                                if rowg and rowg[0]:
-                                    geom_json = json.loads(rowg[0])
-                        except Exception as fe:
-                            logger.debug(f"Fallback geometry fetch failed for '{country}': {fe}")
-
-                if not geom_json:
-                    # Skip countries we cannot map
-                    continue
 
-                # Optional: derive year label from start date
-                year_label = None
-                if start:
-                    try:
-                        year_label = str(pd.to_datetime(start).year)
-                    except Exception:
-                        year_label = None
-
-                features.append({
-                    "type": "Feature",
-                    "geometry": geom_json,
-                    "properties": {
-                        "country": country,
-                        "year": year_label,
-                        "cases": int(item['total_cases'] or 0),
-                        "deaths": int(item['total_deaths'] or 0)
-                    }
-                })
-        except Exception as e:
-            logger.error(f"Error building GeoJSON features: {e}")
+        response = _features_response(
+            {"type": "FeatureCollection", "version": version, "tolerance": tolerance},
+            features
+        )
+        return _cache_headers(response, etag, immutable, modified)
+
+
+class StatsView(View):
+    """
+    Numbers-only counterpart of GISStatsView: stats, top 10 and per-country
+    totals keyed by country id, plus the dataset version for GeometryView.
+    Cached like GISStatsView.
+    """
+    def get(self, request):
+        dataset = _dataset_param(request)
+        sort_by = _sort_param(request)
+        try:
+            start, end = _date_range(request)
+        except ValueError:
+            return JsonResponse({'error': DATE_ERROR}, status=400)
+
+        breaks = _breaks_param(request)
+
+        key = stats_cache_key('stats', dataset, start, end, sort_by, breaks=breaks)
+        etag = etag_for(key)
+        modified = last_modified(dataset)
+        if _not_modified(request, etag):
+            return _cache_headers(HttpResponseNotModified(), etag, modified=modified)
+
+        body = cached_body(key, lambda: stats_body(dataset, start, end, sort_by, breaks))
+        return _cache_headers(HttpResponse(body, content_type='application/json'), etag, modified=modified)
+
+
+class CubeView(View):
+    """
+    The dataset as one country x month matrix (base64 typed arrays, see
+    dataset_cube). The map slices years, totals, top 10 and colours from it
+    locally, so moving the year slider sends no requests.
+    """
+    def get(self, request):
+        dataset = _dataset_param(request)
+        version = dataset_version(dataset)
+        key = response_key('cube', version, dataset=dataset or '')
+        etag = etag_for(key)
+        modified = last_modified(dataset)
+        # Same contract as GeometryView: ?v=<current version> may be cached for good
+        immutable = request.GET.get('v') == version
+        if _not_modified(request, etag):
+            return _cache_headers(HttpResponseNotModified(), etag, immutable, modified)
+
+        def build():
+            payload = dataset_cube(dataset)
+            payload["version"] = version
+            return json.dumps(payload).encode('utf-8')
+
+        body = cached_body(key, build)
+        return _cache_headers(HttpResponse(body, content_type='application/json'), etag, immutable, modified)
+
+
+class TileView(View):
+    """
+    Choropleth as Mapbox Vector Tiles (/tiles/<dataset>/<z>/<x>/<y>.pbf):
+    only tiles in view are fetched, at a resolution chosen by zoom. Features
+    carry id/country/cases/deaths for ?start_date=&end_date= (whole dataset
+    when omitted). A dataset without rows falls back to all data, like
+    /api/cube/. 204 for an empty tile, 404 outside the tile pyramid.
+    Cached per dataset version; immutable with ?v=<version>.
+    """
+    def get(self, request, dataset, z, x, y):
+        dataset = _known_dataset(dataset)
+        if not tile_in_range(z, x, y):
+            return JsonResponse({'error': 'Tile out of range'}, status=404)
+
+        try:
+            start, end = _date_range(request)
+        except ValueError:
+            return JsonResponse({'error': DATE_ERROR}, status=400)
+        version = dataset_version(dataset)
+        etag = etag_for(tile_key(dataset, z, x, y, start, end))
+        immutable = request.GET.get('v') == version
+        modified = last_modified(dataset)
+        if _not_modified(request, etag):
+            return _cache_headers(HttpResponseNotModified(), etag, immutable, modified)
+
+        body = country_tile(dataset, z, x, y, start, end)
+        if not body:
+            # Nothing in view (ocean, no data for the range): no tile to decode
+            return _cache_headers(HttpResponse(status=204), etag, immutable, modified)
+        response = HttpResponse(body, content_type='application/vnd.mapbox-vector-tile')
+        return _cache_headers(response, etag, immutable, modified)
+
+
+class AdminStatsView(View):
+    """
+    Cases/deaths per admin area for point / sub-national datasets, rolled up
+    to any ?level= (0 = country) on demand. Cached per dataset version.
+    """
+    def get(self, request):
+        dataset = request.GET.get('dataset', '')
+        if dataset not in catalog():
+            return JsonResponse({'error': f"Unknown dataset '{dataset}'"}, status=404)
+        try:
+            level = int(request.GET.get('level', 1))
+        except ValueError:
+            return JsonResponse({'error': 'level must be an integer'}, status=400)
+        try:
+            start, end = _date_range(request)
+        except ValueError:
+            return JsonResponse({'error': DATE_ERROR}, status=400)
+
+        key = response_key(
+            'admin-stats', dataset_version(dataset), dataset=dataset, start=start or '', end=end or '', level=level
+        )
+        etag = etag_for(key)
+        modified = last_modified(dataset)
+        if _not_modified(request, etag):
+            return _cache_headers(HttpResponseNotModified(), etag, modified=modified)
+
+        def build():
+            areas, unassigned = admin_rollup(dataset, level, start, end)
+            return json.dumps({
+                'dataset': dataset, 'level': level, 'areas': areas, 'unassigned_points': unassigned,
+            }).encode('utf-8')
+
+        body = cached_body(key, build)
+        return _cache_headers(HttpResponse(body, content_type='application/json'), etag, modified=modified)
+
+
+class HotspotView(View):
+    """
+    Spatial hotspots of a point dataset for a date range and map zoom:
+    ?method=grid (ST_SnapToGrid bins, default) or dbscan (ST_ClusterDBSCAN).
+    Returns aggregated cells as parallel arrays, never raw points. Cached per
+    dataset version, range, zoom, method and bbox (widened to whole cells).
+    """
+    def get(self, request):
+        dataset = request.GET.get('dataset', '')
+        if dataset not in catalog():
+            return JsonResponse({'error': f"Unknown dataset '{dataset}'"}, status=404)
+        method = request.GET.get('method', 'grid')
+        if method not in HOTSPOT_METHODS:
+            return JsonResponse({'error': f"method must be one of {', '.join(HOTSPOT_METHODS)}"}, status=400)
+        try:
+            zoom = min(max(int(request.GET.get('zoom', 2)), 0), HOTSPOT_MAX_ZOOM)
+        except ValueError:
+            return JsonResponse({'error': 'zoom must be an integer'}, status=400)
+        try:
+            start, end = _date_range(request)
+        except ValueError:
+            return JsonResponse({'error': DATE_ERROR}, status=400)
+        try:
+            bbox = _bbox_param(request, zoom)
+        except ValueError:
+            return JsonResponse({'error': 'bbox must be west,south,east,north in degrees'}, status=400)
+
+        key = response_key(
+            'hotspots', dataset_version(dataset),
+            dataset=dataset, start=start or '', end=end or '', zoom=zoom, method=method,
+            bbox=','.join(f'{edge:g}' for edge in bbox) if bbox else ''
+        )
+        etag = etag_for(key)
+        modified = last_modified(dataset)
+        if _not_modified(request, etag):
+            return _cache_headers(HttpResponseNotModified(), etag, modified=modified)
+
+        def build():
+            payload = {'dataset': dataset, 'zoom': zoom}
+            # Country-level datasets have no points: the map skips the layer
+            payload['has_points'] = DiseasePoint.objects.filter(dataset_type=dataset).exists()
+            if payload['has_points']:
+                payload.update(hotspot_cells(dataset, zoom, start, end, method, bbox))
+            return json.dumps(payload).encode('utf-8')
+
+        body = cached_body(key, build)
+        return _cache_headers(HttpResponse(body, content_type='application/json'), etag, modified=modified)
+
+
+class AnalyticsView(View):
+    """
+    Epidemiological series of a dataset: cases/deaths with rolling averages,
+    growth rate, doubling time, Rt and rolling CFR (see analytics.py).
+    ?countries=a,b (default: the top N by cases, ?top=), ?freq=daily|weekly,
+    ?cumulative=1 for running-total datasets, ?start_date= / ?end_date=.
+    Metrics are memoized per dataset version, responses cached like stats.
+    """
+    def get(self, request):
+        dataset = request.GET.get('dataset', '')
+        if dataset not in catalog():
+            return JsonResponse({'error': f"Unknown dataset '{dataset}'"}, status=404)
+        freq = request.GET.get('freq', 'daily')
+        if freq not in WINDOWS:
+            return JsonResponse({'error': f"freq must be one of {', '.join(WINDOWS)}"}, status=400)
+        try:
+            top = min(max(int(request.GET.get('top', 10)), 1), 100)
+        except ValueError:
+            return JsonResponse({'error': 'top must be an integer'}, status=400)
+        countries = sorted({c.strip() for c in request.GET.get('countries', '').split(',') if c.strip()})
+        cumulative = request.GET.get('cumulative') in ('1', 'true')
+        try:
+            start, end = _date_range(request)
+        except ValueError:
+            return JsonResponse({'error': DATE_ERROR}, status=400)
+
+        version = dataset_version(dataset)
+        key = response_key(
+            'analytics', version, dataset=dataset, countries=','.join(countries), top=top,
+            freq=freq, cumulative=cumulative, start=start or '', end=end or ''
+        )
+        etag = etag_for(key)
+        modified = last_modified(dataset)
+        if _not_modified(request, etag):
+            return _cache_headers(HttpResponseNotModified(), etag, modified=modified)
+
+        def build():
+            payload = analytics_payload(dataset, version, countries, top, freq, cumulative, start, end)
+            payload['version'] = version
+            return json.dumps(payload).encode('utf-8')
+
+        body = cached_body(key, build)
+        return _cache_headers(HttpResponse(body, content_type='application/json'), etag, modified=modified)
+
 
-        return JsonResponse({
-            "stats": {
-                "total_cases": agg['total_cases'],
-                "total_deaths": agg['total_deaths'],
-                "cfr_percent": cfr,
-                "avg_cases_per_country": avg,
-                "countries_affected": agg['countries'],
-            },
-            "top10": {
-                "countries": top10_countries,
-                "totals": [item['total'] or 0 for item in top10],
-                "monthly_cases": top10_monthly_cases,
-                "monthly_deaths": top10_monthly_deaths,
-                "sort_by": sort_by
-            },
-            "features": features
-        })
-    
 class MapView(View):
     def get(self, request):
         return render(request, 'map.html')
@@ -167,8 +512,10 @@ class MapView(View):
 
 def detect_csv_columns(request):
     """
-    Detect available columns in uploaded CSV
-    Returns: {"columns": ["col1", "col2", ...], "sample_data": {...}}
+    Detect available columns in uploaded CSV from its first few KB (csv module,
+    no pandas parse). The file is kept on the server: pass the returned
+    upload_token to /api/upload/ instead of sending the file again.
+    Returns: {"columns": [...], "sample_data": {...}, "delimiter", "encoding", "upload_token"}
     """
     if request.method != 'POST':
         return JsonResponse({'error': 'Method Not Allowed'}, status=405)
@@ -178,249 +525,198 @@ def detect_csv_columns(request):
         return JsonResponse({'error': 'No file provided'}, status=400)
     
     try:
-        df = pd.read_csv(file, encoding='utf-8', low_memory=False, nrows=100)
-        columns = list(df.columns)
-        
-        # Get sample data - return up to 3 non-null values per column
-        sample_data = {}
-        for col in columns:
-            non_null = df[col].dropna()
-            if len(non_null) > 0:
-                # Convert to list of up to 3 samples, converted to strings
-                samples = [str(v).strip() for v in non_null.head(3).tolist()]
-                sample_data[col] = samples
-            else:
-                sample_data[col] = []
-        
-        logger.info(f"Detected {len(columns)} columns: {columns}")
-        logger.info(f"Sample data: {sample_data}")
-        
-        return JsonResponse({
-            'status': 'success',
-            'columns': columns,
-            'sample_data': sample_data,
-            'total_rows': len(df)
-        })
+        started = time.perf_counter()
+        sniffed = sniff_csv(file.read(SNIFF_BYTES))
+        file.seek(0)
+        logger.info(
+            f"Detected {len(sniffed['columns'])} columns in {(time.perf_counter() - started) * 1000:.1f}ms "
+            f"(delimiter={sniffed['delimiter']!r}, encoding={sniffed['encoding']}): {sniffed['columns']}"
+        )
     except Exception as e:
         logger.error(f"Error detecting columns: {e}")
         return JsonResponse({'error': f'Failed to read CSV: {str(e)}'}, status=400)
-    
+
+    options = {'delimiter': sniffed['delimiter'], 'encoding': sniffed['encoding']}
+    token = stage_upload(file, options)
+    return JsonResponse({
+        'status': 'success',
+        'columns': sniffed['columns'],
+        'sample_data': sniffed['sample_data'],
+        'total_rows': sniffed['sample_rows'],
+        'delimiter': sniffed['delimiter'],
+        'encoding': sniffed['encoding'],
+        'upload_token': token,
+    })
 
 
 def upload_csv(request):
     """
     ROBUST synchronous upload with crash-safe geometry fetching
     - Accepts manual column mapping from user
-    - Fetches geometries ONE at a time (safest for server stability)
-    - Small batch inserts (1000 records) for memory safety)
-    - Safe for files with 100k+ rows
+    - Streams the CSV in chunks (INGEST_CHUNK_SIZE rows): memory depends on
+      the chunk size, not the file size
+    - Stores each country geometry once (CountryGeometry), rows reference it
+    - Each chunk is COPY'd into a temp staging table; one INSERT ... ON
+      CONFLICT merges it into DiseaseData at the end (mode: append, upsert
+      or replace), all in one transaction
+    - Files with lat/lon or admin columns go through ingest_points instead
+    - background=1 queues an IngestJob and returns 202 with its status URL
     """
     if request.method != 'POST':
         return JsonResponse({'error': 'Method Not Allowed'}, status=405)
 
     file = request.FILES.get('csv_file')
+    token = request.POST.get('upload_token', '').strip()
     dataset_name = request.POST.get('dataset_name', '').strip()
     
     # Get column mappings from user (or use auto-detect)
-    country_col = request.POST.get('country_col', '').strip()
-    date_col = request.POST.get('date_col', '').strip()
-    cases_col = request.POST.get('cases_col', '').strip()
-    deaths_col = request.POST.get('deaths_col', '').strip()
+    mapping = {
+        'country': request.POST.get('country_col', '').strip(),
+        'date': request.POST.get('date_col', '').strip(),
+        'cases': request.POST.get('cases_col', '').strip(),
+        'deaths': request.POST.get('deaths_col', '').strip(),
+    }
+    # Sub-national / point data: coordinates and/or admin area names (spatial.py)
+    for field in ('lat', 'lon', 'admin'):
+        column = request.POST.get(f'{field}_col', '').strip()
+        if column:
+            mapping[field] = column
+    if request.POST.get('admin_level', '').strip():
+        mapping['admin_level'] = request.POST['admin_level'].strip()
 
-    if not file or not dataset_name:
+    if (not file and not token) or not dataset_name:
         return JsonResponse({'error': 'Missing file or dataset name'}, status=400)
 
-    try:
-        start_time = time.time()
-        
-        # READ CSV
-        df = pd.read_csv(file, encoding='utf-8', low_memory=False)
-        total_rows = len(df)
-        logger.info(f"Read {total_rows} rows from {file.name}")
-        
-        # VALIDATE COLUMNS
-        # If user provided manual mappings, use those. Otherwise auto-detect
-        if not country_col:
-            country_col = next((c for c in df.columns if 'country' in c.lower()), None)
-        if not date_col:
-            date_col = next((c for c in df.columns if any(x in c.lower() for x in ['date', 'year', 'time', 'period'])), None)
-        
-        # Detect cases and deaths columns separately
-        if not cases_col:
-            cases_col = next((c for c in df.columns if any(x in c.lower() for x in ['case', 'cases', 'confirmed', 'total', 'count'])), None)
-        if not deaths_col:
-            deaths_col = next((c for c in df.columns if any(x in c.lower() for x in ['death', 'deaths', 'died', 'mortality', 'fatal'])), None)
-
-        if not country_col or (not cases_col and not deaths_col):
-            return JsonResponse({'error': 'CSV must contain country and cases/deaths columns'}, status=400)
-
-        # DEBUG: Log detected/provided columns
-        logger.info(f"Using columns: country='{country_col}', cases='{cases_col}', deaths='{deaths_col}', date='{date_col}'")
-        if cases_col:
-            logger.info(f"Sample values from {cases_col}: {df[cases_col].head(3).tolist()}")
-        if deaths_col:
-            logger.info(f"Sample values from {deaths_col}: {df[deaths_col].head(3).tolist()}")
-        # PRE-FETCH GEOMETRIES - SIMPLIFIED & SAFE
-        unique_countries = df[country_col].dropna().unique()
-        geometry_cache = {}
-        empty_geom = GEOSGeometry('MULTIPOLYGON EMPTY', srid=4326)
-        
-        logger.info(f"Fetching {len(unique_countries)} unique country geometries (simplified)...")
-        
-        countries_to_fetch = list(set([str(c).strip().lower() for c in unique_countries]))
-        
-        # Fetch each country individually with SIMPLIFIED geometry
-        # ST_SimplifyPreserveTopology reduces geometry size by 90%+
-        for idx, country_key in enumerate(countries_to_fetch):
-            try:
-                with connection.cursor() as cur:
-                    # Use simplified geometry to prevent memory crashes
-                    # Tolerance 0.01 degrees = ~1km, good enough for visualization
-                    cur.execute(
-                        """
-                        SELECT ST_AsText(ST_SimplifyPreserveTopology(geom, 0.01))
-                        FROM world_countries 
-                        WHERE lower(name) = %s LIMIT 1
-                        """,
-                        [country_key]
-                    )
-                    
-                    row = cur.fetchone()
-                    
-                    # Fallback to name_en or adm0_a3
-                    if not row:
-                        cur.execute(
-                            """
-                            SELECT ST_AsText(ST_SimplifyPreserveTopology(geom, 0.01))
-                            FROM world_countries 
-                            WHERE lower(name_en) = %s OR lower(adm0_a3) = %s LIMIT 1
-                            """,
-                            [country_key, country_key]
-                        )
-                        row = cur.fetchone()
-                    
-                    if row and row[0]:
-                        try:
-                            geom = GEOSGeometry(row[0], srid=4326)
-                            # Convert Polygon to MultiPolygon if needed
-                            if geom.geom_type == 'Polygon':
-                                geom = MultiPolygon(geom, srid=4326)
-                            geometry_cache[country_key] = geom
-                        except Exception:
-                            logger.warning(f"Skipping invalid geometry for {country_key}")
-                            geometry_cache[country_key] = empty_geom
-                    else:
-                        geometry_cache[country_key] = empty_geom
-                
-                # Progress logging every 10 countries
-                if (idx + 1) % 10 == 0:
-                    logger.info(f"   Progress: {idx + 1}/{len(countries_to_fetch)} countries...")
-                    
-            except Exception as fetch_err:
-                logger.error(f"Fetch error for '{country_key}': {fetch_err}")
-                geometry_cache[country_key] = empty_geom
-                continue
-        
-        logger.info(f"Cached {len(geometry_cache)} geometries (simplified to prevent crashes)")
-
-        # PREPARE RECORDS
-        records_to_create = []
-        skipped = 0
-        
-        country_idx = df.columns.get_loc(country_col)
-        cases_idx = df.columns.get_loc(cases_col) if cases_col else None
-        deaths_idx = df.columns.get_loc(deaths_col) if deaths_col else None
-        date_idx = df.columns.get_loc(date_col) if date_col else None
-        default_date = pd.Timestamp('2020-01-01').date()
-
-        for row in df.itertuples(index=False):
-            raw_country = row[country_idx] if country_idx < len(row) else None
-            
-            if pd.isna(raw_country):
-                skipped += 1
-                continue
-                
-            country_clean = str(raw_country).strip()
-            country_key = country_clean.lower()
-            
-            # Parse cases value
-            cases = None
-            if cases_idx is not None and cases_idx < len(row):
-                raw_cases = row[cases_idx]
-                try:
-                    if isinstance(raw_cases, str):
-                        raw_cases = raw_cases.replace(',', '')
-                    if pd.notna(raw_cases) and raw_cases != '':
-                        cases = int(float(raw_cases))
-                except (ValueError, TypeError):
-                    cases = None
-
-            # Parse deaths value
-            deaths = None
-            if deaths_idx is not None and deaths_idx < len(row):
-                raw_deaths = row[deaths_idx]
-                try:
-                    if isinstance(raw_deaths, str):
-                        raw_deaths = raw_deaths.replace(',', '')
-                    if pd.notna(raw_deaths) and raw_deaths != '':
-                        deaths = int(float(raw_deaths))
-                except (ValueError, TypeError):
-                    deaths = None
-
-            if date_idx and date_idx < len(row):
-                raw_date = row[date_idx]
-                try:
-                    dt = pd.to_datetime(raw_date, errors='coerce')
-                    date_val = dt.date() if pd.notna(dt) else default_date
-                except Exception:
-                    date_val = default_date
-            else:
-                date_val = default_date
-
-            geom = geometry_cache.get(country_key, empty_geom)
-
-            records_to_create.append(
-                DiseaseData(
-                    dataset_type=dataset_name,
-                    date=date_val,
-                    country=country_clean,
-                    cases=cases,
-                    deaths=deaths,
-                    geom=geom
-                )
-            )
-
-        logger.info(f"Prepared {len(records_to_create)} records ({skipped} skipped)")
-
-        # BULK INSERT - VERY SMALL BATCHES FOR STABILITY
-        if records_to_create:
-            for i in range(0, len(records_to_create), 1000):
-                batch = records_to_create[i:i+1000]
-                try:
-                    DiseaseData.objects.bulk_create(batch, batch_size=1000)
-                    logger.info(f"   Inserted {min(i+1000, len(records_to_create))}/{len(records_to_create)} records...")
-                except Exception as insert_err:
-                    logger.error(f"Batch insert error at row {i}: {insert_err}")
-                    raise
+    mode = request.POST.get('mode', 'append').strip() or 'append'
+    if mode not in INGEST_MODES:
+        return JsonResponse({'error': f"mode must be one of {', '.join(INGEST_MODES)}"}, status=400)
 
-        elapsed = time.time() - start_time
-        rows_per_sec = len(records_to_create) / elapsed if elapsed > 0 else 0
-        logger.info(f"Upload complete! {len(records_to_create)} rows in {elapsed:.2f}s ({rows_per_sec:.0f} rows/sec)")
+    # A file already sent to /api/detect-columns/ is ingested from disk
+    staged_path, options = None, {}
+    if not file:
+        staged = take_upload(token)
+        if staged is None:
+            return JsonResponse({'error': 'Upload token expired or unknown, please select the file again'}, status=400)
+        staged_path, meta = staged
+        file_name, options = meta['file_name'], meta['options']
+    else:
+        file_name = file.name
 
+    # Background mode: persist the file, return at once, poll /api/upload-status/<job_id>/
+    if request.POST.get('background'):
+        path = staged_path or save_upload(file, uuid.uuid4().hex)
+        job = create_job(path, file_name, dataset_name, mapping, options, mode)
+        logger.info(f"Queued ingest job {job.id} for {file_name} into dataset '{dataset_name}'")
         return JsonResponse({
-            'status': 'success',
-            'imported': len(records_to_create),
-            'total_rows': total_rows,
-            'skipped': skipped,
-            'dataset': dataset_name,
-            'elapsed_seconds': round(elapsed, 2)
-        })
+            'status': 'queued',
+            'job_id': str(job.id),
+            'status_url': reverse('upload-status', args=[job.id]),
+        }, status=202)
 
+    try:
+        logger.info(f"Ingesting {file_name} into dataset '{dataset_name}'")
+        ingest = ingest_points if is_point_mapping(mapping) else ingest_csv
+        if staged_path:
+            with open(staged_path, 'rb') as fh:
+                result = ingest(fh, dataset_name, mapping, options=options, mode=mode)
+        else:
+            result = ingest(file, dataset_name, mapping, mode=mode)
+        return JsonResponse({'status': 'success', **result})
+
+    except IngestError as e:
+        return JsonResponse({'error': str(e)}, status=400)
     except Exception as e:
         logger.error(f"Upload failed: {e}", exc_info=True)
         connection.close() 
         return JsonResponse({'error': f'Upload failed: {str(e)}'}, status=500)
+    finally:
+        if staged_path and os.path.exists(staged_path):
+            os.remove(staged_path)
     
+def chunked_upload_init(request):
+    """
+    Start a resumable upload. Body: {"file_name", "file_size"}.
+    Returns the upload_id, chunk_size and number of chunks to PUT.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method Not Allowed'}, status=405)
+    try:
+        payload = json.loads(request.body or b'{}')
+        session = init_upload(str(payload.get('file_name', 'upload.csv'))[:255], int(payload.get('file_size', 0)))
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(session, status=201)
+
+
+def chunked_upload_status(request, upload_id):
+    """Which chunks of a resumable upload the server already has"""
+    try:
+        return JsonResponse(chunked_status(upload_id))
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=404)
+
+
+def chunked_upload_chunk(request, upload_id, index):
+    """PUT the raw bytes of chunk <index>; streamed to disk, never buffered"""
+    if request.method != 'PUT':
+        return JsonResponse({'error': 'Method Not Allowed'}, status=405)
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        status = write_chunk(upload_id, index, request, length)
+    except UploadError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'index': index, 'received': status['received'], 'chunks': status['chunks']})
+
+
+def chunked_upload_finalize(request, upload_id):
+    """
+    Complete a resumable upload. Returns the same column detection as
+    /api/detect-columns/, with an upload_token for /api/upload/.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method Not Allowed'}, status=405)
+    try:
+        sniffed = finalize_upload(upload_id)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'status': 'success',
+        'columns': sniffed['columns'],
+        'sample_data': sniffed['sample_data'],
+        'total_rows': sniffed['sample_rows'],
+        'delimiter': sniffed['delimiter'],
+        'encoding': sniffed['encoding'],
+        'upload_token': sniffed['upload_token'],
+    })
+
+
+def upload_status(request, job_id):
+    """Progress of a background ingest job"""
+    try:
+        job = IngestJob.objects.get(id=job_id)
+    except IngestJob.DoesNotExist:
+        return JsonResponse({'error': 'Job not found'}, status=404)
+
+    end = job.finished_at or timezone.now()
+    elapsed = (end - job.started_at).total_seconds() if job.started_at else 0
+    return JsonResponse({
+        'job_id': str(job.id),
+        'status': job.status,
+        'dataset': job.dataset_type,
+        'file_name': job.file_name,
+        'file_size': job.file_size,
+        'bytes_read': job.bytes_read,
+        'percent': round(job.bytes_read / job.file_size * 100, 1) if job.file_size else 0,
+        'rows_parsed': job.rows_parsed,
+        'rows_staged': job.rows_staged,
+        'rows_inserted': job.rows_inserted,
+        'skipped': job.skipped,
+        'rows_per_sec': job.rows_per_sec,
+        'elapsed_seconds': round(elapsed, 2),
+        'error': job.error,
+        'result': job.result,
+    })
+
 def discussion(request):
     display_name = request.session.get('display_name')
 
@@ -450,13 +746,244 @@ def discussion(request):
             'current_dataset': current_dataset
         })
 
-    messages = DiscussionMessage.objects.filter(dataset_type=current_dataset).order_by('-created_at')[:200]
+    threads, next_before = _thread_page(current_dataset)
+    last_id = DiscussionMessage.objects.filter(dataset_type=current_dataset).aggregate(last=Max('id'))['last'] or 0
 
     return render(request, 'discussion.html', {
         'display_name': display_name,
         'current_dataset': current_dataset,
+        'threads': threads,
+        'next_before': next_before,
+        'last_id': last_id,
+        'stream': DISCUSSION_STREAM,
+        'poll_ms': DISCUSSION_POLL_MS,
+    })
+
+
+def _thread_roots(root_ids):
+    """{reply id: id of its top-level message} for every reply below root_ids, at any depth"""
+    table = DiscussionMessage._meta.db_table
+    with connection.cursor() as cur:
+        cur.execute(
+            f"""
+            WITH RECURSIVE tree (id, root_id) AS (
+                SELECT id, reply_to_id FROM {table} WHERE reply_to_id = ANY(%s)
+                UNION ALL
+                SELECT m.id, tree.root_id FROM {table} m JOIN tree ON m.reply_to_id = tree.id
+            )
+            SELECT id, root_id FROM tree
+            """,
+            [list(root_ids)]
+        )
+        return dict(cur.fetchall())
+
+
+def _thread_page(dataset, before_id=None, limit=THREADS_PER_PAGE):
+    """
+    One page of top-level messages, newest first, each with reply_count
+    (direct replies) and thread_replies (the whole reply tree, replied-to
+    message preloaded). Three queries whatever the page size.
+    Keyset pagination: before_id is the oldest thread already shown.
+    Returns (threads, next_before); next_before is None on the last page.
+    """
+    qs = DiscussionMessage.objects.filter(dataset_type=dataset, reply_to__isnull=True)
+    if before_id:
+        cursor = DiscussionMessage.objects.filter(id=before_id).values('created_at').first()
+        if cursor:
+            qs = qs.filter(Q(created_at__lt=cursor['created_at']) | Q(created_at=cursor['created_at'], id__lt=before_id))
+    threads = list(qs.annotate(reply_count=Count('replies')).order_by('-created_at', '-id')[:limit + 1])
+    has_more = len(threads) > limit
+    threads = threads[:limit]
+
+    replies_by_root = {thread.id: [] for thread in threads}
+    with_replies = [thread.id for thread in threads if thread.reply_count]
+    if with_replies:
+        root_of = _thread_roots(with_replies)
+        replies = (
+            DiscussionMessage.objects.filter(id__in=root_of.keys())
+            .select_related('reply_to')
+            .order_by('-created_at', '-id')
+        )
+        for reply in replies:
+            replies_by_root[root_of[reply.id]].append(reply)
+    for thread in threads:
+        thread.thread_replies = replies_by_root[thread.id]
+    return threads, (threads[-1].id if has_more else None)
+
+
+def messages_history(request):
+    """
+    Older threads for the "Load older messages" button:
+    GET /api/messages/history/?dataset=<name>&before=<thread id>
+    Returns {"html": rendered threads, "next_before": id or null}.
+    """
+    dataset = request.GET.get('dataset', 'general')
+    threads, next_before = _thread_page(dataset, _since_param(request.GET.get('before')) or None)
+    html = render_to_string('discussion_threads.html', {'threads': threads})
+    return JsonResponse({'html': html, 'next_before': next_before})
+
+
+def _messages_since(dataset, since_id, limit=MESSAGE_BATCH):
+    """Messages of a dataset with id > since_id, oldest first, as JSON-ready dicts"""
+    rows = (
+        DiscussionMessage.objects
+        .filter(dataset_type=dataset, id__gt=since_id)
+        .order_by('id')
+        .values('id', 'display_name', 'message', 'reply_to_id', 'created_at')[:limit]
+    )
+    return [
+        {
+            'id': row['id'],
+            'display_name': row['display_name'],
+            'message': row['message'],
+            'reply_to': row['reply_to_id'],
+            'created_at': row['created_at'].isoformat(),
+            'created_label': timezone.localtime(row['created_at']).strftime('%d/%m/%Y %H:%M'),
+        }
+        for row in rows
+    ]
+
+
+def _since_param(value):
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def messages_delta(request):
+    """
+    New discussion messages only: GET /api/messages/?dataset=<name>&since_id=<id>.
+    An idle client gets an empty list from one index lookup instead of a
+    re-rendered page.
+    """
+    dataset = request.GET.get('dataset', 'general')
+    since_id = _since_param(request.GET.get('since_id'))
+    messages = _messages_since(dataset, since_id)
+    return JsonResponse({
         'messages': messages,
+        'last_id': messages[-1]['id'] if messages else since_id,
     })
+
+
+def _latest_message_id(dataset):
+    return DiscussionMessage.objects.filter(dataset_type=dataset).aggregate(last=Max('id'))['last'] or 0
+
+
+class MessageFeed:
+    """
+    One poller per dataset (per ASGI process) shared by every open stream:
+    it queries for new messages every STREAM_POLL_SECONDS and fans them out
+    to its subscribers' queues, so N viewers cost one query per interval,
+    not N. It stops once its last subscriber leaves. A None in a queue
+    means the poller failed and the stream should close (EventSource
+    reconnects).
+    """
+
+    feeds = {}
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.loop = asyncio.get_running_loop()
+        self.queues = set()
+        self.ready = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+
+    @classmethod
+    def subscribe(cls, dataset):
+        feed = cls.feeds.get(dataset)
+        if feed is None or feed.loop is not asyncio.get_running_loop():
+            feed = cls.feeds[dataset] = cls(dataset)
+        queue = asyncio.Queue()
+        feed.queues.add(queue)
+        return feed, queue
+
+    def unsubscribe(self, queue):
+        self.queues.discard(queue)
+
+    async def run(self):
+        fetch = sync_to_async(_messages_since)
+        try:
+            last_id = await sync_to_async(_latest_message_id)(self.dataset)
+            self.ready.set()
+            while self.queues:
+                await asyncio.sleep(STREAM_POLL_SECONDS)
+                messages = await fetch(self.dataset, last_id)
+                while messages:
+                    last_id = messages[-1]['id']
+                    for queue in self.queues:
+                        queue.put_nowait(messages)
+                    messages = await fetch(self.dataset, last_id) if len(messages) == MESSAGE_BATCH else []
+        except Exception as e:
+            logger.error(f"Message feed for dataset='{self.dataset}' failed: {e}", exc_info=True)
+            self.ready.set()
+            for queue in self.queues:
+                queue.put_nowait(None)
+        finally:
+            if MessageFeed.feeds.get(self.dataset) is self:
+                del MessageFeed.feeds[self.dataset]
+
+
+async def message_stream(request):
+    """
+    Server-Sent Events feed of new messages (needs an ASGI server), served
+    from the dataset's shared MessageFeed. The connection closes after
+    DISCUSSION_STREAM_SECONDS, or DISCUSSION_STREAM_IDLE_SECONDS without a
+    message; EventSource then reconnects with Last-Event-ID and resumes
+    without gaps.
+    """
+    dataset = request.GET.get('dataset', 'general')
+    since_id = _since_param(request.headers.get('Last-Event-ID') or request.GET.get('since_id'))
+    fetch = sync_to_async(_messages_since)
+
+    def event(messages):
+        return f"id: {messages[-1]['id']}\nevent: messages\ndata: {json.dumps(messages)}\n\n"
+
+    async def events():
+        # Subscribe before reading the backlog so nothing posted in between is lost
+        feed, queue = MessageFeed.subscribe(dataset)
+        try:
+            await feed.ready.wait()
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            last_id = since_id
+            while messages := await fetch(dataset, last_id):
+                last_id = messages[-1]['id']
+                yield event(messages)
+                if len(messages) < MESSAGE_BATCH:
+                    break
+
+            now = time.monotonic()
+            deadline = now + DISCUSSION_STREAM_SECONDS
+            idle_deadline = now + DISCUSSION_STREAM_IDLE_SECONDS
+            while True:
+                now = time.monotonic()
+                close_at = min(deadline, idle_deadline)
+                if now >= close_at:
+                    break
+                try:
+                    messages = await asyncio.wait_for(queue.get(), min(close_at - now, STREAM_HEARTBEAT_SECONDS))
+                except asyncio.TimeoutError:
+                    if time.monotonic() < min(deadline, idle_deadline):
+                        # Comment line keeps proxies from closing an idle connection
+                        yield ": ping\n\n"
+                    continue
+                if messages is None:
+                    break
+                # The feed may repeat what the backlog already sent
+                messages = [m for m in messages if m['id'] > last_id]
+                if messages:
+                    last_id = messages[-1]['id']
+                    idle_deadline = time.monotonic() + DISCUSSION_STREAM_IDLE_SECONDS
+                    yield event(messages)
+        finally:
+            feed.unsubscribe(queue)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @csrf_exempt
 def post_message(request):
     if request.method != "POST":
@@ -480,15 +1007,29 @@ def post_message(request):
         except DiscussionMessage.DoesNotExist:
             return JsonResponse({'error': 'Reply target not found'}, status=404)
 
-    DiscussionMessage.objects.create(
+    msg = DiscussionMessage.objects.create(
         display_name=display_name,
         message=message,
         dataset_type=dataset_type,
         reply_to=reply_to
     )
-    return JsonResponse({'status': 'ok'})
+    return JsonResponse({'status': 'ok', 'id': msg.id})
 
 def get_datasets(request):
-    datasets = DiseaseData.objects.values('dataset_type').distinct().order_by('dataset_type')
-    dataset_list = [item['dataset_type'] for item in datasets if item['dataset_type']]
-    return JsonResponse({'datasets': dataset_list})
+    """Dataset names for the dropdown plus their catalog metadata"""
+    entries = catalog()
+    return JsonResponse({
+        'datasets': dataset_names(),
+        'catalog': [
+            {
+                'name': name,
+                'rows': entry['row_count'],
+                'countries': entry['country_count'],
+                'first_date': entry['first_date'].isoformat() if entry['first_date'] else None,
+                'last_date': entry['last_date'].isoformat() if entry['last_date'] else None,
+                'version': entry['version'],
+                'updated_at': entry['updated_at'].isoformat(),
+            }
+            for name, entry in sorted(entries.items())
+        ],
+    })
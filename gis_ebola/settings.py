@@ -106,8 +106,63 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 GDAL_LIBRARY_PATH = r"C:\Users\Admin\AppData\Roaming\Python\Python312\site-packages\osgeo\gdal.dll"
 GEOS_LIBRARY_PATH = r"C:\Users\Admin\AppData\Roaming\Python\Python312\site-packages\osgeo\geos_c.dll"
 
-DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880000
-FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880000
+# Large CSVs arrive through the chunked /api/uploads/ protocol (one request per
+# INGEST_UPLOAD_CHUNK_SIZE chunk, streamed to disk); direct multipart uploads
+# above FILE_UPLOAD_MAX_MEMORY_SIZE are spooled to a temp file, not kept in memory
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
+FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 20000
 
+# CSV ingest reads and inserts this many rows at a time (bounds memory per upload)
+INGEST_CHUNK_SIZE = 50000
+# 'copy' (COPY into a temp table + one INSERT ... ON CONFLICT) or 'orm' (bulk_create)
+INGEST_LOADER = 'copy'
+# Background uploads: 'thread' runs them in a pool inside the web process,
+# 'worker' leaves them queued for `python manage.py run_ingest_worker`
+INGEST_RUNNER = 'thread'
+INGEST_WORKERS = 2
+INGEST_UPLOAD_DIR = BASE_DIR / 'uploads'
+# Files kept by /api/detect-columns/ for a later /api/upload/?upload_token=... (seconds)
+INGEST_UPLOAD_TOKEN_TTL = 24 * 3600
+INGEST_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+INGEST_UPLOAD_MAX_SIZE = 20 * 1024 ** 3
+# Background files this large are split across worker processes; at most
+# INGEST_DB_CONNECTIONS of them write to the database at the same time
+INGEST_PARALLEL_MIN_BYTES = 256 * 1024 * 1024
+INGEST_PARALLEL_WORKERS = 4
+INGEST_DB_CONNECTIONS = 4
+
+# Seconds each process may serve its cached dataset catalog before re-reading it
+DATASET_CATALOG_TTL = 5
+
+# Computed /api/stats/ and /api/gis-stats/ responses. Keys carry the dataset
+# version, so nothing needs invalidating. Local memory is per process; point
+# 'default' at a shared backend (django.core.cache.backends.redis.RedisCache
+# or memcached.PyMemcacheCache) to share entries between workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'nergal-stats',
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    }
+}
+STATS_CACHE_ALIAS = 'default'
+STATS_CACHE_TIMEOUT = 24 * 3600
+# Mean serial interval (days) used by /api/analytics/ to turn growth into Rt
+ANALYTICS_SERIAL_INTERVAL_DAYS = 5.0
+# Computed analytics metric sets kept per process (current versions only)
+ANALYTICS_MEMO_SIZE = 2
+
+# Discussion page: True streams new messages over Server-Sent Events (run
+# under an ASGI server, e.g. `uvicorn gis_ebola.asgi:application`); False
+# polls /api/messages/ for deltas every DISCUSSION_POLL_MS
+DISCUSSION_STREAM = False
+DISCUSSION_STREAM_SECONDS = 300
+DISCUSSION_STREAM_IDLE_SECONDS = 120
+DISCUSSION_POLL_MS = 4000
+
+# Optional on-disk cache of simplified country GeoJSON (shared by all workers,
+# survives restarts). None keeps the cache in process memory only.
+GEOMETRY_CACHE_DIR = BASE_DIR / 'geometry_cache'
+
 
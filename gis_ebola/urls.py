@@ -2,7 +2,11 @@ from django.contrib import admin
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import TemplateView
-from data_upload.views import MapView, upload_csv, detect_csv_columns, GISStatsView, discussion, post_message, get_datasets
+from data_upload.views import (
+    MapView, upload_csv, detect_csv_columns, GISStatsView, GeometryView, StatsView, CubeView, TileView, AdminStatsView, HotspotView, AnalyticsView, discussion, post_message, get_datasets, upload_status,
+    messages_delta, messages_history, message_stream,
+    chunked_upload_init, chunked_upload_status, chunked_upload_chunk, chunked_upload_finalize,
+)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -10,9 +14,24 @@ urlpatterns = [
     path('upload/', TemplateView.as_view(template_name='upload.html'), name='upload'),
     path('map/', MapView.as_view(), name='map'),
     path('api/upload/', csrf_exempt(upload_csv), name='api-upload'),
+    path('api/upload-status/<uuid:job_id>/', upload_status, name='upload-status'),
+    path('api/uploads/', csrf_exempt(chunked_upload_init), name='chunked-upload'),
+    path('api/uploads/<str:upload_id>/', chunked_upload_status, name='chunked-upload-status'),
+    path('api/uploads/<str:upload_id>/chunks/<int:index>/', csrf_exempt(chunked_upload_chunk), name='chunked-upload-chunk'),
+    path('api/uploads/<str:upload_id>/finalize/', csrf_exempt(chunked_upload_finalize), name='chunked-upload-finalize'),
     path('api/detect-columns/', csrf_exempt(detect_csv_columns), name='detect-columns'),
     path('api/gis-stats/', GISStatsView.as_view()),
+    path('api/geometry/', GeometryView.as_view()),
+    path('api/stats/', StatsView.as_view()),
+    path('api/cube/', CubeView.as_view()),
+    path('api/admin-stats/', AdminStatsView.as_view()),
+    path('api/hotspots/', HotspotView.as_view()),
+    path('api/analytics/', AnalyticsView.as_view()),
+    path('tiles/<str:dataset>/<int:z>/<int:x>/<int:y>.pbf', TileView.as_view(), name='tiles'),
     path('api/datasets/', get_datasets),
     path('discussion/', discussion, name='discussion'),
     path('api/post-message/', post_message, name='post_message'),
+    path('api/messages/', messages_delta, name='messages-delta'),
+    path('api/messages/history/', messages_history, name='messages-history'),
+    path('api/messages/stream/', message_stream, name='messages-stream'),
 ]